@@ -0,0 +1,47 @@
+import can
+import functools
+import time
+
+from mks_servo_can.bus_manager import BusManager
+from mks_servo_can.mks_enums import MksCommands
+from mks_servo_can.simulator import ServoSimulator
+
+# Throughput of pipelined reads versus the number of CAN channels. The simulated servos model the
+# wire time of a 500 kbit/s bus, so each channel is limited like a real one.
+
+AXES_PER_BUS = 4
+BITRATE = 500000
+DURATION = 3
+
+
+def simulated_bus(channel):
+    ServoSimulator(can.Bus(interface="virtual", channel=channel), range(1, AXES_PER_BUS + 1), bitrate=BITRATE)
+    return can.Bus(interface="virtual", channel=channel)
+
+
+def measure(n_buses, isolated):
+    manager = BusManager()
+    for i in range(n_buses):
+        factory = functools.partial(simulated_bus, f"bench-{isolated}-{n_buses}-{i}")
+        if isolated:
+            manager.add_bus(f"bus{i}", isolated=True, bus_factory=factory, can_ids=range(1, AXES_PER_BUS + 1))
+        else:
+            manager.add_bus(f"bus{i}", bus_factory=factory, can_ids=range(1, AXES_PER_BUS + 1))
+
+    answered = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < DURATION:
+        responses = manager.send(MksCommands.READ_ENCODED_VALUE_ADDITION, [0x31])
+        answered += sum(response is not None for response in responses.values())
+    throughput = answered / (time.perf_counter() - start)
+    manager.shutdown()
+    return throughput
+
+
+if __name__ == "__main__":
+    for isolated in (False, True):
+        base = None
+        for n_buses in (1, 2, 4):
+            throughput = measure(n_buses, isolated)
+            base = base or throughput
+            print(f"{'worker processes' if isolated else 'threads':<17} {n_buses} buses: {throughput:8.0f} req/s  x{throughput / base:.2f}")
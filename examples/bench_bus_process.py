@@ -0,0 +1,81 @@
+import can
+import functools
+import multiprocessing
+import threading
+import time
+
+from mks_servo_can import MksServo
+from mks_servo_can.bus_process import BusProcess
+from mks_servo_can.mux import CanMuxServer, MuxBus
+from mks_servo_can.simulator import ServoSimulator
+
+# Response latency with the bus in the application process versus in a BusProcess, while other
+# application threads hold the GIL. The simulated servos run in their own process behind a mux
+# server, the "adapter" is a MuxBus in both cases.
+
+SOCKET = "/tmp/mks-servo-can-bench.sock"
+REQUESTS = 1000
+
+
+def drives(ready):
+    simulator_bus = can.Bus(interface="virtual", channel="drives")
+    _simulator = ServoSimulator(simulator_bus, [1])
+    server_bus = can.Bus(interface="virtual", channel="drives")
+    server = CanMuxServer(server_bus, SOCKET)
+    server.start()
+    ready.set()
+    while True:
+        time.sleep(1)
+
+
+def busy(stop):
+    # Pure Python work holding the GIL, like NumPy glue code or a UI loop
+    while not stop.is_set():
+        sum(i * i for i in range(20000))
+
+
+def measure(bus, busy_threads):
+    notifier = can.Notifier(bus, [])
+    servo = MksServo(bus, notifier, 1)
+    stop = threading.Event()
+    threads = [threading.Thread(target=busy, args=(stop,)) for _ in range(busy_threads)]
+    for thread in threads:
+        thread.start()
+
+    latencies = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        servo.read_encoder_value_addition()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.001)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    notifier.stop()
+    latencies.sort()
+    return latencies
+
+
+def report(name, latencies):
+    n = len(latencies)
+    print(f"{name:<32} mean {sum(latencies) / n * 1e3:6.2f} ms   p50 {latencies[n // 2] * 1e3:6.2f} ms   p99 {latencies[int(n * 0.99)] * 1e3:6.2f} ms   max {latencies[-1] * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=drives, args=(ready,), daemon=True)
+    server.start()
+    ready.wait()
+
+    for busy_threads in (0, 2):
+        bus = MuxBus(SOCKET)
+        report(f"in-process, {busy_threads} busy threads", measure(bus, busy_threads))
+        bus.shutdown()
+
+        bus_process = BusProcess(functools.partial(MuxBus, SOCKET))
+        bus_process.start()
+        report(f"bus process, {busy_threads} busy threads", measure(bus_process.bus, busy_threads))
+        bus_process.stop()
+
+    server.terminate()
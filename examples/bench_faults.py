@@ -0,0 +1,58 @@
+import logging
+import statistics
+import time
+
+import can
+
+from mks_servo_can.mks_servo import MksServo
+from mks_servo_can.retry import RetryEngine
+from mks_servo_can.simulator import FaultInjectionBus, ServoSimulator
+
+# Throughput and latency of the encoder reads under each fault profile of FaultInjectionBus, with the retry engine.
+
+READS = 2000
+TIMEOUT = 0.5
+PROFILES = {
+    "clean": {},
+    "drop 2%": {"drop": 0.02},
+    "corrupt 2%": {"corrupt": 0.02},
+    "duplicate 5%": {"duplicate": 0.05},
+    "reorder 5%": {"reorder": 0.05},
+    "jitter 0-2 ms": {"jitter": 0.002},
+    "mixed": {"drop": 0.01, "corrupt": 0.01, "duplicate": 0.01, "reorder": 0.01, "jitter": 0.001},
+}
+
+
+def run(faults):
+    sim_bus = can.Bus(interface="virtual", channel="faults")
+    simulator = ServoSimulator(sim_bus, [1])
+    bus = FaultInjectionBus(can.Bus(interface="virtual", channel="faults"), seed=1, **faults)
+    notifier = can.Notifier(bus, [])
+    retry = RetryEngine()
+    servo = MksServo(bus, notifier, 1, retry=retry)
+    servo.timeout = TIMEOUT
+    latencies = []
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(READS):
+        t = time.perf_counter()
+        failures += servo.read_encoder_value_addition() is None
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    notifier.stop()
+    simulator.stop()
+    bus.shutdown()
+    sim_bus.shutdown()
+    return elapsed, sorted(latencies), failures, retry.statistics()["READ_ENCODED_VALUE_ADDITION"]["retries"]
+
+
+if __name__ == "__main__":
+    logging.disable(logging.ERROR)  # The CRC errors of the corruption profiles
+    print(f"{READS} reads per profile, servo timeout {TIMEOUT} s")
+    for name, faults in PROFILES.items():
+        elapsed, latencies, failures, retries = run(faults)
+        p99 = latencies[int(len(latencies) * 0.99)]
+        print(
+            f"{name:<14} {READS / elapsed:6.0f} reads/s   median {statistics.median(latencies) * 1e3:5.2f} ms   "
+            f"p99 {p99 * 1e3:6.2f} ms   max {latencies[-1] * 1e3:6.1f} ms   retries {retries:3d}   failures {failures}"
+        )
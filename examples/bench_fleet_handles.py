@@ -0,0 +1,49 @@
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Import time of the library, memory and creation time of 10,000 axis handles, and the dispatch cost of a
+# received frame with one can.Notifier listener per axis versus a FrameDispatcher.
+
+AXES = 10_000
+FRAMES = 200
+
+
+def import_time(statement):
+    code = f"import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+    return min(float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout) for _ in range(5))
+
+
+def dispatch_time(notifier, message):
+    # What can.Notifier does for each received frame
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        for listener in notifier.listeners:
+            listener(message)
+    return (time.perf_counter() - start) / FRAMES
+
+
+if __name__ == "__main__":
+    print(f"import mks_servo_can              {import_time('import mks_servo_can') * 1e3:6.1f} ms")
+    print(f"import mks_servo_can, can         {import_time('import mks_servo_can, can') * 1e3:6.1f} ms")
+
+    import can
+
+    from mks_servo_can.mks_servo import FrameDispatcher, MksServo
+
+    bus = can.Bus(interface="virtual", channel="fleet")
+    message = can.Message(arbitration_id=1, data=[0x31, 0, 0, 0, 0, 0, 0, 0x32], is_extended_id=False)
+    for name in ("can.Notifier", "FrameDispatcher"):
+        notifier = can.Notifier(bus, [])
+        target = notifier if name == "can.Notifier" else FrameDispatcher(notifier)
+        tracemalloc.start()
+        start = time.perf_counter()
+        servos = [MksServo(bus, target, 1 + i % 2047) for i in range(AXES)]
+        created = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{name:<16} {AXES} axes: {created * 1e3:6.1f} ms to create   {memory / AXES:6.0f} bytes/axis   {dispatch_time(notifier, message) * 1e6:8.1f} us to dispatch a frame")
+        notifier.stop()
+        del servos
+    bus.shutdown()
@@ -0,0 +1,76 @@
+import time
+
+import can
+
+from mks_servo_can.io_scanner import IoScanner
+from mks_servo_can.mks_servo import FrameDispatcher, MksServo
+from mks_servo_can.simulator import ServoSimulator
+
+# Sweep time and cycle jitter of the IO scan versus the number of axes, on simulated drives modeling the
+# wire time of a 500 kbit/s bus. One output of every axis toggles every cycle, so each sweep reads all
+# the inputs and writes all the outputs. The sequential sweep calls read_io_port_status() and
+# write_io_port() axis after axis.
+
+BITRATE = 500000
+PERIOD = 0.02
+CYCLES = 200
+
+
+def setup(axes):
+    sim_bus = can.Bus(interface="virtual", channel=f"io-{axes}")
+    simulator = ServoSimulator(sim_bus, range(1, axes + 1), bitrate=BITRATE)
+    bus = can.Bus(interface="virtual", channel=f"io-{axes}")
+    notifier = can.Notifier(bus, [])
+    dispatcher = FrameDispatcher(notifier)
+    servos = [MksServo(bus, dispatcher, can_id) for can_id in range(1, axes + 1)]
+    return sim_bus, simulator, bus, notifier, servos
+
+
+def teardown(sim_bus, simulator, bus, notifier):
+    notifier.stop()
+    simulator.stop()
+    bus.shutdown()
+    sim_bus.shutdown()
+
+
+def bench_sequential(axes):
+    sim_bus, simulator, bus, notifier, servos = setup(axes)
+    sweeps = []
+    for cycle in range(CYCLES // 10):
+        start = time.perf_counter()
+        for servo in servos:
+            servo.write_io_port(out1=cycle % 2)
+            servo.read_io_port_status()
+        sweeps.append(time.perf_counter() - start)
+    teardown(sim_bus, simulator, bus, notifier)
+    return sum(sweeps) / len(sweeps)
+
+
+def bench_scanner(axes):
+    sim_bus, simulator, bus, notifier, servos = setup(axes)
+    scanner = IoScanner(servos, period=PERIOD)
+    edges = []
+
+    def toggle(axis, port, level):
+        edges.append(axis)
+        scanner.set_output(axis, 1, 1 - level)
+
+    scanner.on_change(toggle, ports=("OUT_1",))
+    scanner.run(1)  # First status of every axis, without change callbacks
+    for servo in servos:
+        scanner.set_output(servo.can_id, 1, 1 - (scanner.status(servo.can_id) >> 2 & 1))
+    report = scanner.run(CYCLES)
+    teardown(sim_bus, simulator, bus, notifier)
+    return report, len(edges)
+
+
+if __name__ == "__main__":
+    print(f"{CYCLES} cycles of {PERIOD * 1e3:.0f} ms, {BITRATE // 1000} kbit/s")
+    print(f"{'axes':>5} {'sequential':>12} {'sweep mean':>11} {'sweep p99':>10} {'jitter p99':>11} {'overruns':>9} {'lost':>5} {'edges':>6}")
+    for axes in (4, 8, 16, 32):
+        sequential = bench_sequential(axes)
+        report, edges = bench_scanner(axes)
+        print(
+            f"{axes:>5} {sequential * 1e3:9.2f} ms {report.sweep.mean * 1e3:8.2f} ms {report.sweep.percentile(99) * 1e3:7.2f} ms "
+            f"{report.jitter.percentile(99) * 1e3:8.2f} ms {report.jitter.overruns:>9} {report.lost:>5} {edges:>6}"
+        )
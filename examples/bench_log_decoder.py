@@ -0,0 +1,69 @@
+import can
+import numpy as np
+import os
+import tempfile
+import time
+
+from mks_servo_can.log_decoder import LogDecoder, iter_frames
+
+# Decoding speed of log_decoder on a synthetic candump log of position, speed and status responses
+# of 8 axes, versus reading the same log frame by frame with can.LogReader.
+
+FRAMES = 5_000_000
+CAN_IDS = np.arange(1, 9)
+
+
+def crc(can_id, data):
+    return (int(can_id) + sum(data)) & 0xFF
+
+
+def write_log(path):
+    rng = np.random.default_rng(0)
+    lines = []
+    for i in range(FRAMES):
+        can_id = CAN_IDS[i % len(CAN_IDS)]
+        kind = i // len(CAN_IDS) % 3
+        if kind == 0:
+            data = [0x31] + list(int(rng.integers(-(1 << 40), 1 << 40)).to_bytes(6, "big", signed=True))
+        elif kind == 1:
+            data = [0x32] + list(int(rng.integers(-3000, 3000)).to_bytes(2, "big", signed=True))
+        else:
+            data = [0xF1, 1]
+        data.append(crc(can_id, data))
+        lines.append(f"({1700000000 + i * 1e-4:.6f}) can0 {can_id:03X}#{bytes(data).hex().upper()} R\n")
+        if len(lines) == 100_000:
+            with open(path, "a") as log:
+                log.writelines(lines)
+            lines = []
+    with open(path, "a") as log:
+        log.writelines(lines)
+
+
+if __name__ == "__main__":
+    path = os.path.join(tempfile.mkdtemp(), "bench.log")
+    write_log(path)
+    print(f"{FRAMES} frames, {os.path.getsize(path) / 1e6:.0f} MB")
+
+    # decode_log() with the parsing and the decoding timed separately
+    decoder = LogDecoder()
+    parsing = decoding = 0
+    start = time.perf_counter()
+    for frames in iter_frames(path):
+        parsed = time.perf_counter()
+        decoder.feed(frames)
+        decoding += time.perf_counter() - parsed
+        parsing += parsed - start
+        start = time.perf_counter()
+    decoder.finish()
+    print(f"log_decoder         {decoder.frames / (parsing + decoding) / 1e6:6.2f} M frames/s   crc errors {decoder.crc_errors}   positions of axis 1: {len(decoder.signals[1]['position'])}")
+    print(f"  candump parsing   {decoder.frames / parsing / 1e6:6.2f} M frames/s")
+    print(f"  decoding          {decoder.frames / decoding / 1e6:6.2f} M frames/s   (CRC, op codes, signals by axis)")
+
+    start = time.perf_counter()
+    count = 0
+    for message in can.LogReader(path):
+        count += 1
+        if count == 500_000:
+            break
+    print(f"can.LogReader only  {count / (time.perf_counter() - start) / 1e6:6.2f} M frames/s   (parsing, no decoding)")
+    os.remove(path)
@@ -0,0 +1,89 @@
+import can
+import multiprocessing
+import statistics
+import time
+
+from collections import deque
+
+from mks_servo_can import MksServo
+from mks_servo_can.mux import CanMuxServer, MuxBus
+from mks_servo_can.simulator import ServoSimulator
+
+# Latency and throughput of the mux daemon versus in-process use, against simulated servos.
+# The simulator and the server share a virtual bus in this process, the clients are other processes.
+
+SOCKET = "/tmp/mks-servo-can-bench.sock"
+CAN_IDS = [1, 2, 3, 4]
+ROUND_TRIPS = 2000
+PIPELINED = 5000
+IN_FLIGHT = 32
+
+
+def measure(bus, can_id):
+    notifier = can.Notifier(bus, [])
+    servo = MksServo(bus, notifier, can_id)
+
+    # Round trip latency, one request at a time
+    latencies = []
+    for _ in range(ROUND_TRIPS):
+        start = time.perf_counter()
+        servo.read_encoder_value_addition()
+        latencies.append(time.perf_counter() - start)
+
+    # Throughput, up to IN_FLIGHT requests sent before waiting for the responses
+    start = time.perf_counter()
+    in_flight = deque()
+    answered = 0
+    for _ in range(PIPELINED):
+        if len(in_flight) == IN_FLIGHT:
+            answered += in_flight.popleft().result(5) is not None
+        in_flight.append(servo.send_generic(0x31, [0x31]))
+    answered += sum(future.result(5) is not None for future in in_flight)
+    throughput = answered / (time.perf_counter() - start)
+
+    notifier.stop()
+    latencies.sort()
+    return statistics.mean(latencies), latencies[int(len(latencies) * 0.99)], throughput
+
+
+def client(can_id, results):
+    bus = MuxBus(SOCKET)
+    results.put((can_id, measure(bus, can_id)))
+    bus.shutdown()
+
+
+def report(name, mean, p99, throughput):
+    print(f"{name:<28} mean {mean * 1e6:8.1f} us   p99 {p99 * 1e6:8.1f} us   {throughput:9.0f} req/s")
+
+
+if __name__ == "__main__":
+    simulator_bus = can.Bus(interface="virtual", channel="bench")
+    simulator = ServoSimulator(simulator_bus, CAN_IDS)
+
+    bus = can.Bus(interface="virtual", channel="bench")
+    report("in-process", *measure(bus, CAN_IDS[0]))
+    bus.shutdown()
+
+    server_bus = can.Bus(interface="virtual", channel="bench")
+    server = CanMuxServer(server_bus, SOCKET)
+    server.start()
+
+    bus = MuxBus(SOCKET)
+    report("mux, 1 client", *measure(bus, CAN_IDS[0]))
+    bus.shutdown()
+
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client, args=(can_id, results)) for can_id in CAN_IDS]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        can_id, measures = results.get()
+        report(f"mux, {len(CAN_IDS)} clients (id {can_id})", *measures)
+    for process in processes:
+        process.join()
+
+    print(f"forwarded {server.forwarded}, routed {server.routed}, broadcast {server.broadcast}")
+    server.stop()
+    server_bus.shutdown()
+    simulator.stop()
+    simulator_bus.shutdown()
@@ -0,0 +1,84 @@
+import time
+
+import can
+
+from mks_servo_can.mks_enums import Enable, MotorShaftProtectionStatus
+from mks_servo_can.mks_servo import FrameDispatcher, MksServo
+from mks_servo_can.recovery import RecoveryEngine
+from mks_servo_can.simulator import ServoSimulator
+
+# Time to recover axes tripped by the locked-rotor protection: the recovery engine (detection from the
+# polled protection state, release, enable, home and verify on all the axes in parallel) against the
+# manual procedure run axis after axis.
+
+AXES = 8
+TRIPPED = (2, 3, 5, 8)
+HOMING_TIME = 0.5
+POLL_PERIOD = 0.05
+
+
+def setup(channel):
+    sim_bus = can.Bus(interface="virtual", channel=channel)
+    simulator = ServoSimulator(sim_bus, range(1, AXES + 1), homing_time=HOMING_TIME)
+    bus = can.Bus(interface="virtual", channel=channel)
+    notifier = can.Notifier(bus, [])
+    dispatcher = FrameDispatcher(notifier)
+    servos = [MksServo(bus, dispatcher, can_id) for can_id in range(1, AXES + 1)]
+    return sim_bus, simulator, bus, notifier, servos
+
+
+def trip(simulator):
+    for can_id in TRIPPED:
+        axis = simulator.axes[can_id]
+        axis.stop()
+        axis.protected = True
+    return time.perf_counter()
+
+
+def teardown(sim_bus, simulator, bus, notifier):
+    notifier.stop()
+    simulator.stop()
+    bus.shutdown()
+    sim_bus.shutdown()
+
+
+def bench_manual():
+    sim_bus, simulator, bus, notifier, servos = setup("recovery-manual")
+    tripped = trip(simulator)
+    recovered = {}
+    for servo in servos:
+        if servo.read_motor_shaft_protection_state() == MotorShaftProtectionStatus.Protected:
+            servo.release_motor_shaft_locked_protection_state()
+            servo.enable_motor(Enable.Enable)
+            servo.b_go_home()
+            recovered[servo.can_id] = time.perf_counter() - tripped
+    teardown(sim_bus, simulator, bus, notifier)
+    return recovered
+
+
+def bench_engine():
+    sim_bus, simulator, bus, notifier, servos = setup("recovery-engine")
+    engine = RecoveryEngine(servos, poll_period=POLL_PERIOD)
+    engine.start()
+    time.sleep(POLL_PERIOD * 2)
+    tripped = trip(simulator)
+    time.sleep(POLL_PERIOD * 2)
+    engine.wait_idle(10)
+    engine.stop()
+    teardown(sim_bus, simulator, bus, notifier)
+    recovered = {event.axis: event.recovered - tripped for event in engine.events if event.state == "recovered"}
+    return recovered, engine.statistics()
+
+
+def report(name, recovered):
+    times = sorted(recovered.values())
+    print(f"{name:<16} recovered {len(times)}/{len(TRIPPED)}   mean {sum(times) / len(times):5.2f} s   line down {times[-1]:5.2f} s")
+
+
+if __name__ == "__main__":
+    print(f"{AXES} axes, {len(TRIPPED)} tripped, homing {HOMING_TIME} s, protection polled every {POLL_PERIOD * 1e3:.0f} ms")
+    report("manual", bench_manual())
+    recovered, statistics = bench_engine()
+    report("recovery engine", recovered)
+    for axis, s in statistics.items():
+        print(f"  axis {axis}: time to recover from detection {s['mean']:.3f} s")
@@ -0,0 +1,77 @@
+import gc
+import time
+import tracemalloc
+
+import can
+
+from mks_servo_can.mks_enums import MksCommands
+from mks_servo_can.mks_servo import MksServo
+
+# Allocations and duration of the steady-state request path: set_generic() reads, the read_encoder_value_addition()
+# and run_motor_absolute_motion_by_axis() wrappers. The bus answers in send() with preallocated frames, so only the
+# allocations of the library are measured.
+
+REQUESTS = 20_000
+
+
+class LoopbackBus(can.BusABC):
+    """Answers the commands synchronously with fixed responses, also passed to MksServo as the notifier."""
+
+    def __init__(self, can_id):
+        self.handler = None
+        self._responses = {}
+        for data in (
+            [MksCommands.READ_ENCODED_VALUE_ADDITION.value, 0, 0, 0, 1, 0x23, 0x45],
+            [MksCommands.QUERY_MOTOR_STATUS_COMMAND.value, 1],  # MotorStop
+            [MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_AXIS_COMMAND.value, 2],  # RunComplete
+        ):
+            self._responses[data[0]] = bytearray(data + [(can_id + sum(data)) & 0xFF])
+        self.channel_info = "loopback"
+        super().__init__(channel="loopback")
+
+    def send(self, msg, timeout=None):
+        self.handler(msg.arbitration_id, self._responses[msg.data[0]])
+
+    def _recv_internal(self, timeout):
+        return None, False
+
+    def add_frame_handler(self, can_id, handler):
+        self.handler = handler
+
+
+def measure(name, request):
+    for _ in range(1000):  # Warm up the pools and caches
+        request()
+
+    collections = [0]
+
+    def count(phase, info):
+        if phase == "start":
+            collections[0] += 1
+
+    gc.callbacks.append(count)
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        request()
+    elapsed = time.perf_counter() - start
+    gc.callbacks.remove(count)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(REQUESTS):
+        request()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<36} {elapsed / REQUESTS * 1e6:6.2f} us/request   {peak - before:6d} B peak   {current - before:6d} B retained   {collections[0]:4d} GC runs")
+
+
+if __name__ == "__main__":
+    bus = LoopbackBus(1)
+    servo = MksServo(bus, bus, 1)
+    read = MksCommands.READ_ENCODED_VALUE_ADDITION
+    print(f"{REQUESTS} requests each")
+    measure("set_generic(READ_ENCODED_VALUE_ADDITION)", lambda: servo.set_generic(read, 8, [read.value]))
+    measure("read_encoder_value_addition()", servo.read_encoder_value_addition)
+    measure("run_motor_absolute_motion_by_axis()", lambda: servo.run_motor_absolute_motion_by_axis(600, 10, 0x4000))
+    bus.shutdown()
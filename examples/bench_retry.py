@@ -0,0 +1,62 @@
+import random
+import time
+
+import can
+
+from mks_servo_can.mks_servo import FrameDispatcher, MksServo
+from mks_servo_can.retry import RetryEngine
+from mks_servo_can.simulator import ServoSimulator
+
+# Encoder reads on a bus losing a fraction of the responses: waiting the full timeout and giving up (as before
+# the retry engine), versus resending the reads after the short round trip based timeout.
+
+READS = 1000
+TIMEOUT = 0.5
+
+
+class LossyDispatcher(FrameDispatcher):
+    """Drops a fraction of the received frames."""
+
+    __slots__ = ("loss", "random")
+
+    def __init__(self, notifier, loss):
+        super().__init__(notifier)
+        self.loss = loss
+        self.random = random.Random(1)
+
+    def __call__(self, message):
+        if self.random.random() >= self.loss:
+            super().__call__(message)
+
+
+def run(loss, retry):
+    sim_bus = can.Bus(interface="virtual", channel="retry")
+    simulator = ServoSimulator(sim_bus, [1])
+    bus = can.Bus(interface="virtual", channel="retry")
+    notifier = can.Notifier(bus, [])
+    servo = MksServo(bus, LossyDispatcher(notifier, loss), 1, retry=retry)
+    servo.timeout = TIMEOUT
+    worst = 0.0
+    start = time.perf_counter()
+    for _ in range(READS):
+        t = time.perf_counter()
+        servo.read_encoder_value_addition()
+        worst = max(worst, time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    notifier.stop()
+    simulator.stop()
+    bus.shutdown()
+    sim_bus.shutdown()
+    stats = retry.statistics()["READ_ENCODED_VALUE_ADDITION"]
+    return elapsed, worst, stats
+
+
+if __name__ == "__main__":
+    print(f"{READS} reads, servo timeout {TIMEOUT} s")
+    for loss in (0.0, 0.01, 0.05):
+        for name, retry in (("full timeout", RetryEngine(max_retries=0, min_timeout=TIMEOUT)), ("retry engine", RetryEngine())):
+            elapsed, worst, stats = run(loss, retry)
+            print(
+                f"loss {loss:4.0%}  {name:<12}  {READS / elapsed:7.0f} reads/s   worst {worst * 1e3:6.1f} ms   "
+                f"retries {stats['retries']:3d}   failures {stats['failures']:3d}   srtt {stats['srtt'] * 1e3:5.2f} ms"
+            )
@@ -0,0 +1,69 @@
+import can
+import time
+
+from collections import deque
+
+from mks_servo_can import MksServo
+from mks_servo_can.mks_enums import MksCommands
+from mks_servo_can.simulator import ServoSimulator, SlcanPtyAdapter
+from mks_servo_can.slcan import BatchedSlcanBus
+
+# Sustained frame rates of the stock python-can slcan bus versus BatchedSlcanBus, against a slcan
+# adapter stand-in on a pseudo-terminal bridged to simulated servos (POSIX only).
+
+DURATION = 3
+IN_FLIGHT = 16
+NO_AXIS = 0x7F
+
+
+def measure(bus, adapter):
+    notifier = can.Notifier(bus, [])
+    servo = MksServo(bus, notifier, 1)
+
+    # Frames to an absent axis, the rate at which the adapter receives them
+    received = adapter.frames_received
+    message = MksServo(bus, notifier, NO_AXIS).create_can_msg([MksCommands.QUERY_MOTOR_STATUS_COMMAND.value])
+    start = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - start < DURATION:
+        bus.send(message)
+        sent += 1
+    while adapter.frames_received - received < sent:
+        time.sleep(0.001)
+    frame_rate = sent / (time.perf_counter() - start)
+
+    # Pipelined requests and responses
+    in_flight = deque()
+    answered = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < DURATION:
+        if len(in_flight) == IN_FLIGHT:
+            answered += in_flight.popleft().result(1) is not None
+        in_flight.append(servo.send_generic(MksCommands.READ_ENCODED_VALUE_ADDITION, [0x31]))
+    answered += sum(future.result(1) is not None for future in in_flight)
+    request_rate = answered / (time.perf_counter() - start)
+
+    notifier.stop()
+    return frame_rate, request_rate
+
+
+if __name__ == "__main__":
+    simulator_bus = can.Bus(interface="virtual", channel="slcan")
+    simulator = ServoSimulator(simulator_bus, [1])
+
+    for name in ("python-can slcan", "BatchedSlcanBus"):
+        adapter = SlcanPtyAdapter(can.Bus(interface="virtual", channel="slcan"))
+        if name == "BatchedSlcanBus":
+            bus = BatchedSlcanBus(adapter.port, bitrate=500000)
+        else:
+            bus = can.Bus(interface="slcan", channel=adapter.port, bitrate=500000, sleep_after_open=0)
+        frame_rate, request_rate = measure(bus, adapter)
+        print(f"{name:<18} {frame_rate:9.0f} frames/s delivered   {request_rate:7.0f} req/s pipelined")
+        if isinstance(bus, BatchedSlcanBus):
+            print(f"{'':<18} {bus.frames_sent / bus.writes:.1f} frames per serial write")
+        bus.shutdown()
+        adapter.stop()
+        adapter.bus.shutdown()
+
+    simulator.stop()
+    simulator_bus.shutdown()
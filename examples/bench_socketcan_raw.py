@@ -0,0 +1,57 @@
+import can
+import multiprocessing
+import socket
+import time
+
+from collections import deque
+
+from mks_servo_can import MksServo
+from mks_servo_can.simulator import ServoSimulator, SocketCanStandIn
+from mks_servo_can.socketcan_raw import RawFrameNotifier, RawSocketCanBus
+
+# Receive path cost of can.Notifier (a can.Message per frame, every listener called for every frame) versus
+# RawFrameNotifier (batched reads, frames dispatched by CAN ID to MksServo.handle_frame), on the same raw
+# socket. The CPU time is the one of the application process. The simulated servos run in another process
+# behind a SocketCanStandIn (Linux only).
+
+CAN_IDS = list(range(1, 9))
+REQUESTS = 20000
+IN_FLIGHT = 32
+
+
+def simulate(sock):
+    simulator_bus = can.Bus(interface="virtual", channel="socketcan")
+    _simulator = ServoSimulator(simulator_bus, CAN_IDS)
+    _stand_in = SocketCanStandIn(can.Bus(interface="virtual", channel="socketcan"), sock)
+    while True:
+        time.sleep(1)
+
+
+def measure(bus, notifier):
+    servos = [MksServo(bus, notifier, can_id) for can_id in CAN_IDS]
+    in_flight = deque()
+    answered = 0
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    for i in range(REQUESTS):
+        if len(in_flight) == IN_FLIGHT:
+            answered += in_flight.popleft().result(5) is not None
+        in_flight.append(servos[i % len(servos)].send_generic(0x31, [0x31]))
+    answered += sum(future.result(5) is not None for future in in_flight)
+    return answered / (time.perf_counter() - start), (time.process_time() - cpu_start) / answered
+
+
+if __name__ == "__main__":
+    for name in ("can.Notifier", "RawFrameNotifier"):
+        application, far = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        process = multiprocessing.get_context("fork").Process(target=simulate, args=(far,), daemon=True)
+        process.start()
+        far.close()
+        bus = RawSocketCanBus(sock=application)
+        notifier = can.Notifier(bus, []) if name == "can.Notifier" else RawFrameNotifier(bus)
+        rate, cpu = measure(bus, notifier)
+        print(f"{name:<18} {rate:8.0f} req/s   {cpu * 1e6:5.1f} us CPU per request   {bus.frames_received / max(bus.batches, 1):5.1f} frames per read")
+        notifier.stop()
+        bus.shutdown()
+        process.terminate()
+        process.join()
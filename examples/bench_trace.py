@@ -0,0 +1,47 @@
+import contextlib
+import io
+import logging
+import os
+import tempfile
+import timeit
+
+import can
+
+from mks_servo_can.trace import RX, TIMEOUT, TX, TraceBuffer, format_records, load
+
+# Cost of recording a frame in the trace ring buffer, compared with the print() and logging calls it replaces,
+# then a dump and its decoded view.
+
+CALLS = 200_000
+
+if __name__ == "__main__":
+    trace = TraceBuffer(capacity=65536)
+    data = bytearray([0x31, 0, 0, 0, 1, 0x23, 0x45, 0x9A])
+    message = can.Message(arbitration_id=1, data=data, is_extended_id=False)
+    logger = logging.getLogger("bench")
+    logger.propagate = False
+    logger.addHandler(logging.StreamHandler(io.StringIO()))
+    logger.setLevel(logging.INFO)
+
+    def print_frame():
+        print("message.data:", data)
+        print("op_code:", data[0])
+
+    candidates = {
+        "TraceBuffer.record()": lambda: trace.record(RX, 1, data),
+        "logging.debug(f-string), disabled": lambda: logger.debug(f"CAN Message Created: {message}"),
+        "logging.info() to a StringIO": lambda: logger.info("message.data: %s", data),
+        "print() to /dev/null": print_frame,
+    }
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = {name: min(timeit.repeat(call, number=CALLS, repeat=3)) / CALLS for name, call in candidates.items()}
+    for name, seconds in results.items():
+        print(f"{name:<36} {seconds * 1e9:7.0f} ns/frame")
+
+    trace.record(TX, 9, bytearray([0x31, 0x31, 0x6A]), TIMEOUT)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.bin")
+        start = timeit.default_timer()
+        trace.dump(path)
+        print(f"dump of {trace.capacity} records: {(timeit.default_timer() - start) * 1e3:.1f} ms, {os.path.getsize(path)} bytes")
+        print(format_records(load(path)[-3:]))
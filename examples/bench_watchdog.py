@@ -0,0 +1,115 @@
+import statistics
+import threading
+import time
+
+import can
+
+from mks_servo_can.mks_servo import FrameDispatcher, MksServo
+from mks_servo_can.simulator import ServoSimulator
+from mks_servo_can.watchdog import FollowingErrorWatchdog
+
+# Time from a following error injected in the simulator until all the axes are stopped: the watchdog
+# (pipelined reads, vectorized check, prebuilt stop frames, group stop) against an application loop
+# reading each axis with read_motor_shaft_angle_error() and stopping each with emergency_stop_motor().
+
+BITRATE = 500000
+LIMIT = 51200 * 2 // 360  # 2 degrees
+PERIOD = 0.005
+TRIALS = 40
+
+
+def setup(axes):
+    sim_bus = can.Bus(interface="virtual", channel="watchdog")
+    simulator = ServoSimulator(sim_bus, range(1, axes + 1), bitrate=BITRATE)
+    bus = can.Bus(interface="virtual", channel="watchdog")
+    notifier = can.Notifier(bus, [])
+    dispatcher = FrameDispatcher(notifier)
+    servos = [MksServo(bus, dispatcher, can_id) for can_id in range(1, axes + 1)]
+    return sim_bus, simulator, bus, notifier, servos
+
+
+def arm(simulator):
+    for axis in simulator.axes.values():
+        axis.shaft_angle_error = 0
+        axis.run(100)
+    time.sleep(PERIOD * 3)
+
+
+def inject(simulator, axes):
+    """Injects the error at a random point of the cycle and waits until all the axes are stopped."""
+    time.sleep(PERIOD * (0.5 + (time.perf_counter_ns() % 1000) / 1000))
+    injected = time.perf_counter()
+    simulator.axes[axes].shaft_angle_error = 51200 // 36  # 10 degrees, on the last axis
+    while any(axis.running for axis in simulator.axes.values()):
+        if time.perf_counter() - injected > 2:
+            return None
+        time.sleep(0.0002)
+    return time.perf_counter() - injected
+
+
+def bench_watchdog(axes, group):
+    sim_bus, simulator, bus, notifier, servos = setup(axes)
+    if group:
+        for servo in servos:
+            servo.set_group_id(0x50)
+    stopped, detection = [], []
+    for _ in range(TRIALS):
+        arm(simulator)
+        watchdog = FollowingErrorWatchdog(servos, LIMIT, period=PERIOD, group_id=0x50 if group else None)
+        watchdog.start()
+        stopped.append(inject(simulator, axes))
+        trip = watchdog.wait(1)
+        watchdog.stop()
+        detection.append(trip.detection_to_stop)
+    notifier.stop()
+    simulator.stop()
+    bus.shutdown()
+    sim_bus.shutdown()
+    return stopped, detection
+
+
+def bench_polling(axes):
+    sim_bus, simulator, bus, notifier, servos = setup(axes)
+    stopped = []
+    for _ in range(TRIALS):
+        arm(simulator)
+        running = threading.Event()
+        running.set()
+
+        def poll():
+            while running.is_set():
+                cycle = time.perf_counter()
+                if any(abs(servo.read_motor_shaft_angle_error() or 0) > LIMIT for servo in servos):
+                    for servo in servos:
+                        servo.emergency_stop_motor()
+                    return
+                time.sleep(max(0.0, cycle + PERIOD - time.perf_counter()))
+
+        thread = threading.Thread(target=poll)
+        thread.start()
+        stopped.append(inject(simulator, axes))
+        running.clear()
+        thread.join()
+    notifier.stop()
+    simulator.stop()
+    bus.shutdown()
+    sim_bus.shutdown()
+    return stopped
+
+
+def report(name, stopped):
+    stopped = sorted(s for s in stopped if s is not None)
+    print(f"{name:<30} injection to all stopped: median {statistics.median(stopped) * 1e3:6.2f} ms   max {stopped[-1] * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    print(f"{TRIALS} trials, {BITRATE // 1000} kbit/s, period {PERIOD * 1e3:.0f} ms, limit {LIMIT} (2 degrees)")
+    for axes in (8, 32):
+        print(f"{axes} axes")
+        report("  application polling", bench_polling(axes))
+        stopped, detection = bench_watchdog(axes, group=False)
+        report("  watchdog, per-axis stops", stopped)
+        print(f"{'':30} detection to stop sent: median {statistics.median(detection) * 1e6:6.0f} us")
+        stopped, detection = bench_watchdog(axes, group=True)
+        report("  watchdog, group stop", stopped)
+        print(f"{'':30} detection to stop sent: median {statistics.median(detection) * 1e6:6.0f} us")
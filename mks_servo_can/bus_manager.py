@@ -0,0 +1,186 @@
+"""Several CAN channels behind one object.
+
+BusManager owns one bus and one can.Notifier per channel and addresses the axes as (bus name, CAN ID).
+Each bus is read and dispatched by its own Notifier thread, and can optionally run its I/O in a
+worker process (see bus_process.BusProcess). Group operations run the buses in parallel:
+
+    manager = BusManager()
+    manager.add_bus("left", interface="slcan", channel="/dev/ttyACM0", bitrate=500000)
+    manager.add_bus("right", interface="slcan", channel="/dev/ttyACM1", bitrate=500000, isolated=True)
+    positions = manager.call("read_encoder_value_addition")
+    manager["left", 3].run_motor_absolute_motion_by_axis(600, 10, 0x4000)
+    manager.shutdown()
+"""
+
+import time
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import can
+
+from .bus_process import BusProcess
+from .mks_servo import MksServo
+from .retry import RetryEngine
+
+
+class bus_manager_error(Exception):
+    """Exception raised for unknown or duplicated buses."""
+
+    pass
+
+
+class _Channel:
+    def __init__(self, bus, notifier, bus_process):
+        self.bus = bus
+        self.notifier = notifier
+        self.bus_process = bus_process
+        self.retry = RetryEngine()  # The round trip times depend on the bus
+        self.servos = {}
+
+
+class BusManager:
+    """Manages the buses, their notifiers and the MksServo instances of a machine."""
+
+    def __init__(self):
+        self._channels = {}
+        self._executor = None
+
+    def add_bus(self, name, bus=None, isolated=False, bus_factory=None, can_ids=(), **bus_kwargs):
+        """
+        Adds a CAN channel.
+
+        Args:
+            name (str): The bus name used in the axis keys.
+            bus (can.BusABC, optional): An open bus, by default the bus is opened with can.Bus(**bus_kwargs).
+            isolated (bool): Runs the bus I/O in a worker process (BusProcess), bus must be None.
+            bus_factory (callable, optional): Creates the bus in the worker process, see BusProcess.
+            can_ids (iterable of int): CAN IDs of the axes to create now, more can be added with servo().
+            bus_kwargs: The arguments of can.Bus, e.g. interface="slcan", channel="COM3", bitrate=500000.
+
+        Raises:
+            bus_manager_error: If the name is already used.
+        """
+        if name in self._channels:
+            raise bus_manager_error(f"Bus {name} already exists")
+        bus_process = None
+        if isolated:
+            if bus is not None:
+                raise bus_manager_error("An isolated bus is opened by its worker process, use bus_factory or bus_kwargs")
+            bus_process = BusProcess(bus_factory, **bus_kwargs)
+            bus_process.start()
+            bus = bus_process.bus
+        elif bus is None:
+            bus = bus_factory() if bus_factory is not None else can.Bus(**bus_kwargs)
+        self._channels[name] = _Channel(bus, can.Notifier(bus, []), bus_process)
+        if self._executor is not None:
+            self._executor.shutdown()  # Recreated with one worker per bus
+            self._executor = None
+        for can_id in can_ids:
+            self.servo(name, can_id)
+
+    def bus(self, name):
+        """Returns the python-can bus of a channel."""
+        return self._channel(name).bus
+
+    def _channel(self, name):
+        try:
+            return self._channels[name]
+        except KeyError:
+            raise bus_manager_error(f"Unknown bus {name}")
+
+    def servo(self, name, can_id):
+        """
+        Returns the MksServo of an axis, created on first use.
+
+        Args:
+            name (str): The bus name.
+            can_id (int): The CAN ID of the axis.
+        """
+        channel = self._channel(name)
+        servo = channel.servos.get(can_id)
+        if servo is None:
+            servo = channel.servos[can_id] = MksServo(channel.bus, channel.notifier, can_id, retry=channel.retry)
+        return servo
+
+    def __getitem__(self, key):
+        return self.servo(*key)
+
+    def axes(self):
+        """Returns the (bus name, CAN ID) keys of all the axes."""
+        return [(name, can_id) for name, channel in self._channels.items() for can_id in channel.servos]
+
+    def _by_bus(self, axes):
+        groups = {}
+        for name, can_id in self.axes() if axes is None else axes:
+            groups.setdefault(name, []).append(self.servo(name, can_id))
+        return groups
+
+    def call(self, method, *args, axes=None, **kwargs):
+        """
+        Calls a MksServo method on many axes, the buses in parallel and the axes of a bus one after the other.
+
+        Args:
+            method (str): The method name, e.g. "read_encoder_value_addition".
+            args, kwargs: The arguments of the method.
+            axes (list, optional): The (bus name, CAN ID) keys, all the axes by default.
+
+        Returns:
+            dict: The result by axis key. An exception raised by the method is returned as the result.
+        """
+
+        def run(name, servos):
+            results = {}
+            for servo in servos:
+                try:
+                    results[(name, servo.can_id)] = getattr(servo, method)(*args, **kwargs)
+                except Exception as e:
+                    results[(name, servo.can_id)] = e
+            return results
+
+        groups = self._by_bus(axes)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, len(self._channels)))
+        results = {}
+        for partial in self._executor.map(lambda item: run(*item), groups.items()):
+            results.update(partial)
+        return results
+
+    def send(self, op_code, data=[], axes=None, timeout=None):
+        """
+        Sends a command to many axes without waiting between them (pipelined on every bus), then waits for the responses.
+
+        Args:
+            op_code (MksCommands or int): The command.
+            data (list of int): The data of the command.
+            axes (list, optional): The (bus name, CAN ID) keys, all the axes by default.
+            timeout (float, optional): Seconds to wait for all the responses, the servo timeout by default.
+
+        Returns:
+            dict: The response data by axis key, None if there was no response.
+        """
+        futures = {}
+        for name, servos in self._by_bus(axes).items():
+            for servo in servos:
+                futures[(name, servo.can_id)] = servo.send_generic(op_code, list(data))
+        deadline = time.perf_counter() + (MksServo.DEFAULT_TIMEOUT if timeout is None else timeout)
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result(max(0.0, deadline - time.perf_counter()))
+            except FutureTimeoutError:
+                future.cancel()
+                results[key] = None
+        return results
+
+    def shutdown(self):
+        """Stops the notifiers and the worker processes, and shuts the buses down."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for channel in self._channels.values():
+            channel.notifier.stop()
+            if channel.bus_process is not None:
+                channel.bus_process.stop()
+            else:
+                channel.bus.shutdown()
+        self._channels.clear()
@@ -0,0 +1,329 @@
+"""CAN bus I/O in a dedicated process.
+
+Heavy work in the application (NumPy, UI, ...) holds the GIL and delays the threads that read the
+adapter, which inflates the response latency and can overflow the adapter buffers. BusProcess runs
+the python-can bus (the adapter driver, e.g. the slcan serial parser, and the frame timestamping) in a
+separate process. It exchanges the frames with the application through two single-producer
+single-consumer rings in shared memory, without locks. A consumer that finds its ring empty polls it
+with doubling sleeps, which keeps the response latency low while the frames flow (a sent request restarts
+the polling of the responses), then blocks on a semaphore that the producer only signals while the
+consumer waits. The application gets a python-can bus, so MksServo and can.Notifier are used as usual:
+
+    bus_process = BusProcess(interface="slcan", channel="/dev/ttyACM0", bitrate=500000)
+    bus_process.start()
+    notifier = can.Notifier(bus_process.bus, [])
+    servo = MksServo(bus_process.bus, notifier, 1)
+    ...
+    notifier.stop()
+    bus_process.stop()
+
+Only the bus runs in the child process: the MksServo request encoding, the response decoding and the
+dispatch to the waiting requests stay in the application, behind can.Notifier.
+
+See examples/bench_bus_process.py for the latency with and without the isolation.
+"""
+
+import logging
+import multiprocessing
+import struct
+import sys
+import threading
+import time
+
+from multiprocessing import resource_tracker, shared_memory
+
+import can
+
+# timestamp, arbitration_id, flags, dlc, data
+_SLOT = struct.Struct("<dIBB2x8s")
+_EXTENDED = 0x01
+_REMOTE = 0x02
+_ERROR = 0x04
+
+# Header of a ring, uint64 words on separate cache lines: the producer index, the consumer index,
+# the capacity, the closed flag, the number of frames dropped because the ring was full and the
+# flag set while the consumer waits for a frame.
+_HEAD = 0
+_TAIL = 64
+_CAPACITY = 128
+_CLOSED = 192
+_DROPPED = 256
+_WAITING = 320
+_HEADER_SIZE = 384
+
+# A consumer polling an empty ring sleeps for doubling intervals from _MIN_BACKOFF up to _MAX_BACKOFF,
+# and blocks after _POLLS empty polls (about 5 ms)
+_MIN_BACKOFF = 0.00005
+_MAX_BACKOFF = 0.0001
+_POLLS = 50
+
+
+class FrameRing:
+    """A single-producer single-consumer ring of CAN frames in shared memory.
+
+    The producer writes a slot then publishes it by incrementing the head, the consumer reads a slot then
+    releases it by incrementing the tail. Each index is written by one side only. The doorbell semaphore
+    wakes up a consumer blocked in wait().
+    """
+
+    def __init__(self, shm, doorbell, owner):
+        self.shm = shm
+        self.doorbell = doorbell
+        self._words = shm.buf.cast("Q")
+        self.capacity = self._words[_CAPACITY // 8]
+        self._owner = owner
+        self._polls = 0
+
+    @classmethod
+    def create(cls, capacity=4096):
+        """Creates a ring able to hold capacity frames."""
+        shm = shared_memory.SharedMemory(create=True, size=_HEADER_SIZE + _SLOT.size * capacity)
+        shm.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+        shm.buf.cast("Q")[_CAPACITY // 8] = capacity
+        return cls(shm, multiprocessing.Semaphore(0), True)
+
+    @classmethod
+    def attach(cls, name, doorbell):
+        """Attaches to a ring created by another process, doorbell is the doorbell attribute of the created ring."""
+        if sys.version_info >= (3, 13):
+            return cls(shared_memory.SharedMemory(name=name, track=False), doorbell, False)
+        # Only the creator removes the block, the resource tracker of this process must not
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, doorbell, False)
+
+    @property
+    def name(self):
+        """str: The name of the shared memory block."""
+        return self.shm.name
+
+    @property
+    def closed(self):
+        """bool: True once close() was called by either side."""
+        return self._words[_CLOSED // 8] != 0
+
+    @property
+    def dropped(self):
+        """int: Number of frames dropped because the ring was full."""
+        return self._words[_DROPPED // 8]
+
+    def close(self):
+        """Marks the ring as closed and releases it, the creator also removes the shared memory block."""
+        self._words[_CLOSED // 8] = 1
+        self.doorbell.release()
+        self._words.release()
+        self.shm.close()
+        if self._owner:
+            if sys.version_info < (3, 13):
+                # A child process sharing the resource tracker may have unregistered the block in attach()
+                resource_tracker.register(self.shm._name, "shared_memory")
+            self.shm.unlink()
+
+    def __len__(self):
+        return self._words[_HEAD // 8] - self._words[_TAIL // 8]
+
+    def push(self, message):
+        """
+        Adds a frame (producer side).
+
+        Returns:
+            bool: False if the ring is full, the frame is dropped.
+        """
+        head = self._words[_HEAD // 8]
+        if head - self._words[_TAIL // 8] >= self.capacity:
+            self._words[_DROPPED // 8] += 1
+            return False
+        flags = (_EXTENDED if message.is_extended_id else 0) | (_REMOTE if message.is_remote_frame else 0) | (_ERROR if message.is_error_frame else 0)
+        _SLOT.pack_into(self.shm.buf, _HEADER_SIZE + (head % self.capacity) * _SLOT.size, message.timestamp, message.arbitration_id, flags, message.dlc, bytes(message.data))
+        self._words[_HEAD // 8] = head + 1
+        if self._words[_WAITING // 8]:
+            self.doorbell.release()
+        return True
+
+    def pop(self):
+        """
+        Removes the oldest frame (consumer side).
+
+        Returns:
+            can.Message: The frame, None if the ring is empty.
+        """
+        tail = self._words[_TAIL // 8]
+        if tail == self._words[_HEAD // 8]:
+            return None
+        timestamp, arbitration_id, flags, dlc, data = _SLOT.unpack_from(self.shm.buf, _HEADER_SIZE + (tail % self.capacity) * _SLOT.size)
+        self._words[_TAIL // 8] = tail + 1
+        self._polls = 0
+        return can.Message(
+            timestamp=timestamp,
+            arbitration_id=arbitration_id,
+            is_extended_id=bool(flags & _EXTENDED),
+            is_remote_frame=bool(flags & _REMOTE),
+            is_error_frame=bool(flags & _ERROR),
+            dlc=dlc,
+            data=data[:dlc],
+        )
+
+    def reset_backoff(self):
+        """Polls the ring at the fastest rate again, e.g. when a frame is expected soon."""
+        self._polls = 0
+
+    def idle(self, timeout):
+        """
+        Waits for a frame after pop() found the ring empty (consumer side).
+
+        The first calls after a frame sleep for doubling intervals, which is faster than a wakeup when the
+        consumer process is busy and the frames flow, the next ones block in wait().
+
+        Args:
+            timeout (float): Maximum seconds to wait.
+        """
+        if self._polls < _POLLS:
+            time.sleep(min(_MIN_BACKOFF * 2**self._polls, _MAX_BACKOFF, timeout))
+            self._polls += 1
+            return
+        self.wait(timeout)
+
+    def wait(self, timeout):
+        """
+        Blocks until a frame is pushed or the ring is closed (consumer side).
+
+        Args:
+            timeout (float): Maximum seconds to wait. It also bounds the delay of a wakeup missed because
+                the producer read the waiting flag before the consumer wrote it.
+        """
+        self._words[_WAITING // 8] = 1
+        try:
+            if self._words[_HEAD // 8] == self._words[_TAIL // 8] and not self.closed:
+                self.doorbell.acquire(timeout=timeout)
+        finally:
+            self._words[_WAITING // 8] = 0
+        while self.doorbell.acquire(False):
+            pass  # Signals of the frames pushed while waking up
+
+
+class RingBus(can.BusABC):
+    """The application side of a BusProcess, a python-can bus reading and writing the rings."""
+
+    def __init__(self, tx, rx, max_wait, channel="bus_process", **kwargs):
+        self._tx = tx
+        self._rx = rx
+        self._max_wait = max_wait
+        self._send_lock = threading.Lock()  # send() may be called from several threads, the ring has one producer
+        self.channel = channel
+        self.channel_info = channel
+        super().__init__(channel=channel, **kwargs)
+
+    def send(self, msg, timeout=None):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        backoff = _MIN_BACKOFF
+        with self._send_lock:
+            while not self._tx.push(msg):
+                if self._tx.closed or (deadline is not None and time.perf_counter() > deadline):
+                    raise can.CanOperationError("The bus process transmit ring is full")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self._max_wait)
+        self._rx.reset_backoff()  # The response follows
+
+    def _recv_internal(self, timeout):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            message = self._rx.pop()
+            if message is not None:
+                return message, False
+            if self._rx.closed:
+                raise can.CanOperationError("The bus process is stopped")
+            wait = self._max_wait
+            if deadline is not None:
+                wait = min(wait, deadline - time.perf_counter())
+                if wait <= 0:
+                    return None, False
+            self._rx.idle(wait)
+
+
+def _io_main(tx_name, tx_doorbell, rx_name, rx_doorbell, bus_factory, bus_kwargs, max_wait):
+    tx = FrameRing.attach(tx_name, tx_doorbell)
+    rx = FrameRing.attach(rx_name, rx_doorbell)
+    bus = bus_factory() if bus_factory is not None else can.Bus(**bus_kwargs)
+
+    def receive():
+        # Blocking the adapter reads would only move the overflow to the adapter buffers, the frames are
+        # dropped instead, counted in the ring and reported once per overflow
+        overflow = False
+        while not tx.closed:
+            message = bus.recv(0.1)
+            if message is None:
+                continue
+            if rx.push(message):
+                overflow = False
+            elif not overflow:
+                overflow = True
+                logging.warning(f"The application does not read the frames fast enough, {rx.dropped} dropped")
+
+    receiver = threading.Thread(target=receive, daemon=True)
+    receiver.start()
+    while not tx.closed:
+        message = tx.pop()
+        if message is None:
+            tx.idle(max_wait)
+            continue
+        try:
+            bus.send(message)
+        except can.CanError as e:
+            logging.error(f"Error sending message: {e}")
+    receiver.join()
+    bus.shutdown()
+    rx.close()
+    tx.close()
+
+
+class BusProcess:
+    """Runs a python-can bus in a child process.
+
+    Attributes:
+        bus (RingBus): The bus to use in the application, available after start().
+    """
+
+    def __init__(self, bus_factory=None, capacity=4096, max_wait=0.01, **bus_kwargs):
+        """
+        Args:
+            bus_factory (callable, optional): Called in the child process to create the bus, instead of
+                can.Bus(**bus_kwargs). It must be picklable (e.g. a module level function or functools.partial).
+            capacity (int): Number of frames of each ring.
+            max_wait (float): Maximum seconds a side sleeps on an empty ring or a full transmit ring before checking
+                it again. The frames wake the sleeping side up, this only bounds the delay of a missed wakeup.
+            bus_kwargs: The arguments of can.Bus, e.g. interface="slcan", channel="COM3", bitrate=500000.
+        """
+        self.bus_factory = bus_factory
+        self.bus_kwargs = bus_kwargs
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.bus = None
+        self._tx = None
+        self._rx = None
+        self._process = None
+
+    @property
+    def dropped(self):
+        """int: Number of received frames dropped because the application did not read them fast enough."""
+        return self._rx.dropped
+
+    def start(self):
+        """Starts the child process."""
+        self._tx = FrameRing.create(self.capacity)
+        self._rx = FrameRing.create(self.capacity)
+        self._process = multiprocessing.Process(
+            target=_io_main, args=(self._tx.name, self._tx.doorbell, self._rx.name, self._rx.doorbell, self.bus_factory, self.bus_kwargs, self.max_wait), daemon=True
+        )
+        self._process.start()
+        self.bus = RingBus(self._tx, self._rx, self.max_wait, channel=self.bus_kwargs.get("channel", "bus_process"))
+
+    def stop(self, timeout=2):
+        """Stops the child process, the bus is shut down."""
+        self.bus.shutdown()
+        self._tx._words[_CLOSED // 8] = 1
+        self._tx.doorbell.release()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._tx.close()
+        self._rx.close()
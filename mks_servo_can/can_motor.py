@@ -99,7 +99,8 @@ def query_motor_status(self):
 
 
 def enable_motor(self, enable: Enable):
-    return self.set_generic_status(MksCommands.ENABLE_MOTOR_COMMAND, enable)
+    # Also takes a bool, as in the examples
+    return self.set_generic_status(MksCommands.ENABLE_MOTOR_COMMAND, enable.value if isinstance(enable, Enable) else int(enable))
 
 
 def emergency_stop_motor(self):
@@ -140,6 +141,31 @@ def run_motor_in_speed_mode(self, direction: Direction, speed, acceleration):
     return self.set_generic_status(MksCommands.RUN_MOTOR_SPEED_MODE_COMMAND, cmd)
 
 
+def nb_run_motor_in_speed_mode(self, direction: Direction, speed, acceleration):
+    """
+    Sets the speed mode without waiting for the response (Non blocked). See run_motor_in_speed_mode.
+
+    Args:
+        direction (Direction): The direction of the motor, CCW or CW.
+        speed (int): The speed in the range of 0 to 3000 RPMs, 0 stops the motor.
+        acceleration (int): The acceleration in the range of 0 to 255.
+
+    Returns:
+        concurrent.futures.Future: Resolved with the raw response, see run_motor_result to decode it.
+
+    Raises:
+        can.CanError: If there is an error in sending the CAN message.
+    """
+    self._validate_direction(direction)
+    self._validate_speed(speed)
+    self._validate_acceleration(acceleration)
+
+    direction_value = 0x80 if direction == Direction.CW else 0
+
+    cmd = [direction_value + ((speed >> 8) & 0b1111), speed & 0xFF, acceleration]
+    return self.send_generic(MksCommands.RUN_MOTOR_SPEED_MODE_COMMAND, cmd)
+
+
 def stop_motor_in_speed_mode(self, acceleration):
     return self.specialized_state(MksCommands.RUN_MOTOR_SPEED_MODE_COMMAND, StopMotorResult, motor_status_error, [0, 0, acceleration])
 
@@ -382,3 +408,55 @@ def run_motor_absolute_motion_by_axis(self, speed, acceleration, absolute_axis):
 
 def stop_motor_absolute_motion_by_axis(self, acceleration):
     return self.specialized_state(MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_AXIS_COMMAND, StopMotorResult, motor_status_error, [0, 0, acceleration, 0, 0, 0])
+
+
+def nb_run_motor_absolute_motion_by_axis(self, speed, acceleration, absolute_axis):
+    """
+    Starts an absolute motion by axis without waiting for the response (Non blocked).
+
+    Unlike run_motor_absolute_motion_by_axis, the running state of the motor is not queried before the command,
+    so several axes can be started back to back with the minimum skew.
+
+    Args:
+        speed (int): The speed in the range of 0 to 3000 RPMs.
+        acceleration (int): The acceleration in the range of 0 to 255.
+        absolute_axis (int): The absolute axis, the value range is -8388607 to +8388607.
+
+    Returns:
+        concurrent.futures.Future: Resolved with the raw response, see run_motor_result to decode it.
+
+    Raises:
+        can.CanError: If there is an error in sending the CAN message.
+    """
+    self._validate_speed(speed)
+    self._validate_acceleration(acceleration)
+    self._validate_axis(absolute_axis)
+
+    cmd = [
+        ((speed >> 8) & 0b1111),
+        speed & 0xFF,
+        acceleration,
+        (absolute_axis >> 16) & 0xFF,
+        (absolute_axis >> 8) & 0xFF,
+        (absolute_axis >> 0) & 0xFF,
+    ]
+    return self.send_generic(MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_AXIS_COMMAND, cmd)
+
+
+def run_motor_result(self, response):
+    """
+    Decodes the response of a run motor command.
+
+    Args:
+        response (bytearray): The raw response, e.g. the result of a future returned by a nb_run_motor_* method.
+
+    Returns:
+        RunMotorResult: The status of the motor, None if there is no response.
+    """
+    if response is None:
+        return None
+    status_int = int.from_bytes(response[1:2], byteorder="big")
+    try:
+        return RunMotorResult(status_int)
+    except ValueError:
+        raise motor_status_error(f"No enum member with value {status_int}")
@@ -1,4 +1,4 @@
-import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 from .mks_enums import (
     CalibrationResult,
@@ -10,10 +10,12 @@ from .mks_enums import (
     Enable,
     CanBitrate,
     EndStopLevel,
+    HomeMode,
     MksCommands,
     GoHomeResult,
     Mode0,
 )
+from .operations import OperationFuture
 
 
 class gohome_status_error(Exception):
@@ -52,6 +54,12 @@ class go_home_timeout_error(Exception):
     pass
 
 
+class position_error_protection_error(Exception):
+    """Exception raised for invalid position error protection parameters."""
+
+    pass
+
+
 def _validate_current(self, current):
     if current < 0 or current > 5200:
         raise current_error("Current is outside the valid range from 0 to 5200")
@@ -60,22 +68,36 @@ def _validate_current(self, current):
 # TODO: It is a continuous call until result is 1 or 2?
 def nb_calibrate_encoder(self):
     """
-    Initiates the calibration procedure of the encoder.
+    Initiates the calibration procedure of the encoder. (Non blocked)
 
     Returns:
-        CalibrationResult: The success result of the command. It should be "Calibrating".
+        OperationFuture: Completed with the CalibrationResult pushed by the servo at the end of the procedure,
+        "CalibratedSuccess" or "CalibratingFail". It can be waited with result(timeout), operations.wait_all or
+        operations.wait_any, or awaited from asyncio.
 
     Raises:
         can.CanError: If there is an error in sending the CAN message.
-    """
-    tmp = self.set_generic(MksCommands.MOTOR_CALIBRATION_COMMAND, self.GENERIC_RESPONSE_LENGTH, 0x00)
+        calibration_timeout_error: If the servo did not answer the command within self.timeout.
+    """
+    if self._calibration_future is not None:
+        self._calibration_future.cancel()
+    self._calibration_future = OperationFuture()
+    tmp = self.set_generic(MksCommands.MOTOR_CALIBRATION_COMMAND, self.GENERIC_RESPONSE_LENGTH, 0x00, full_timeout=True)
+    if tmp is None:
+        # Not sent again (see retry.IDEMPOTENT_COMMANDS) and waited for the full servo timeout
+        self._calibration_future.cancel()
+        self._calibration_future = None
+        raise calibration_timeout_error("No response to the calibration command")
     status_int = int.from_bytes(tmp[1:2], byteorder="big")
     try:
         rslt = CalibrationResult(status_int)
-        self._calibration_status = rslt
-        return rslt
     except ValueError:
         raise calibration_error(f"No enum member with value {status_int}")
+    if not self._calibration_future.done():
+        self._calibration_status = rslt
+        if rslt != CalibrationResult.Calibrating:
+            self._calibration_future.complete(rslt)
+    return self._calibration_future
 
 
 def b_calibrate_encoder(self):
@@ -87,10 +109,10 @@ def b_calibrate_encoder(self):
 
     Raises:
         can.CanError: If there is an error in sending the CAN message.
+        calibration_timeout_error: If the calibration took longer than the expected time.
     """
     nb_calibrate_encoder(self)
-    wait_for_calibration(self)
-    return self._calibration_status
+    return wait_for_calibration(self)
 
 
 def wait_for_calibration(self):
@@ -103,19 +125,16 @@ def wait_for_calibration(self):
     Raises:
         can.CanError: If there is an error in sending the CAN message.
         calibration_timeout_error: If the calibration took longer than the expected time.
+        calibration_not_running: If no calibration was started, or the last calibration command got no response.
     """
-    if self._calibration_status == CalibrationResult.Unkown:
+    if self._calibration_status == CalibrationResult.Unknown or self._calibration_future is None:
         raise calibration_not_running("")
 
-    start_time = time.perf_counter()
-    while (time.perf_counter() - start_time < self.MAX_CALIBRATION_TIME) and self._calibration_status == CalibrationResult.Calibrating:
-        time.sleep(0.1)  # Small sleep to prevent busy waiting
-
-    if not self._calibration_status == CalibrationResult.CalibratedSuccess and not self._calibration_status == CalibrationResult.CalibratingFail:
+    try:
+        return self._calibration_future.result(self.MAX_CALIBRATION_TIME)
+    except FutureTimeoutError:
         raise calibration_timeout_error("")
 
-    return self._calibration_status
-
 
 def set_work_mode(self, mode: WorkMode):
     """
@@ -363,7 +382,7 @@ def set_group_id(self, group_id):
     return self.set_generic_status(MksCommands.SET_GROUP_ID_COMMAND, [(group_id >> 8) & 0xF, group_id & 0xFF])
 
 
-def set_home(self, homeTrig: EndStopLevel, homeDir: Direction, homeSpeed, endLimit: Enable):
+def set_home(self, homeTrig: EndStopLevel, homeDir: Direction, homeSpeed, endLimit: Enable, hmMode: HomeMode = HomeMode.UseLimit):
     """
     Sets the parameter of Home
 
@@ -372,6 +391,7 @@ def set_home(self, homeTrig: EndStopLevel, homeDir: Direction, homeSpeed, endLim
         homeDir (Direction): The direction of go home
         homeSpeed (int): The speed of go home
         endLimit (Enable): The end limit enable status.
+        hmMode (HomeMode): Go home with the limit switch or without it (sensorless).
 
     Returns:
         SuccessStatus: The success result of the command.
@@ -391,6 +411,7 @@ def set_home(self, homeTrig: EndStopLevel, homeDir: Direction, homeSpeed, endLim
             (homeSpeed >> 8) & 0xF,
             homeSpeed & 0xFF,
             endLimit.value,
+            hmMode.value,
         ],
     )
 
@@ -400,36 +421,48 @@ def nb_go_home(self):
     Goes home. (Non blocked)
 
     Returns:
-        SuccessStatus: The success result of the command.
+        OperationFuture: Completed with the GoHomeResult pushed by the servo at the end of the procedure,
+        "Success" or "Fail". It can be waited with result(timeout), operations.wait_all or operations.wait_any,
+        or awaited from asyncio.
 
     Raises:
         can.CanError: If there is an error in sending the CAN message.
-
-    Note: Same as the "CanID" option on screen.
-    """
-    tmp = self.set_generic(MksCommands.GO_HOME_COMMAND, self.GENERIC_RESPONSE_LENGTH)
+        go_home_timeout_error: If the servo did not answer the command within self.timeout.
+    """
+    if self._homing_future is not None:
+        self._homing_future.cancel()
+    self._homing_future = OperationFuture()
+    tmp = self.set_generic(MksCommands.GO_HOME_COMMAND, self.GENERIC_RESPONSE_LENGTH, full_timeout=True)
+    if tmp is None:
+        # Not sent again (see retry.IDEMPOTENT_COMMANDS) and waited for the full servo timeout
+        self._homing_future.cancel()
+        self._homing_future = None
+        raise go_home_timeout_error("No response to the go home command")
     status_int = int.from_bytes(tmp[1:2], byteorder="big")
     try:
         rslt = GoHomeResult(status_int)
-        self._homing_status = rslt
     except ValueError:
         raise gohome_status_error(f"No enum member with value {status_int}")
-    return rslt
+    if not self._homing_future.done():
+        self._homing_status = rslt
+        if rslt != GoHomeResult.Start:
+            self._homing_future.complete(rslt)
+    return self._homing_future
 
 
 def b_go_home(self):
     """
-    Does the calibration procedure of the encoder. It blocks until the procedure completes.
+    Goes home. It blocks until the procedure completes.
 
     Returns:
         GoHomeResult: The success result of the command. It should be "Success" or "Fail".
 
     Raises:
         can.CanError: If there is an error in sending the CAN message.
+        go_home_timeout_error: If the go home operation took longer than the expected time.
     """
     nb_go_home(self)
-    wait_for_go_home(self)
-    return self._homing_status
+    return wait_for_go_home(self)
 
 
 def wait_for_go_home(self):
@@ -442,19 +475,16 @@ def wait_for_go_home(self):
     Raises:
         can.CanError: If there is an error in sending the CAN message.
         go_home_timeout_error: If the go home operation took longer than the expected time.
+        calibration_not_running: If no homing was started, or the last go home command got no response.
     """
-    if self._homing_status == GoHomeResult.Unkown:
+    if self._homing_status == GoHomeResult.Unknown or self._homing_future is None:
         raise calibration_not_running("")
 
-    start_time = time.perf_counter()
-    while (time.perf_counter() - start_time < self.MAX_HOMING_TIME) and self._homing_status == GoHomeResult.Start:
-        time.sleep(0.1)  # Small sleep to prevent busy waiting
-
-    if not self._homing_status == GoHomeResult.Success and not self._homing_status == GoHomeResult.Fail:
+    try:
+        return self._homing_future.result(self.MAX_HOMING_TIME)
+    except FutureTimeoutError:
         raise go_home_timeout_error("")
 
-    return self._homing_status
-
 
 def set_current_axis_to_zero(self):
     """
@@ -530,3 +560,77 @@ def restore_default_parameters(self):
     Note: This is the same as pressing the "Next" key, then power on the motor.
     """
     return self.set_generic_status(MksCommands.RESTORE_DEFAULT_PARAMETERS_COMMAND)
+
+
+def restart_motor(self):
+    """
+    Restarts the motor driver. The driver answers before rebooting, it does not answer the commands
+    until it has started again.
+
+    Returns:
+        SuccessStatus: The success result of the command.
+
+    Raises:
+        can.CanError: If there is an error in sending the CAN message.
+
+    Note: The axis value is lost, go home or set the axis to zero after the restart.
+    """
+    return self.set_generic_status(MksCommands.RESTART_MOTOR)
+
+
+def set_position_error_protection(self, enable: Enable, tim, errors, g0En: Enable = Enable.Disable):
+    """
+    Sets the position error protection. When enabled, the protection stops the motor if the position
+    error exceeds errors for the duration tim.
+
+    Args:
+        enable (Enable): The enable status of the protection (pEn).
+        tim (int): Duration of the error before the protection triggers, 0 to 0xFFFF (about 15 ms per unit).
+        errors (int): Position error threshold, 0 to 0xFFFF (28000 = 360 degrees).
+        g0En (Enable): The g0En flag, sent with pEn in the enable byte.
+
+    Returns:
+        SuccessStatus: The success result of the command.
+
+    Raises:
+        can.CanError: If there is an error in sending the CAN message.
+        position_error_protection_error: If tim or errors does not fit in 16 bits.
+
+    Note: The protection state is read with read_motor_shaft_protection_state and released with
+        release_motor_shaft_locked_protection_state, like the locked-rotor protection.
+    """
+    if not 0 <= tim <= 0xFFFF:
+        raise position_error_protection_error(f"tim must be between 0 and {0xFFFF}")
+    if not 0 <= errors <= 0xFFFF:
+        raise position_error_protection_error(f"errors must be between 0 and {0xFFFF}")
+    return self.set_generic_status(
+        MksCommands.SET_POSITION_ERROR_PROTECTION,
+        [(g0En.value << 1) | enable.value, tim >> 8, tim & 0xFF, errors >> 8, errors & 0xFF],
+    )
+
+
+def write_io_port(self, out1=None, out2=None):
+    """
+    Writes the output ports. The current state of all the ports is read with read_io_port_status.
+
+    Args:
+        out1 (int, optional): The level of OUT_1, 0 or 1. None leaves it unchanged.
+        out2 (int, optional): The level of OUT_2, 0 or 1. None leaves it unchanged.
+
+    Returns:
+        SuccessStatus: The success result of the command.
+
+    Raises:
+        can.CanError: If there is an error in sending the CAN message.
+    """
+    return self.set_generic_status(MksCommands.WRITE_IO_PORT_COMMAND, _io_port_data(out1, out2))
+
+
+def _io_port_data(out1=None, out2=None):
+    """
+    Returns the data of WRITE_IO_PORT_COMMAND, one byte: OUT_2 mask (bits 7-6), OUT_1 mask (bits 5-4),
+    OUT_2 level (bit 3) and OUT_1 level (bit 2). A mask of 1 writes the level, 2 leaves the output unchanged.
+    """
+    m1 = 2 if out1 is None else 1
+    m2 = 2 if out2 is None else 1
+    return [(m2 << 6) | (m1 << 4) | (bool(out2) << 3) | (bool(out1) << 2)]
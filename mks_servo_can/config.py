@@ -0,0 +1,327 @@
+"""Configuration snapshot, diff and minimal writes.
+
+The parameters of an axis are read with READ_SYSYTEM_PARAMETER_COMMAND (the drive answers with the
+same data format used to set them) into a ConfigSnapshot. A desired configuration uses the names and
+the arguments of the set_* methods without the "set_" prefix, e.g.:
+
+    desired = {
+        "work_mode": WorkMode.SrvFoc,
+        "working_current": 1600,
+        "slave_respond_active": (Enable.Enable, Enable.Enable),
+        "home": (EndStopLevel.Low, Direction.CW, 60, Enable.Disable, HomeMode.UseLimit),
+    }
+    results = provision([(servo_x, desired), (servo_y, desired)])
+
+Only the parameters that differ are written, so the writes to the drive flash are skipped when nothing
+changed. The reads and the writes are pipelined: every request of every axis is sent before waiting
+for the first response.
+"""
+
+import time
+
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from enum import Enum
+
+from .mks_enums import (
+    CanBitrate,
+    Direction,
+    Enable,
+    EndStopLevel,
+    EnPinEnable,
+    HoldingStrength,
+    HomeMode,
+    MksCommands,
+    Mode0,
+    SuccessStatus,
+    WorkMode,
+)
+
+# Name: (set command, fields). A field is an Enum (one byte) or the width in bytes of an unsigned int.
+PARAMETERS = {
+    "work_mode": (MksCommands.SET_WORK_MODE_COMMAND, (WorkMode,)),
+    "working_current": (MksCommands.SET_WORKING_CURRENT_COMMAND, (2,)),
+    "holding_current": (MksCommands.SET_HOLDING_CURRENT_COMMAND, (HoldingStrength,)),
+    "subdivisions": (MksCommands.SET_SUBDIVISIONS_COMMAND, (1,)),
+    "en_pin_config": (MksCommands.SET_EN_PIN_CONFIG_COMMAND, (EnPinEnable,)),
+    "motor_rotation_direction": (MksCommands.SET_MOTOR_ROTATION_DIRECTION, (Direction,)),
+    "auto_turn_off_screen": (MksCommands.SET_AUTO_TURN_OFF_SCREEN_COMMAND, (Enable,)),
+    "motor_shaft_locked_rotor_protection": (MksCommands.SET_MOTOR_SHAFT_LOCKED_ROTOR_PROTECTION_COMMAND, (Enable,)),
+    "subdivision_interpolation": (MksCommands.SET_SUBDIVISION_INTERPOLATION_COMMAND, (Enable,)),
+    "can_bitrate": (MksCommands.SET_CAN_BITRATE_COMMAND, (CanBitrate,)),
+    "can_id": (MksCommands.SET_CAN_ID_COMMAND, (2,)),
+    "slave_respond_active": (MksCommands.SET_SLAVE_RESPOND_ACTIVE_COMMAND, (Enable, Enable)),
+    "key_lock": (MksCommands.SET_KEY_LOCK_ENABLE_COMMAND, (Enable,)),
+    "group_id": (MksCommands.SET_GROUP_ID_COMMAND, (2,)),
+    "home": (MksCommands.SET_HOME_COMMAND, (EndStopLevel, Direction, 2, Enable, HomeMode)),
+    "limit_port_remap": (MksCommands.SET_LIMIT_PORT_REMAP_COMMAND, (Enable,)),
+    "mode0": (MksCommands.SET_MODE0_COMMAND, (Mode0, Enable, 1, Direction)),
+    "position_error_protection": (MksCommands.SET_POSITION_ERROR_PROTECTION, (Enable, 2, 2, Enable)),
+}
+
+
+def _pack_position_error_protection(data):
+    # pEn, tim, errors, g0En -> bit1 g0En | bit0 pEn, tim, errors
+    return bytes([(data[5] << 1) | data[0]]) + data[1:5]
+
+
+def _unpack_position_error_protection(data):
+    return bytes([data[0] & 1]) + data[1:5] + bytes([(data[0] >> 1) & 1])
+
+
+# Name: (pack, unpack) for the parameters whose data does not follow the fields, converting between the data
+# of the fields and the data of the drive.
+_PACKED = {
+    "position_error_protection": (_pack_position_error_protection, _unpack_position_error_protection),
+}
+
+# Writing them breaks the communication with the MksServo instance, use set_can_id and set_can_bitrate.
+READ_ONLY_PARAMETERS = ("can_bitrate", "can_id")
+
+_UNSUPPORTED = b"\xff\xff"
+
+
+class config_error(Exception):
+    """Exception raised for unknown parameters or invalid values."""
+
+    pass
+
+
+def encode_parameter(name, value):
+    """
+    Encodes a parameter value into the data of its set command.
+
+    Args:
+        name (str): The parameter name, a key of PARAMETERS.
+        value: The value, a tuple if the set method takes several arguments.
+
+    Returns:
+        bytes: The data bytes, without the command code.
+
+    Raises:
+        config_error: If the parameter is unknown or the value does not fit.
+    """
+    if name not in PARAMETERS:
+        raise config_error(f"Unknown parameter {name}")
+    fields = PARAMETERS[name][1]
+    values = value if isinstance(value, tuple) else (value,)
+    if len(values) != len(fields):
+        raise config_error(f"{name} expects {len(fields)} values, got {len(values)}")
+
+    data = bytearray()
+    for field, v in zip(fields, values):
+        if isinstance(field, int):
+            try:
+                data += int(v).to_bytes(field, byteorder="big")
+            except OverflowError:
+                raise config_error(f"{name}: {v} does not fit in {field} bytes")
+        else:
+            try:
+                data.append(field(v.value if isinstance(v, Enum) else v).value)
+            except ValueError:
+                raise config_error(f"{name}: {v} is not a valid {field.__name__}")
+    if name in _PACKED:
+        return _PACKED[name][0](bytes(data))
+    return bytes(data)
+
+
+def decode_parameter(name, data):
+    """
+    Decodes the data of a parameter read.
+
+    Args:
+        name (str): The parameter name, a key of PARAMETERS.
+        data (bytes): The data bytes, without the code and the CRC.
+
+    Returns:
+        The value, with the same types as the arguments of the set method (a tuple for several arguments).
+        Unknown enum values are returned as int.
+    """
+    if name in _PACKED:
+        data = _PACKED[name][1](data)
+    values = []
+    offset = 0
+    for field in PARAMETERS[name][1]:
+        size = field if isinstance(field, int) else 1
+        v = int.from_bytes(data[offset : offset + size], byteorder="big")
+        offset += size
+        if not isinstance(field, int):
+            try:
+                v = field(v)
+            except ValueError:
+                pass
+        values.append(v)
+    return values[0] if len(values) == 1 else tuple(values)
+
+
+class ConfigSnapshot:
+    """The parameters of one axis.
+
+    Attributes:
+        can_id (int): The CAN ID of the axis.
+        raw (dict): Data bytes by parameter name, None if the parameter could not be read.
+    """
+
+    def __init__(self, can_id, raw):
+        self.can_id = can_id
+        self.raw = raw
+
+    def __repr__(self):
+        return f"ConfigSnapshot(can_id={self.can_id}, {self.values()!r})"
+
+    def __getitem__(self, name):
+        data = self.raw[name]
+        return None if data is None else decode_parameter(name, data)
+
+    def values(self):
+        """
+        Decodes all the parameters.
+
+        Returns:
+            dict: The values by parameter name, None for the parameters that could not be read.
+        """
+        return {name: self[name] for name in self.raw}
+
+    def diff(self, desired):
+        """
+        Compares the snapshot with a desired configuration.
+
+        Args:
+            desired (dict): Values by parameter name, with the arguments of the set methods.
+
+        Returns:
+            dict: (current, desired) by parameter name, only for the parameters that differ or could not be read.
+        """
+        changes = {}
+        for name, value in desired.items():
+            current = self.raw.get(name)
+            if current is None or current != encode_parameter(name, value):
+                changes[name] = (None if current is None else decode_parameter(name, current), value)
+        return changes
+
+
+def _collect(futures, timeout):
+    # Waits for the pipelined responses with a shared deadline, None for the missing ones
+    deadline = time.perf_counter() + timeout
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result(max(0.0, deadline - time.perf_counter())))
+        except FutureTimeoutError:
+            future.cancel()
+            results.append(None)
+    return results
+
+
+def _send_reads(servo, names):
+    return [servo.send_generic(MksCommands.READ_SYSYTEM_PARAMETER_COMMAND, [PARAMETERS[name][0].value], response_code=PARAMETERS[name][0]) for name in names]
+
+
+def _snapshot(servo, names, responses):
+    raw = {}
+    for name, response in zip(names, responses):
+        # response: code, param..., CRC
+        data = None if response is None else bytes(response[1:-1])
+        raw[name] = None if data is None or data == _UNSUPPORTED else data
+    return ConfigSnapshot(servo.can_id, raw)
+
+
+def read_configs(servos, names=None):
+    """
+    Reads the parameters of many axes, pipelined.
+
+    Args:
+        servos (list of MksServo): The servos.
+        names (list of str, optional): The parameters to read, all the PARAMETERS by default.
+
+    Returns:
+        list of ConfigSnapshot: One snapshot per servo.
+
+    Raises:
+        can.CanError: If there is an error in sending the CAN message.
+    """
+    names = list(PARAMETERS) if names is None else list(names)
+    for name in names:
+        if name not in PARAMETERS:
+            raise config_error(f"Unknown parameter {name}")
+    futures = [_send_reads(servo, names) for servo in servos]
+    return [_snapshot(servo, names, _collect(f, servo.timeout)) for servo, f in zip(servos, futures)]
+
+
+def read_config(servo, names=None):
+    """
+    Reads the parameters of an axis, pipelined.
+
+    Args:
+        servo (MksServo): The servo.
+        names (list of str, optional): The parameters to read, all the PARAMETERS by default.
+
+    Returns:
+        ConfigSnapshot: The parameters of the axis.
+
+    Raises:
+        can.CanError: If there is an error in sending the CAN message.
+    """
+    return read_configs([servo], names)[0]
+
+
+def provision(configs, snapshots=None):
+    """
+    Writes only the parameters that differ from the desired configurations, pipelined across all the axes.
+
+    Args:
+        configs (list): (servo, desired) pairs, desired is a dict of values by parameter name.
+        snapshots (list of ConfigSnapshot, optional): The current parameters, one per pair, read if not given.
+
+    Returns:
+        list of dict: One dict per pair with the SuccessStatus of each write by parameter name (None on
+        timeout). An empty dict when nothing changed.
+
+    Raises:
+        config_error: If a parameter is unknown, read only or its value is invalid.
+        can.CanError: If there is an error in sending the CAN message.
+    """
+    configs = list(configs)
+    for _, desired in configs:
+        for name, value in desired.items():
+            if name in READ_ONLY_PARAMETERS:
+                raise config_error(f"{name} can not be provisioned, use set_{name}")
+            encode_parameter(name, value)
+
+    if snapshots is None:
+        snapshots = read_configs([servo for servo, _ in configs], {name for _, desired in configs for name in desired})
+
+    writes = []
+    for (servo, desired), snapshot in zip(configs, snapshots):
+        changes = snapshot.diff(desired)
+        futures = [servo.send_generic(PARAMETERS[name][0], list(encode_parameter(name, desired[name]))) for name in changes]
+        writes.append((servo, list(changes), futures))
+
+    results = []
+    for servo, names, futures in writes:
+        statuses = {}
+        for name, response in zip(names, _collect(futures, servo.timeout)):
+            try:
+                statuses[name] = None if response is None else SuccessStatus(response[1])
+            except ValueError:
+                statuses[name] = SuccessStatus.Fail
+        results.append(statuses)
+    return results
+
+
+def apply_config(servo, desired, snapshot=None):
+    """
+    Writes only the parameters of an axis that differ from the desired configuration.
+
+    Args:
+        servo (MksServo): The servo.
+        desired (dict): Values by parameter name, with the arguments of the set methods.
+        snapshot (ConfigSnapshot, optional): The current parameters, read if not given.
+
+    Returns:
+        dict: The SuccessStatus of each write by parameter name (None on timeout), empty when nothing changed.
+
+    Raises:
+        config_error: If a parameter is unknown, read only or its value is invalid.
+        can.CanError: If there is an error in sending the CAN message.
+    """
+    return provision([(servo, desired)], None if snapshot is None else [snapshot])[0]
@@ -0,0 +1,203 @@
+"""Persistent configuration store.
+
+ConfigStore keeps in a SQLite file the last known parameters of every axis, keyed by bus and CAN ID:
+the values read with read_config and the writes confirmed by the drive. After a restart,
+ConfigStore.provision reads only a few parameters of each axis (VERIFY_PARAMETERS) and compares them
+with the store. If they match, the stored snapshot is trusted and only the parameters that differ
+from the desired configuration are written, otherwise the axis is read again in full.
+
+Example:
+    store = ConfigStore("fleet.db")
+    results = store.provision([(servo_x, desired), (servo_y, desired)])
+"""
+
+import logging
+import sqlite3
+import time
+
+import can
+
+from .config import PARAMETERS, ConfigSnapshot, config_error, encode_parameter, provision, read_configs
+from .mks_enums import SuccessStatus
+
+VERIFY_PARAMETERS = ("work_mode", "working_current", "subdivisions")
+
+
+class config_store_error(Exception):
+    """Exception raised when the bus of an axis can not be identified."""
+
+    pass
+
+
+def bus_key(servo, keys=None):
+    """
+    Returns the key of the bus of a servo in the store: "interface:channel" of the python-can bus, or its
+    channel_info for the interfaces that do not keep the channel.
+
+    Args:
+        servo (MksServo): The servo.
+        keys (dict, optional): Explicit keys by python-can bus, used first.
+
+    Raises:
+        config_store_error: If the bus has no explicit key, no channel and no channel_info.
+    """
+    bus = servo.bus
+    if keys is not None and bus in keys:
+        return keys[bus]
+    channel = getattr(bus, "channel", None)
+    if not isinstance(channel, (str, int)):
+        channel = getattr(bus, "channel_id", None)  # The virtual bus replaces channel with its queues
+    if not isinstance(channel, (str, int)):
+        channel = getattr(getattr(bus, "serialPortOrig", None), "port", None)  # python-can slcan keeps only the port
+    if not isinstance(channel, (str, int)):
+        channel_info = getattr(bus, "channel_info", None)
+        if not isinstance(channel_info, str) or channel_info == "unknown":  # Default of can.BusABC
+            raise config_store_error(f"The channel of {bus!r} is unknown, give the store an explicit key for it")
+        return channel_info
+    cls = type(bus)
+    interface = next((name for name, (module, class_name) in can.interfaces.BACKENDS.items() if module == cls.__module__ and class_name == cls.__name__), cls.__name__)
+    return f"{interface}:{channel}"
+
+
+class ConfigStore:
+    """Last known parameters of the axes, persisted in SQLite.
+
+    The instance must be used from one thread at a time.
+
+    Attributes:
+        warm_hits (int): Number of axes whose stored snapshot was verified by ConfigStore.provision.
+        warm_misses (int): Number of axes read again because the verification failed or nothing was stored.
+    """
+
+    def __init__(self, path, bus_keys=None):
+        """
+        Args:
+            path (str): The SQLite file, ":memory:" for a store that is not persisted.
+            bus_keys (dict, optional): Store keys by python-can bus, required for the buses without a channel
+                attribute. The keys must not change between runs.
+        """
+        self.bus_keys = {} if bus_keys is None else dict(bus_keys)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS parameters ("
+            "bus TEXT NOT NULL, can_id INTEGER NOT NULL, name TEXT NOT NULL, data BLOB NOT NULL, "
+            "confirmed INTEGER NOT NULL, updated REAL NOT NULL, PRIMARY KEY (bus, can_id, name))"
+        )
+        self._db.commit()
+        self.warm_hits = 0
+        self.warm_misses = 0
+
+    def close(self):
+        """Closes the database."""
+        self._db.close()
+
+    def load(self, bus, can_id):
+        """
+        Loads the stored parameters of an axis.
+
+        Args:
+            bus (str): The bus key, see bus_key.
+            can_id (int): The CAN ID of the axis.
+
+        Returns:
+            ConfigSnapshot: The stored parameters, None if nothing is stored.
+        """
+        rows = self._db.execute("SELECT name, data FROM parameters WHERE bus = ? AND can_id = ?", (bus, can_id)).fetchall()
+        if not rows:
+            return None
+        return ConfigSnapshot(can_id, {name: bytes(data) for name, data in rows if name in PARAMETERS})
+
+    def save(self, bus, snapshot):
+        """
+        Stores the parameters of a snapshot read from an axis. The parameters that could not be read are not stored.
+
+        Args:
+            bus (str): The bus key, see bus_key.
+            snapshot (ConfigSnapshot): The snapshot.
+        """
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO parameters VALUES (?, ?, ?, ?, 0, ?)",
+            [(bus, snapshot.can_id, name, data, now) for name, data in snapshot.raw.items() if data is not None],
+        )
+        self._db.commit()
+
+    def record_writes(self, bus, can_id, desired, results):
+        """
+        Stores the writes confirmed by the drive.
+
+        Args:
+            bus (str): The bus key, see bus_key.
+            can_id (int): The CAN ID of the axis.
+            desired (dict): The written values by parameter name.
+            results (dict): The SuccessStatus of each write by parameter name, as returned by provision.
+        """
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO parameters VALUES (?, ?, ?, ?, 1, ?)",
+            [(bus, can_id, name, encode_parameter(name, desired[name]), now) for name, status in results.items() if status == SuccessStatus.Success],
+        )
+        self._db.commit()
+
+    def forget(self, bus, can_id=None):
+        """
+        Removes the stored parameters of an axis, or of a whole bus if can_id is None.
+        """
+        if can_id is None:
+            self._db.execute("DELETE FROM parameters WHERE bus = ?", (bus,))
+        else:
+            self._db.execute("DELETE FROM parameters WHERE bus = ? AND can_id = ?", (bus, can_id))
+        self._db.commit()
+
+    def provision(self, configs, verify=VERIFY_PARAMETERS):
+        """
+        Writes the parameters that differ from the desired configurations, using the store to skip the full reads.
+
+        Args:
+            configs (list): (servo, desired) pairs, desired is a dict of values by parameter name.
+            verify (tuple of str): The parameters read to check that a stored snapshot is still valid.
+
+        Returns:
+            list of dict: One dict per pair with the SuccessStatus of each write by parameter name (None on
+            timeout). An empty dict when nothing changed.
+
+        Raises:
+            config_error: If a parameter is unknown, read only or its value is invalid.
+            config_store_error: If the bus of an axis can not be identified.
+            can.CanError: If there is an error in sending the CAN message.
+        """
+        configs = list(configs)
+        keys = [bus_key(servo, self.bus_keys) for servo, _ in configs]
+        for name in verify:
+            if name not in PARAMETERS:
+                raise config_error(f"Unknown parameter {name}")
+
+        # One pipelined read: the verification parameters, plus the desired ones missing in the store
+        cached = [self.load(key, servo.can_id) for key, (servo, _) in zip(keys, configs)]
+        names = set(verify)
+        for (_, desired), snapshot in zip(configs, cached):
+            names.update(name for name in desired if snapshot is None or name not in snapshot.raw)
+        checks = read_configs([servo for servo, _ in configs], sorted(names))
+
+        # Full read of the axes whose verification failed
+        stale = []
+        for i, ((servo, desired), key, snapshot, check) in enumerate(zip(configs, keys, cached, checks)):
+            if snapshot is not None and all(check.raw[name] is not None and check.raw[name] == snapshot.raw.get(name) for name in verify):
+                self.warm_hits += 1
+                read = {name: data for name, data in check.raw.items() if name not in snapshot.raw}
+                snapshot.raw.update(read)
+                self.save(key, ConfigSnapshot(servo.can_id, read))
+            else:
+                logging.debug(f"Stored configuration of {key}:{servo.can_id} is missing or stale")
+                self.warm_misses += 1
+                self.forget(key, servo.can_id)
+                stale.append(i)
+        if stale:
+            for i, snapshot in zip(stale, read_configs([configs[i][0] for i in stale])):
+                cached[i] = snapshot
+                self.save(keys[i], snapshot)
+
+        results = provision(configs, cached)
+        for (servo, desired), key, result in zip(configs, keys, results):
+            self.record_writes(key, servo.can_id, desired, result)
+        return results
@@ -0,0 +1,245 @@
+"""Parallel bring-up of many axes.
+
+FleetBringUp runs stages (calibration, homing, zeroing, configuration writes, ...) on many axes at the
+same time. Within one axis the stages run in the order they were added; across axes a stage can wait
+for other stages with ``after`` (e.g. home Z before X and Y). Calibration and homing completion are
+driven by the status frames pushed by the servos (see wait_for_calibration and wait_for_go_home), so
+the waiting axes do not load the bus.
+
+Example:
+    bring_up = FleetBringUp({"X": servo_x, "Y": servo_y, "Z": servo_z})
+    bring_up.add_stage("config", configure(set_work_mode=WorkMode.SrvFoc, set_working_current=1000))
+    bring_up.add_stage("calibrate", calibrate)
+    bring_up.add_stage("home_z", go_home, axes=["Z"])
+    bring_up.add_stage("home_xy", go_home, axes=["X", "Y"], after=["home_z"])
+    bring_up.add_stage("zero", zero)
+    print(bring_up.run())
+"""
+
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .mks_enums import CalibrationResult, GoHomeResult, SuccessStatus
+
+FAILURE_RESULTS = (None, SuccessStatus.Fail, CalibrationResult.CalibratingFail, GoHomeResult.Fail)
+
+
+class fleet_error(Exception):
+    """Exception raised for an invalid bring-up definition."""
+
+    pass
+
+
+def calibrate(servo):
+    """Stage action: calibrates the encoder, blocks until the calibration completes."""
+    return servo.b_calibrate_encoder()
+
+
+def go_home(servo):
+    """Stage action: goes home, blocks until the homing completes."""
+    return servo.b_go_home()
+
+
+def zero(servo):
+    """Stage action: sets the current axis to zero."""
+    return servo.set_current_axis_to_zero()
+
+
+def configure(**settings):
+    """
+    Builds a stage action that calls set_* methods in order.
+
+    Args:
+        settings: Method name and argument, or tuple of arguments, e.g. set_working_current=1000,
+            set_slave_respond_active=(Enable.Enable, Enable.Enable).
+
+    Returns:
+        callable: The stage action. It returns the first failing result, or the last result.
+    """
+
+    def action(servo):
+        result = None
+        for name, args in settings.items():
+            result = getattr(servo, name)(*(args if isinstance(args, tuple) else (args,)))
+            if result in FAILURE_RESULTS:
+                return result
+        return result
+
+    return action
+
+
+class TaskResult:
+    """Result of one stage on one axis.
+
+    Attributes:
+        stage (str): The stage name.
+        axis: The axis key.
+        state (str): "done", "failed" or "skipped" (a dependency failed).
+        result: The value returned by the action.
+        error (Exception): The exception raised by the action, if any.
+        start (float): Start time in seconds from the start of the bring-up.
+        end (float): End time in seconds from the start of the bring-up.
+    """
+
+    def __init__(self, stage, axis):
+        self.stage = stage
+        self.axis = axis
+        self.state = "skipped"
+        self.result = None
+        self.error = None
+        self.start = None
+        self.end = None
+
+    def __repr__(self):
+        return f"TaskResult(stage={self.stage!r}, axis={self.axis!r}, state={self.state!r}, result={self.result!r}, error={self.error!r})"
+
+    @property
+    def duration(self):
+        """float: Duration in seconds, None if skipped."""
+        return None if self.start is None else self.end - self.start
+
+
+class BringUpReport:
+    """Timing report of a bring-up.
+
+    Attributes:
+        tasks (list of TaskResult): One result per stage and axis.
+        duration (float): Total time in seconds.
+    """
+
+    def __init__(self, tasks, duration):
+        self.tasks = tasks
+        self.duration = duration
+
+    @property
+    def success(self):
+        """bool: True if every task is done."""
+        return all(task.state == "done" for task in self.tasks)
+
+    def stages(self):
+        """
+        Summarizes the report by stage.
+
+        Returns:
+            dict: By stage name, a dict with "start", "end" (seconds from the start), "slowest" (axis key),
+            "slowest_duration" (seconds) and the "done", "failed" and "skipped" counts.
+        """
+        summary = {}
+        for task in self.tasks:
+            stage = summary.setdefault(task.stage, {"start": None, "end": None, "slowest": None, "slowest_duration": 0.0, "done": 0, "failed": 0, "skipped": 0})
+            stage[task.state] += 1
+            if task.start is None:
+                continue
+            stage["start"] = task.start if stage["start"] is None else min(stage["start"], task.start)
+            stage["end"] = task.end if stage["end"] is None else max(stage["end"], task.end)
+            if task.duration >= stage["slowest_duration"]:
+                stage["slowest"], stage["slowest_duration"] = task.axis, task.duration
+        return summary
+
+    def __str__(self):
+        lines = [f"{'stage':<16}{'start':>9}{'end':>9}{'slowest':>12}{'done':>6}{'failed':>8}{'skipped':>9}"]
+        for name, s in self.stages().items():
+            start = "-" if s["start"] is None else f"{s['start']:.2f}"
+            end = "-" if s["end"] is None else f"{s['end']:.2f}"
+            slowest = "-" if s["slowest"] is None else f"{s['slowest']}:{s['slowest_duration']:.2f}"
+            lines.append(f"{name:<16}{start:>9}{end:>9}{slowest:>12}{s['done']:>6}{s['failed']:>8}{s['skipped']:>9}")
+        lines.append(f"total {self.duration:.2f}s")
+        return "\n".join(lines)
+
+
+class FleetBringUp:
+    """Runs bring-up stages on many axes concurrently, following a dependency graph."""
+
+    def __init__(self, servos, max_workers=None):
+        """
+        Args:
+            servos (dict or list): MksServo by axis key, a list is keyed by can_id.
+            max_workers (int, optional): Maximum number of concurrent tasks, defaults to one per task.
+        """
+        self.servos = servos if isinstance(servos, dict) else {servo.can_id: servo for servo in servos}
+        self.max_workers = max_workers
+        self._stages = {}
+
+    def add_stage(self, name, action, axes=None, after=()):
+        """
+        Adds a stage.
+
+        On each axis, a stage starts after the previous stage (in the order they were added) of the same
+        axis. A stage listed in ``after`` is waited on the same axis if it includes it, otherwise on all its axes.
+
+        Args:
+            name (str): The stage name.
+            action (callable): Called as action(servo), the results in FAILURE_RESULTS and the exceptions fail the task.
+            axes (list, optional): The axis keys of the stage, all the axes by default.
+            after (list of str): Names of the stages to wait for.
+        """
+        if name in self._stages:
+            raise fleet_error(f"Stage {name} already exists")
+        for dependency in after:
+            if dependency not in self._stages:
+                raise fleet_error(f"Unknown stage {dependency}, stages must be added after their dependencies")
+        axes = list(self.servos) if axes is None else list(axes)
+        for axis in axes:
+            if axis not in self.servos:
+                raise fleet_error(f"Unknown axis {axis}")
+        self._stages[name] = (action, axes, list(after))
+
+    def _dependencies(self):
+        dependencies = {}
+        last_on_axis = {}
+        for name, (_, axes, after) in self._stages.items():
+            for axis in axes:
+                deps = set()
+                if axis in last_on_axis:
+                    deps.add((last_on_axis[axis], axis))
+                for dependency in after:
+                    dependency_axes = self._stages[dependency][1]
+                    deps.update([(dependency, axis)] if axis in dependency_axes else [(dependency, a) for a in dependency_axes])
+                dependencies[(name, axis)] = deps
+            for axis in axes:
+                last_on_axis[axis] = name
+        return dependencies
+
+    def _run_task(self, task, action, start_time):
+        task.start = time.perf_counter() - start_time
+        try:
+            task.result = action(self.servos[task.axis])
+            task.state = "failed" if task.result in FAILURE_RESULTS else "done"
+        except Exception as e:
+            task.error = e
+            task.state = "failed"
+        task.end = time.perf_counter() - start_time
+        return task
+
+    def run(self):
+        """
+        Runs all the stages.
+
+        Returns:
+            BringUpReport: The result and timing of every stage on every axis.
+        """
+        pending = self._dependencies()
+        tasks = {key: TaskResult(*key) for key in pending}
+        finished = set()
+        running = set()
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers or max(1, len(tasks))) as executor:
+            while pending or running:
+                for key, deps in list(pending.items()):
+                    if any(tasks[dep].state != "done" for dep in deps & finished):
+                        finished.add(key)  # skipped, a dependency failed
+                        del pending[key]
+                    elif deps <= finished:
+                        running.add(executor.submit(self._run_task, tasks[key], self._stages[key[0]][0], start_time))
+                        del pending[key]
+
+                if not running:
+                    continue
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = future.result()
+                    finished.add((task.stage, task.axis))
+
+        return BringUpReport(list(tasks.values()), time.perf_counter() - start_time)
@@ -0,0 +1,330 @@
+"""G-code path streaming front end.
+
+G0/G1 moves are parsed lazily from a file or any iterable of lines, planned with a bounded lookahead
+window and executed as synchronized absolute-axis moves (see interpolation.run_segment). Every stage
+is a generator, so the memory used does not depend on the size of the program.
+
+Each absolute move of the drive starts and stops at zero speed, so the lookahead blends consecutive
+segments into a single move while all the skipped points stay within ``blend_tolerance`` of the
+merged line (and the feed rate does not change).
+
+Supported words: G0, G1, G20/G21 (inch/mm), G90/G91 (absolute/relative), F, N and the axis letters.
+Comments in parentheses or after a semicolon are ignored, other codes are skipped.
+
+Requires NumPy (``pip install mks-servo-can[numpy]``).
+"""
+
+import logging
+import math
+import re
+
+from collections import deque
+
+import numpy as np
+
+from .can_motor import MAX_SPEED, MIN_AXIS, MAX_AXIS
+from .interpolation import run_segment, sync_axis_parameters
+from .motion_model import ENCODER_COUNTS_PER_REV, MoveTimeModel, speed_scale
+
+MM_PER_INCH = 25.4
+
+_COMMENT = re.compile(r"\(.*?\)|;.*")
+_WORD = re.compile(r"([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+
+class gcode_error(Exception):
+    """Exception raised for invalid G-code or for moves out of the axis range."""
+
+    pass
+
+
+class GcodeAxis:
+    """Maps a G-code axis letter to a servo.
+
+    Attributes:
+        servo (MksServo): The servo driving the axis.
+        units_per_rev (float): Travel in mm for one revolution of the motor (e.g. the lead screw pitch).
+        subdivisions (int): The subdivisions configured on the servo, used to scale the speed codes.
+        offset (int): Axis value (encoder units) of the program zero.
+    """
+
+    def __init__(self, servo, units_per_rev, subdivisions=16, offset=0):
+        self.servo = servo
+        self.units_per_rev = units_per_rev
+        self.subdivisions = subdivisions
+        self.offset = offset
+
+    def to_axis(self, position):
+        """Converts a position in mm into an absolute axis value."""
+        return self.offset + int(round(position / self.units_per_rev * ENCODER_COUNTS_PER_REV))
+
+
+class PathSegment:
+    """A straight move between two points in mm.
+
+    Attributes:
+        start (tuple): Start point, one coordinate per axis.
+        end (tuple): End point, one coordinate per axis.
+        feed (float): Feed rate in mm/min, None for the rapid rate.
+        line (int): Number of the line (1 based) that ends this segment.
+    """
+
+    def __init__(self, start, end, feed, line):
+        self.start = start
+        self.end = end
+        self.feed = feed
+        self.line = line
+
+    def __repr__(self):
+        return f"PathSegment(start={self.start!r}, end={self.end!r}, feed={self.feed!r}, line={self.line!r})"
+
+    @property
+    def length(self):
+        """float: Length of the segment in mm."""
+        return math.dist(self.start, self.end)
+
+
+def _read_lines(source):
+    if isinstance(source, str):
+        with open(source) as f:
+            yield from f
+    else:
+        yield from source
+
+
+def parse_gcode(source, axes="XYZ"):
+    """
+    Parses G0/G1 moves lazily.
+
+    Args:
+        source (str or iterable): A file name or an iterable of lines (an open file, a generator, ...).
+        axes (str): The axis letters to keep, in order.
+
+    Yields:
+        PathSegment: One segment per move that changes the position, coordinates in mm.
+
+    Raises:
+        gcode_error: If a move is found before its feed rate (G1 without F).
+    """
+    position = [0.0] * len(axes)
+    scale = 1.0
+    absolute = True
+    rapid = True
+    feed = None
+    for line_number, line in enumerate(_read_lines(source), 1):
+        words = _WORD.findall(_COMMENT.sub("", line).upper())
+        if not words:
+            continue
+
+        target = list(position)
+        moved = False
+        for letter, value in words:
+            value = float(value)
+            if letter == "G":
+                if value in (0, 1):
+                    rapid = value == 0
+                elif value == 20:
+                    scale = MM_PER_INCH
+                elif value == 21:
+                    scale = 1.0
+                elif value == 90:
+                    absolute = True
+                elif value == 91:
+                    absolute = False
+                else:
+                    logging.debug(f"Line {line_number}: G{value:g} is not supported, skipped")
+            elif letter == "F":
+                feed = value * scale
+            elif letter in axes:
+                i = axes.index(letter)
+                target[i] = value * scale if absolute else target[i] + value * scale
+                moved = True
+
+        if moved and target != position:
+            if not rapid and not feed:
+                raise gcode_error(f"Line {line_number}: G1 move without feed rate")
+            yield PathSegment(tuple(position), tuple(target), None if rapid else feed, line_number)
+            position = target
+
+
+def _distance_to_line(point, start, end):
+    p, a, b = np.asarray(point), np.asarray(start), np.asarray(end)
+    ab = b - a
+    denom = ab @ ab
+    if denom == 0:
+        return float(np.linalg.norm(p - a))
+    t = np.clip((p - a) @ ab / denom, 0.0, 1.0)
+    return float(np.linalg.norm(p - (a + t * ab)))
+
+
+def blend_segments(segments, lookahead=16, blend_tolerance=0.01):
+    """
+    Merges consecutive segments with the same feed rate while the skipped points stay within the tolerance.
+
+    Args:
+        segments (iterable of PathSegment): The segments, e.g. from parse_gcode.
+        lookahead (int): Maximum number of points merged into one segment, bounds the memory and the latency.
+        blend_tolerance (float): Maximum distance in mm between a skipped point and the merged segment.
+
+    Yields:
+        PathSegment: The blended segments.
+    """
+    current = None
+    skipped = deque()
+    for segment in segments:
+        if current is not None and segment.feed == current.feed and len(skipped) < lookahead:
+            if all(_distance_to_line(p, current.start, segment.end) <= blend_tolerance for p in (*skipped, current.end)):
+                skipped.append(current.end)
+                current = PathSegment(current.start, segment.end, current.feed, segment.line)
+                continue
+        if current is not None:
+            yield current
+        current = segment
+        skipped.clear()
+    if current is not None:
+        yield current
+
+
+class PlannedMove:
+    """A segment converted into per-axis commands.
+
+    Attributes:
+        segment (PathSegment): The source segment.
+        targets (numpy.ndarray): Absolute axis targets.
+        speeds (numpy.ndarray): Speed codes, 0 for the axes that do not move.
+        accelerations (numpy.ndarray): Acceleration codes.
+        duration (float): Predicted duration in seconds.
+        planned_feed (float): Feed rate in mm/min that the commands achieve, lower than requested if limited by the speed.
+    """
+
+    def __init__(self, segment, targets, speeds, accelerations, duration, planned_feed):
+        self.segment = segment
+        self.targets = targets
+        self.speeds = speeds
+        self.accelerations = accelerations
+        self.duration = duration
+        self.planned_feed = planned_feed
+
+
+class FeedReport:
+    """Running statistics of a streamed program, constant size whatever the program length.
+
+    Attributes:
+        segments (int): Number of executed moves.
+        distance (float): Travelled distance in mm.
+        planned_time (float): Sum of the predicted durations in seconds.
+        achieved_time (float): Sum of the measured durations in seconds.
+        requested_time (float): Time in seconds at the requested feed rates (rapids excluded).
+        max_start_skew (float): Worst time between the first and the last axis command of a move.
+    """
+
+    def __init__(self):
+        self.segments = 0
+        self.distance = 0.0
+        self.planned_time = 0.0
+        self.achieved_time = 0.0
+        self.requested_time = 0.0
+        self.max_start_skew = 0.0
+
+    def __repr__(self):
+        return f"FeedReport(segments={self.segments}, distance={self.distance:.3f}, planned_feed={self.planned_feed:.1f}, achieved_feed={self.achieved_feed:.1f})"
+
+    @property
+    def planned_feed(self):
+        """float: Average planned feed rate in mm/min."""
+        return self.distance / self.planned_time * 60 if self.planned_time else 0.0
+
+    @property
+    def achieved_feed(self):
+        """float: Average achieved feed rate in mm/min."""
+        return self.distance / self.achieved_time * 60 if self.achieved_time else 0.0
+
+
+class GcodeStreamer:
+    """Streams a G-code program to a set of servos.
+
+    Example:
+        streamer = GcodeStreamer({"X": GcodeAxis(servo_x, 8), "Y": GcodeAxis(servo_y, 8)}, acceleration=200)
+        report = streamer.run("part.gcode")
+        print(report.planned_feed, report.achieved_feed)
+    """
+
+    def __init__(self, axes, acceleration, rapid_speed=MAX_SPEED, lookahead=16, blend_tolerance=0.01, model=None):
+        """
+        Args:
+            axes (dict): GcodeAxis by axis letter, e.g. {"X": GcodeAxis(...), "Y": GcodeAxis(...)}.
+            acceleration (int): The acceleration code of the leading axis in the range of 0 to 255.
+            rapid_speed (int): The speed code of the leading axis for G0 moves.
+            lookahead (int): Maximum number of points blended into one move.
+            blend_tolerance (float): Maximum deviation in mm allowed by the blending.
+            model (MoveTimeModel, optional): The model used to predict the durations.
+        """
+        self.letters = "".join(axes)
+        self.axes = [axes[letter] for letter in self.letters]
+        self.acceleration = acceleration
+        self.rapid_speed = rapid_speed
+        self.lookahead = lookahead
+        self.blend_tolerance = blend_tolerance
+        self.model = model or MoveTimeModel()
+        self.subdivisions = np.array([axis.subdivisions for axis in self.axes])
+        self._revs_per_unit = np.array([1.0 / axis.units_per_rev for axis in self.axes])
+
+    def plan(self, source):
+        """
+        Parses, blends and converts a program into per-axis commands without running it.
+
+        Args:
+            source (str or iterable): A file name or an iterable of lines.
+
+        Yields:
+            PlannedMove: One move per blended segment.
+
+        Raises:
+            gcode_error: If a target is out of the axis range.
+        """
+        for segment in blend_segments(parse_gcode(source, self.letters), self.lookahead, self.blend_tolerance):
+            targets = np.array([axis.to_axis(p) for axis, p in zip(self.axes, segment.end)])
+            if np.any((targets < MIN_AXIS) | (targets > MAX_AXIS)):
+                raise gcode_error(f"Line {segment.line}: target {targets} out of the axis range")
+            starts = np.array([axis.to_axis(p) for axis, p in zip(self.axes, segment.start)])
+
+            # Speed code of the leading axis for the requested feed rate
+            if segment.feed is None:
+                lead_speed = self.rapid_speed
+            else:
+                rpm = np.abs(np.subtract(segment.end, segment.start)) * self._revs_per_unit / (segment.length / segment.feed)
+                lead_speed = int(np.clip(np.ceil(np.max(rpm / speed_scale(self.subdivisions))), 1, MAX_SPEED))
+
+            speeds, accelerations, durations = sync_axis_parameters(targets - starts, lead_speed, self.acceleration, self.subdivisions, self.model)
+            duration = float(durations.max())
+            if duration <= 0:
+                continue
+            yield PlannedMove(segment, targets, speeds, accelerations, duration, segment.length / duration * 60)
+
+    def run(self, source, margin=0.005, timeout=15, on_move=None):
+        """
+        Runs a program move by move.
+
+        Args:
+            source (str or iterable): A file name or an iterable of lines.
+            margin (float): Extra seconds to wait after the predicted end of each move.
+            timeout (float): Maximum number of seconds to wait for the responses and for each axis to stop.
+            on_move (callable, optional): Called as on_move(planned_move, elapsed) after each move.
+
+        Returns:
+            FeedReport: The planned versus achieved feed rate statistics.
+        """
+        report = FeedReport()
+        servos = [axis.servo for axis in self.axes]
+        for move in self.plan(source):
+            start_skew, elapsed = run_segment(servos, move.speeds, move.accelerations, move.targets, move.duration, margin, timeout)
+            report.segments += 1
+            report.distance += move.segment.length
+            report.planned_time += move.duration
+            report.achieved_time += elapsed
+            if move.segment.feed:
+                report.requested_time += move.segment.length / move.segment.feed * 60
+            report.max_start_skew = max(report.max_start_skew, start_skew)
+            if on_move is not None:
+                on_move(move, elapsed)
+        return report
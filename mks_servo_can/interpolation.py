@@ -0,0 +1,250 @@
+"""Synchronized multi-axis linear interpolation.
+
+Each axis of a segment gets its own speed and acceleration codes, scaled by its share of the move, so
+that every axis follows the same (scaled) profile as the leading axis and all of them finish together.
+The codes are integers (and the acceleration code saturates at 1), so the speed of each axis is
+solved for its acceleration code and the nearest floor/ceil combination is picked with the
+MoveTimeModel to minimize the end time skew.
+
+Requires NumPy (``pip install mks-servo-can[numpy]``).
+"""
+
+import logging
+import time
+
+from concurrent.futures import wait as wait_futures
+
+import numpy as np
+
+from .can_motor import MAX_SPEED, MAX_ACCELERATION
+from .mks_enums import RunMotorResult
+from .motion_model import MoveTimeModel, acceleration_rate, distance_to_revolutions, speed_scale
+
+
+class interpolation_error(Exception):
+    """Exception raised for an invalid interpolation plan or a failed dispatch."""
+
+    pass
+
+
+def sync_axis_parameters(distances, speed, acceleration, subdivisions=16, model=None):
+    """
+    Computes the per-axis speed and acceleration codes so that all the axes finish together.
+
+    Args:
+        distances (array_like): Distances in axis units, shape (n_axes,) or (n_segments, n_axes).
+        speed (int): The speed of the leading axis in the range of 1 to 3000.
+        acceleration (int): The acceleration of the leading axis in the range of 0 to 255.
+        subdivisions (int or array_like): The subdivisions, one value or one per axis.
+        model (MoveTimeModel, optional): The model used to predict the durations. Defaults to the nominal model.
+
+    Returns:
+        tuple: (speeds, accelerations, durations) arrays with the shape of distances. Axes that do not move get
+        speed 0 and duration 0. durations are the predicted durations of each axis.
+
+    Note: Very short moves can not run slower than 1 RPM, so they may finish before the leading axis.
+    """
+    model = model or MoveTimeModel()
+    d = np.abs(np.asarray(distances, dtype=np.float64))
+    if d.ndim == 0:
+        raise interpolation_error("distances must have one value per axis")
+    mstep = np.broadcast_to(np.asarray(subdivisions, dtype=np.float64), d.shape)
+    scale = speed_scale(mstep)
+    moving = d > 0
+
+    # The leading axis is the slowest one at full speed and acceleration
+    full = model.predict(speed, acceleration, d, mstep)
+    lead = np.argmax(full, axis=-1)[..., None]
+    lead_duration = np.take_along_axis(full, lead, axis=-1)
+    lead_revs = np.take_along_axis(distance_to_revolutions(d), lead, axis=-1)
+    lead_scale = np.take_along_axis(scale, lead, axis=-1)
+
+    # Command factor of each axis, the real speed and ramp rate are scaled by the distance ratio
+    revs = distance_to_revolutions(d)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = np.where(moving, revs / lead_revs * lead_scale / scale, 0.0)
+        if acceleration == 0:
+            ideal_acc = np.zeros_like(k)
+        else:
+            ideal_acc = np.where(moving, 256.0 - (256.0 - acceleration) / k, 0.0)
+    acc_low = 0 if acceleration == 0 else 1
+    acc_candidates = np.clip(np.stack([np.floor(ideal_acc), np.ceil(ideal_acc)]), acc_low, MAX_ACCELERATION)
+
+    # The acceleration codes are coarse (and saturate at 1), so the speed is solved for each acceleration
+    # candidate to end at the same time as the leading axis:
+    #   ramp_gain / a * v^2 - (T - overhead) * v + cruise_gain * D = 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a = acceleration_rate(acc_candidates) * scale / 60.0
+        t = np.maximum(lead_duration - model.overhead, 1e-9)
+        q = model.ramp_gain / a
+        disc = t * t - 4.0 * q * model.cruise_gain * revs
+        v = np.where(q > 0, (t - np.sqrt(np.maximum(disc, 0.0))) / (2.0 * q), model.cruise_gain * revs / t)
+        ideal_speed = np.where(moving, v * 60.0 / scale, 0.0)
+    ideal_speed = np.where(np.isfinite(ideal_speed), ideal_speed, speed * k)
+
+    speed_candidates = np.clip(np.concatenate([np.floor(ideal_speed), np.ceil(ideal_speed)]), 1, MAX_SPEED)
+    acc_candidates = np.concatenate([acc_candidates, acc_candidates])
+
+    candidates = model.predict(speed_candidates, acc_candidates, d, mstep)
+    best = np.argmin(np.abs(candidates - lead_duration), axis=0)[None]
+    speeds = np.where(moving, np.take_along_axis(speed_candidates, best, axis=0)[0], 0).astype(np.int64)
+    accelerations = np.where(moving, np.take_along_axis(acc_candidates, best, axis=0)[0], 0).astype(np.int64)
+    durations = np.where(moving, np.take_along_axis(candidates, best, axis=0)[0], 0.0)
+
+    # The leading axis keeps the requested codes
+    np.put_along_axis(speeds, lead, np.where(np.take_along_axis(moving, lead, axis=-1), speed, 0), axis=-1)
+    np.put_along_axis(accelerations, lead, np.where(np.take_along_axis(moving, lead, axis=-1), acceleration, 0), axis=-1)
+    np.put_along_axis(durations, lead, lead_duration, axis=-1)
+    return speeds, accelerations, durations
+
+
+class LinearPlan:
+    """A multi-axis path where all the axes of a segment start and finish together.
+
+    Attributes:
+        targets (numpy.ndarray): Absolute axis targets, shape (n_segments, n_axes).
+        speeds (numpy.ndarray): Speed codes, shape (n_segments, n_axes), 0 for the axes that do not move.
+        accelerations (numpy.ndarray): Acceleration codes, shape (n_segments, n_axes).
+        durations (numpy.ndarray): Predicted duration of each segment (slowest axis), shape (n_segments,).
+        skew (numpy.ndarray): Predicted spread of the axes end times of each segment, shape (n_segments,).
+        tolerance (float): Maximum accepted skew in seconds.
+    """
+
+    def __init__(self, targets, speeds, accelerations, durations, skew, tolerance):
+        self.targets = targets
+        self.speeds = speeds
+        self.accelerations = accelerations
+        self.durations = durations
+        self.skew = skew
+        self.tolerance = tolerance
+
+    def __len__(self):
+        return len(self.targets)
+
+    @property
+    def within_tolerance(self):
+        """numpy.ndarray: True for the segments whose predicted skew is within the tolerance."""
+        return self.skew <= self.tolerance
+
+
+def plan_linear_path(start, waypoints, speed, acceleration, subdivisions=16, tolerance=0.005, model=None):
+    """
+    Plans a synchronized path through a list of absolute axis waypoints.
+
+    Args:
+        start (array_like): Current axis of each servo, shape (n_axes,).
+        waypoints (array_like): Absolute axis targets, shape (n_segments, n_axes).
+        speed (int): The speed of the leading axis of each segment in the range of 1 to 3000.
+        acceleration (int): The acceleration of the leading axis in the range of 0 to 255.
+        subdivisions (int or array_like): The subdivisions, one value or one per axis.
+        tolerance (float): Maximum accepted skew between the axes end times in seconds.
+        model (MoveTimeModel, optional): The model used to predict the durations.
+
+    Returns:
+        LinearPlan: The plan. Segments out of tolerance are logged as a warning.
+    """
+    targets = np.atleast_2d(np.asarray(waypoints, dtype=np.int64))
+    start = np.asarray(start, dtype=np.int64)
+    if targets.shape[-1] != start.shape[-1]:
+        raise interpolation_error("waypoints and start must have the same number of axes")
+
+    distances = np.diff(np.vstack([start[None], targets]), axis=0)
+    speeds, accelerations, durations = sync_axis_parameters(distances, speed, acceleration, subdivisions, model)
+    moving = speeds > 0
+    end = np.where(moving, durations, -np.inf).max(axis=-1)
+    first = np.where(moving, durations, np.inf).min(axis=-1)
+    skew = np.where(moving.any(axis=-1), end - first, 0.0)
+    end = np.where(moving.any(axis=-1), end, 0.0)
+
+    plan = LinearPlan(targets, speeds, accelerations, end, skew, tolerance)
+    out_of_tolerance = np.count_nonzero(~plan.within_tolerance)
+    if out_of_tolerance:
+        logging.warning(f"{out_of_tolerance} segments exceed the skew tolerance of {tolerance}s")
+    return plan
+
+
+def dispatch_segment(servos, speeds, accelerations, targets):
+    """
+    Starts one segment on all the axes back to back, without waiting for the responses in between.
+
+    Args:
+        servos (list of MksServo): The servos, one per axis.
+        speeds (array_like): Speed codes, 0 skips the axis.
+        accelerations (array_like): Acceleration codes.
+        targets (array_like): Absolute axis targets.
+
+    Returns:
+        tuple: (futures, start_skew) the pending responses of the started axes and the time in seconds
+        between the first and the last command.
+    """
+    commands = [(servo, int(s), int(a), int(t)) for servo, s, a, t in zip(servos, speeds, accelerations, targets) if s > 0]
+    for servo, s, a, t in commands:
+        servo._validate_speed(s)
+        servo._validate_acceleration(a)
+        servo._validate_axis(t)
+
+    futures = []
+    start_time = time.perf_counter()
+    for servo, s, a, t in commands:
+        futures.append(servo.nb_run_motor_absolute_motion_by_axis(s, a, t))
+    return futures, time.perf_counter() - start_time
+
+
+def run_segment(servos, speeds, accelerations, targets, duration, margin=0.005, timeout=15):
+    """
+    Runs one segment on all the axes. The segment is dispatched with dispatch_segment, then this method
+    sleeps until the predicted end and confirms it with one status query per axis.
+
+    Args:
+        servos (list of MksServo): The servos, one per axis.
+        speeds (array_like): Speed codes, 0 skips the axis.
+        accelerations (array_like): Acceleration codes.
+        targets (array_like): Absolute axis targets.
+        duration (float): Predicted duration of the segment in seconds.
+        margin (float): Extra seconds to wait after the predicted end.
+        timeout (float): Maximum number of seconds to wait for the responses and for each axis to stop.
+
+    Returns:
+        tuple: (start_skew, elapsed) the time between the first and the last command and the time until
+        all the axes were confirmed stopped, in seconds.
+
+    Raises:
+        interpolation_error: If an axis does not acknowledge the start of the segment.
+    """
+    start_time = time.perf_counter()
+    futures, start_skew = dispatch_segment(servos, speeds, accelerations, targets)
+
+    _, not_done = wait_futures(futures, timeout)
+    for future in not_done:
+        future.cancel()
+    results = [servos[0].run_motor_result(f.result()) if f.done() and not f.cancelled() else None for f in futures]
+    if any(r not in (RunMotorResult.RunStarting, RunMotorResult.RunComplete) for r in results):
+        raise interpolation_error(f"The segment was not started by all the axes: {results}")
+
+    time.sleep(max(0.0, start_time + duration + margin - time.perf_counter()))
+    for servo, s in zip(servos, speeds):
+        if s > 0 and servo.is_motor_running():
+            servo.wait_for_motor_idle(timeout)
+    return start_skew, time.perf_counter() - start_time
+
+
+def run_linear_path(servos, plan, margin=0.005, timeout=15):
+    """
+    Runs a plan segment by segment with run_segment.
+
+    Args:
+        servos (list of MksServo): The servos, one per axis.
+        plan (LinearPlan): The plan, see plan_linear_path.
+        margin (float): Extra seconds to wait after the predicted end of each segment.
+        timeout (float): Maximum number of seconds to wait for the responses and for each axis to stop.
+
+    Returns:
+        numpy.ndarray: The measured start skew of each segment in seconds.
+
+    Raises:
+        interpolation_error: If an axis does not acknowledge the start of a segment.
+    """
+    start_skews = np.zeros(len(plan))
+    for i in range(len(plan)):
+        start_skews[i], _ = run_segment(servos, plan.speeds[i], plan.accelerations[i], plan.targets[i], plan.durations[i], margin, timeout)
+    return start_skews
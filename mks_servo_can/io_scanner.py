@@ -0,0 +1,249 @@
+"""Fixed-cycle scan of the IO ports of all the axes, as a PLC does with its distributed IO.
+
+Each drive has two inputs and two outputs (IN_1, IN_2, OUT_1, OUT_2). IoScanner sweeps all the axes
+every period: the pending output writes (WRITE_IO_PORT_COMMAND) and the status reads
+(READ_IO_PORT_STATUS) of every axis are sent back to back, then the responses are collected with a
+shared deadline. The statuses are kept in a process image, one nibble per axis with the bit layout of
+read_io_port_status (bit0 IN_1, bit1 IN_2, bit2 OUT_1, bit3 OUT_2), and the bit changes between two
+sweeps call the change callbacks:
+
+    scanner = IoScanner({"conveyor": servo_1, "gripper": servo_2}, period=0.01)
+    scanner.on_change(lambda axis, port, level: print(axis, port, level), ports=("IN_1",))
+    threading.Thread(target=scanner.run, daemon=True).start()
+    scanner.set_output("gripper", 1, 1)  # Written by the next sweep
+    print(scanner.image().hex(), scanner.input("conveyor", 1))
+
+A response lost in a sweep keeps the previous status of the axis, a failed write is sent again by the
+next sweep unless the output was set again meanwhile.
+
+Requires NumPy (``pip install mks-servo-can[numpy]``).
+"""
+
+import threading
+import time
+
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from .can_set import _io_port_data
+from .mks_enums import MksCommands, SuccessStatus
+from .speed_streamer import JitterStats
+
+PORTS = {"IN_1": 0x01, "IN_2": 0x02, "OUT_1": 0x04, "OUT_2": 0x08}
+_OUTPUTS = {1: PORTS["OUT_1"], 2: PORTS["OUT_2"]}
+
+
+class io_scanner_error(Exception):
+    """Exception raised for an unknown axis or port."""
+
+    pass
+
+
+class ScanReport:
+    """Result of a scan.
+
+    Attributes:
+        cycles (int): Number of sweeps.
+        reads (int): Number of status reads sent.
+        lost (int): Number of status reads without response in their sweep.
+        writes (int): Number of output writes sent.
+        failed_writes (int): Number of output writes that failed or got no response, they are sent again.
+        jitter (JitterStats): Lateness of the sweep starts.
+        sweep (JitterStats): Durations of the sweeps, from the first frame sent to the last response.
+    """
+
+    def __init__(self):
+        self.cycles = 0
+        self.reads = 0
+        self.lost = 0
+        self.writes = 0
+        self.failed_writes = 0
+        self.jitter = JitterStats()
+        self.sweep = JitterStats()
+
+    def __repr__(self):
+        return (
+            f"ScanReport(cycles={self.cycles}, reads={self.reads}, lost={self.lost}, writes={self.writes}, failed_writes={self.failed_writes}, "
+            f"jitter={self.jitter!r}, sweep_mean={self.sweep.mean * 1e6:.1f}us, sweep_max={self.sweep.max * 1e6:.1f}us)"
+        )
+
+
+class IoScanner:
+    """Reads the inputs and writes the pending outputs of all the axes in one pipelined sweep per period.
+
+    Attributes:
+        axes (list): The axis keys, in the order of the process image.
+        period (float): Seconds between the sweep starts.
+        timeout (float): Seconds a sweep waits for the responses.
+    """
+
+    SPIN_TIME = 0.0005  # Busy wait the last part of each period, sleep() is not precise enough
+
+    def __init__(self, servos, period=0.01, timeout=None):
+        """
+        Args:
+            servos (dict or list): MksServo by axis key, a list is keyed by can_id.
+            period (float): Seconds between the sweep starts.
+            timeout (float, optional): Seconds a sweep waits for the responses, the period by default.
+        """
+        self.servos = servos if isinstance(servos, dict) else {servo.can_id: servo for servo in servos}
+        self.axes = list(self.servos)
+        self.period = period
+        self.timeout = period if timeout is None else timeout
+        self._index = {axis: i for i, axis in enumerate(self.axes)}
+        n = len(self.axes)
+        self._status = np.zeros(n, dtype=np.uint8)
+        self._valid = np.zeros(n, dtype=bool)  # A status was read
+        self._out_mask = np.zeros(n, dtype=np.uint8)  # Outputs to write, OUT_1 and OUT_2 bits
+        self._out_level = np.zeros(n, dtype=np.uint8)
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def on_change(self, callback, ports=tuple(PORTS)):
+        """
+        Adds a change callback, called from the scan thread as callback(axis, port, level) for each bit that
+        changed between two sweeps. The first status read of an axis does not call it.
+
+        Args:
+            callback (callable): The callback, port is a key of PORTS and level 0 or 1.
+            ports (iterable of str): The ports watched by the callback.
+        """
+        mask = 0
+        for port in ports:
+            if port not in PORTS:
+                raise io_scanner_error(f"Unknown port {port}")
+            mask |= PORTS[port]
+        self._callbacks.append((mask, callback))
+
+    def set_output(self, axis, out, level):
+        """
+        Sets an output, written by the next sweep.
+
+        Args:
+            axis: The axis key.
+            out (int): 1 for OUT_1, 2 for OUT_2.
+            level (int): 0 or 1.
+        """
+        i = self._axis_index(axis)
+        if out not in _OUTPUTS:
+            raise io_scanner_error(f"Unknown output {out}")
+        bit = _OUTPUTS[out]
+        with self._lock:
+            self._out_mask[i] |= bit
+            if level:
+                self._out_level[i] |= bit
+            else:
+                self._out_level[i] &= 0x0F ^ bit
+
+    def image(self):
+        """Returns the process image: two axes per byte, the first one in the low nibble."""
+        status = np.zeros(len(self._status) + len(self._status) % 2, dtype=np.uint8)
+        status[: len(self._status)] = self._status
+        return (status[0::2] | (status[1::2] << 4)).tobytes()
+
+    def status(self, axis):
+        """Returns the last status of an axis (bits as in read_io_port_status), None before the first read."""
+        i = self._axis_index(axis)
+        return int(self._status[i]) if self._valid[i] else None
+
+    def input(self, axis, n):
+        """Returns the last level of IN_1 (n=1) or IN_2 (n=2) of an axis, None before the first read."""
+        status = self.status(axis)
+        return None if status is None else (status >> (n - 1)) & 1
+
+    def stop(self):
+        """Stops a running scan at the next cycle."""
+        self._stop.set()
+
+    def run(self, cycles=None):
+        """
+        Scans until stop() is called or the given number of cycles ran.
+
+        Returns:
+            ScanReport: The statistics of the scan.
+        """
+        self._stop.clear()
+        report = ScanReport()
+        deadline = time.perf_counter()
+        while not self._stop.is_set() and (cycles is None or report.cycles < cycles):
+            remaining = deadline - time.perf_counter()
+            if remaining > self.SPIN_TIME:
+                time.sleep(remaining - self.SPIN_TIME)
+            while time.perf_counter() < deadline:
+                pass
+            start = time.perf_counter()
+            lateness = start - deadline
+            report.jitter.add(lateness)
+            if lateness > self.period:
+                report.jitter.overruns += 1
+                deadline = start
+            self._sweep(report)
+            report.sweep.add(time.perf_counter() - start)
+            report.cycles += 1
+            deadline += self.period
+        return report
+
+    def _axis_index(self, axis):
+        try:
+            return self._index[axis]
+        except KeyError:
+            raise io_scanner_error(f"Unknown axis {axis}")
+
+    def _sweep(self, report):
+        with self._lock:
+            pending = np.flatnonzero(self._out_mask)
+            masks = self._out_mask[pending].copy()
+            levels = self._out_level[pending].copy()
+            self._out_mask[pending] = 0
+
+        # The writes first, so that the reads of the same sweep see the outputs
+        writes = []
+        for i, mask, level in zip(pending, masks, levels):
+            out1 = (level >> 2) & 1 if mask & PORTS["OUT_1"] else None
+            out2 = (level >> 3) & 1 if mask & PORTS["OUT_2"] else None
+            writes.append(self.servos[self.axes[i]].send_generic(MksCommands.WRITE_IO_PORT_COMMAND, _io_port_data(out1, out2)))
+        read_code = MksCommands.READ_IO_PORT_STATUS
+        reads = [servo.send_generic(read_code, [read_code.value]) for servo in self.servos.values()]
+        report.writes += len(writes)
+        report.reads += len(reads)
+
+        deadline = time.perf_counter() + self.timeout
+        for i, mask, future in zip(pending, masks, writes):
+            response = _result(future, deadline)
+            if response is None or len(response) < 3 or response[1] != SuccessStatus.Success.value:
+                report.failed_writes += 1
+                with self._lock:
+                    self._out_mask[i] |= mask & ~self._out_mask[i]  # Unless set again meanwhile
+
+        status = self._status.copy()
+        answered = np.zeros(len(reads), dtype=bool)
+        for i, future in enumerate(reads):
+            response = _result(future, deadline)
+            if response is not None and len(response) == 3:
+                status[i] = response[1] & 0x0F
+                answered[i] = True
+        report.lost += len(reads) - int(answered.sum())
+
+        changed = np.where(self._valid & answered, status ^ self._status, 0)
+        self._status = status
+        self._valid |= answered
+        if self._callbacks:
+            for i in np.flatnonzero(changed):
+                self._notify(self.axes[i], int(changed[i]), int(status[i]))
+
+    def _notify(self, axis, changed, status):
+        for port, bit in PORTS.items():
+            if changed & bit:
+                for mask, callback in self._callbacks:
+                    if mask & bit:
+                        callback(axis, port, int(bool(status & bit)))
+
+
+def _result(future, deadline):
+    try:
+        return future.result(max(0.0, deadline - time.perf_counter()))
+    except FutureTimeoutError:
+        future.cancel()
+        return None
@@ -0,0 +1,404 @@
+"""Offline decoding of CAN logs into NumPy arrays.
+
+The logs are read in chunks into a structured array of frames (FRAME_DTYPE). The MKS CRC is checked,
+the op codes are classified and the responses of the drives are decoded for a whole chunk at once
+with array operations, without a Python call per frame:
+
+    decoder = decode_log("field.log")
+    print(decoder.frames, decoder.crc_errors)
+    position = decoder.signals[1]["position"]   # structured array with "timestamp" and "value"
+    speed = decoder.signals[1]["speed"]
+
+The candump log format (``candump -l``, ``(1700000000.123456) can0 001#3100000000400075``) is parsed
+with vectorized NumPy code. The other formats of python-can (ASC, BLF, TRC, CSV) are read with
+can.LogReader and packed into the same arrays, the decoding is vectorized in both cases.
+
+Commands and responses use the same CAN ID. A frame is decoded as a response when its length (and its
+status value) match the response and the log does not record it as transmitted by the host.
+
+Requires NumPy (``pip install mks-servo-can[numpy]``).
+"""
+
+import os
+
+import can
+import numpy as np
+
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .mks_enums import CalibrationResult, GoHomeResult, MksCommands, MotorStatus, RunMotorResult
+
+FRAME_DTYPE = np.dtype(
+    [
+        ("timestamp", np.float64),
+        ("can_id", np.uint32),
+        ("dlc", np.uint8),
+        ("direction", np.int8),  # RX, TX or UNKNOWN
+        ("data", np.uint8, (8,)),
+    ]
+)
+SIGNAL_DTYPE = np.dtype([("timestamp", np.float64), ("value", np.int64)])
+
+RX = 1
+TX = 0
+UNKNOWN = -1
+
+_RUN_COMMANDS = (
+    MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_PULSES_COMMAND,
+    MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_PULSES_COMMAND,
+    MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_AXIS_COMMAND,
+    MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_AXIS_COMMAND,
+    MksCommands.RUN_MOTOR_SPEED_MODE_COMMAND,
+)
+
+# Decoded signals: name -> (op codes, response length, first value byte, value bytes, signed, status enum)
+SIGNALS = {
+    "position": ((MksCommands.READ_ENCODED_VALUE_ADDITION,), 8, 1, 6, True, None),
+    "raw_position": ((MksCommands.READ_RAW_ENCODED_VALUE_ADDITION,), 8, 1, 6, True, None),
+    "carry": ((MksCommands.READ_ENCODER_VALUE_CARRY,), 8, 1, 4, True, None),
+    "encoder_value": ((MksCommands.READ_ENCODER_VALUE_CARRY,), 8, 5, 2, False, None),
+    "speed": ((MksCommands.READ_MOTOR_SPEED,), 4, 1, 2, True, None),
+    "pulses_received": ((MksCommands.READ_NUM_PULSES_RECEIVED,), 6, 1, 4, True, None),
+    "shaft_angle_error": ((MksCommands.READ_MOTOR_SHAFT_ANGLE_ERROR,), 6, 1, 4, True, None),
+    "io_status": ((MksCommands.READ_IO_PORT_STATUS,), 3, 1, 1, False, None),
+    "motor_status": ((MksCommands.QUERY_MOTOR_STATUS_COMMAND,), 3, 1, 1, False, MotorStatus),
+    "run_status": (_RUN_COMMANDS, 3, 1, 1, False, RunMotorResult),
+    "calibration_status": ((MksCommands.MOTOR_CALIBRATION_COMMAND,), 3, 1, 1, False, CalibrationResult),
+    "homing_status": ((MksCommands.GO_HOME_COMMAND,), 3, 1, 1, False, GoHomeResult),
+}
+
+
+def _lookup_table(values):
+    table = np.zeros(256, dtype=bool)
+    table[list(values)] = True
+    return table
+
+
+KNOWN_OP_CODES = _lookup_table(command.value for command in MksCommands)
+_SIGNAL_OP_CODES = {name: _lookup_table(command.value for command in signal[0]) for name, signal in SIGNALS.items()}
+# Status values that can be on the bus, without the Unknown placeholders of the library
+_STATUS_VALUES = {signal[5]: _lookup_table(status.value for status in signal[5] if status.value < 256) for signal in SIGNALS.values() if signal[5] is not None}
+
+_HEX = np.full(256, 0xFF, dtype=np.uint8)
+_HEX[np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)] = np.arange(16)
+_HEX[np.frombuffer(b"abcdef", dtype=np.uint8)] = np.arange(10, 16)
+_DIGIT = np.full(256, 0xFF, dtype=np.uint8)
+_DIGIT[ord("0") : ord("9") + 1] = np.arange(10)
+
+
+def _first_after(positions, starts):
+    # Index in the buffer of the first occurrence at or after each start, len(buffer) when there is none
+    k = np.searchsorted(positions, starts)
+    return np.append(positions, np.iinfo(np.int64).max)[k]
+
+
+_PAD = 16
+
+
+def _gather(padded, first, width):
+    # (n, width) matrix of the bytes at first + 0..width-1 of the buffer, padded with _PAD zeros on both sides
+    return sliding_window_view(padded, width)[first + _PAD]
+
+
+# Place values of the digits, float64 to use BLAS (exact below 2**53)
+_ID_WEIGHTS = 16.0 ** np.arange(7, -1, -1)
+_SECONDS_WEIGHTS = 10.0 ** np.arange(11, -1, -1)
+_FRACTION_WEIGHTS = 10.0 ** np.arange(8, -1, -1)
+
+
+def _layout_by_offsets(buffer, starts, line_ends):
+    # Positions of the ')', '.', '#' and of the space before the ID when all the lines have the layout of the first
+    # one (same timestamp width and interface), checked at the expected offsets instead of searched. None otherwise.
+    first_line = bytes(buffer[starts[0] : line_ends[0]])
+    offsets = [first_line.find(b")"), first_line.find(b"."), first_line.find(b"#")]
+    offsets.append(first_line.rfind(b" ", 0, offsets[2]))
+    if min(offsets) < 0:
+        return None
+    positions = []
+    for offset, character in zip(offsets, b").# "):
+        position = starts + offset
+        if not np.all(buffer[np.minimum(position, len(buffer) - 1)] == character):
+            return None
+        positions.append(position)
+    closing, dots, hashes, last_space = positions
+    if not np.all(hashes < line_ends):
+        return None
+    return closing, dots, hashes, last_space
+
+
+def _layout_by_search(buffer, starts, line_ends):
+    hashes = _first_after(np.flatnonzero(buffer == ord("#")), starts)
+    hashes = np.where(hashes < line_ends, hashes, starts)
+    spaces = np.flatnonzero(buffer == ord(" "))
+    last_space = np.concatenate(([-1], spaces))[np.searchsorted(spaces, hashes)]
+    closing = _first_after(np.flatnonzero(buffer == ord(")")), starts)
+    dots = _first_after(np.flatnonzero(buffer == ord(".")), starts)
+    return closing, dots, hashes, last_space
+
+
+def parse_candump(chunk):
+    """
+    Parses candump log lines (``candump -l`` / ``-L``), vectorized.
+
+    Remote frames, CAN FD frames and malformed lines are skipped.
+
+    Args:
+        chunk (bytes): Complete lines.
+
+    Returns:
+        numpy.ndarray: The frames, FRAME_DTYPE, direction UNKNOWN when the lines have no R/T flag.
+    """
+    buffer = np.frombuffer(chunk, dtype=np.uint8)
+    if not len(buffer):
+        return np.zeros(0, dtype=FRAME_DTYPE)
+    padded = np.zeros(len(buffer) + 2 * _PAD, dtype=np.uint8)
+    padded[_PAD:-_PAD] = buffer
+    ends = np.flatnonzero(buffer == ord("\n"))
+    if buffer[-1] != ord("\n"):
+        ends = np.append(ends, len(buffer))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    line_ends = ends - ((ends > starts) & (buffer[np.maximum(ends - 1, 0)] == ord("\r")))
+
+    layout = _layout_by_offsets(buffer, starts, line_ends)
+    if layout is None:
+        layout = _layout_by_search(buffer, starts, line_ends)
+    closing, dots, hashes, last_space = layout
+    valid = (buffer[np.minimum(starts, len(buffer) - 1)] == ord("(")) & (hashes < line_ends)
+    hashes = np.where(valid, hashes, starts)
+
+    # The ID is between the last space before the '#' and the '#', its hex digits are right aligned on the '#'
+    id_length = hashes - last_space - 1
+    valid &= (last_space > starts) & ((id_length == 3) | (id_length == 8))
+    nibbles = _HEX[_gather(padded, hashes - 8, 8)]
+    in_id = np.arange(8) >= 8 - id_length[:, None]
+    valid &= ~np.any(in_id & (nibbles == 0xFF), axis=1)
+    can_ids = (nibbles * in_id).astype(np.float64) @ _ID_WEIGHTS
+
+    # Data, two hex digits per byte up to the end of the line or the direction flag (" R" or " T")
+    has_flag = (line_ends - hashes >= 3) & (buffer[np.maximum(line_ends - 2, 0)] == ord(" "))
+    data_ends = np.where(has_flag, line_ends - 2, line_ends)
+    flag = buffer[np.maximum(line_ends - 1, 0)]
+    direction = np.where(has_flag & (flag == ord("R")), RX, np.where(has_flag & (flag == ord("T")), TX, UNKNOWN))
+    data_chars = data_ends - hashes - 1
+    valid &= (data_chars % 2 == 0) & (data_chars <= 16)
+    dlc = np.where(valid, data_chars // 2, 0)
+    nibbles = _HEX[_gather(padded, hashes + 1, 16)]
+    in_data = np.arange(16) < 2 * dlc[:, None]
+    valid &= ~np.any(in_data & (nibbles == 0xFF), axis=1)
+    nibbles = np.where(in_data, nibbles, 0)
+    data = (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+
+    # Timestamp "(seconds.fraction)", the digits are aligned on the '.'
+    valid &= (dots < closing) & (closing < hashes) & (closing - dots <= 10) & (dots - starts <= 13)
+    dots = np.where(valid, dots, starts)
+    digits = _DIGIT[_gather(padded, dots - 12, 12)]
+    in_seconds = np.arange(12) >= 12 - (dots - starts - 1)[:, None]
+    valid &= ~np.any(in_seconds & (digits == 0xFF), axis=1)
+    seconds = (digits * in_seconds).astype(np.float64) @ _SECONDS_WEIGHTS
+    digits = _DIGIT[_gather(padded, dots + 1, 9)]
+    in_fraction = np.arange(9) < (closing - dots - 1)[:, None]
+    valid &= ~np.any(in_fraction & (digits == 0xFF), axis=1)
+    fraction = (digits * in_fraction).astype(np.float64) @ _FRACTION_WEIGHTS
+
+    frames = np.zeros(np.count_nonzero(valid), dtype=FRAME_DTYPE)
+    frames["timestamp"] = seconds[valid] + fraction[valid] * 1e-9
+    frames["can_id"] = can_ids[valid]
+    frames["dlc"] = dlc[valid]
+    frames["direction"] = direction[valid]
+    frames["data"] = data[valid]
+    return frames
+
+
+def frames_from_messages(messages):
+    """
+    Packs python-can messages into a frame array.
+
+    Args:
+        messages (iterable of can.Message): The messages, remote, error and CAN FD frames are skipped.
+
+    Returns:
+        numpy.ndarray: The frames, FRAME_DTYPE.
+    """
+    rows = [
+        (message.timestamp, message.arbitration_id, len(message.data), RX if message.is_rx else TX, bytes(message.data).ljust(8, b"\0"))
+        for message in messages
+        if not (message.is_remote_frame or message.is_error_frame or message.is_fd)
+    ]
+    frames = np.zeros(len(rows), dtype=FRAME_DTYPE)
+    if rows:
+        timestamps, can_ids, dlcs, directions, data = zip(*rows)
+        frames["timestamp"] = timestamps
+        frames["can_id"] = can_ids
+        frames["dlc"] = dlcs
+        frames["direction"] = directions
+        frames["data"] = np.frombuffer(b"".join(data), dtype=np.uint8).reshape(-1, 8)
+    return frames
+
+
+def iter_frames(path, chunk_size=1 << 24):
+    """
+    Reads a log in chunks.
+
+    Args:
+        path (str): The log file. ".log" files are parsed as candump logs, the others with can.LogReader.
+        chunk_size (int): Bytes read at a time for candump logs, frames per chunk for the other formats.
+
+    Yields:
+        numpy.ndarray: The frames of a chunk, FRAME_DTYPE.
+    """
+    if os.path.splitext(path)[1].lower() == ".log":
+        with open(path, "rb") as log:
+            rest = b""
+            while True:
+                block = log.read(chunk_size)
+                if not block:
+                    break
+                block = rest + block
+                cut = block.rfind(b"\n") + 1
+                rest = block[cut:]
+                if cut:
+                    yield parse_candump(block[:cut])
+            if rest:
+                yield parse_candump(rest)
+        return
+
+    messages = []
+    for message in can.LogReader(path):
+        messages.append(message)
+        if len(messages) == chunk_size:
+            yield frames_from_messages(messages)
+            messages = []
+    if messages:
+        yield frames_from_messages(messages)
+
+
+def check_crc(frames):
+    """Returns a boolean array, True where the last data byte is the MKS CRC (can_id + sum(data)) & 0xFF."""
+    column = np.arange(8)
+    dlc = frames["dlc"].astype(np.int64)
+    payload = np.where(column < dlc[:, None] - 1, frames["data"], 0)
+    crc = (frames["can_id"].astype(np.int64) + payload.sum(axis=1, dtype=np.int64)) & 0xFF
+    last = frames["data"][np.arange(len(frames)), np.maximum(dlc - 1, 0)]
+    return (dlc >= 2) & (crc == last)
+
+
+def op_codes(frames):
+    """
+    Classifies the frames by op code.
+
+    Returns:
+        tuple: (op code array, boolean array True where the op code is a MksCommands value).
+    """
+    op = frames["data"][:, 0]
+    return op, KNOWN_OP_CODES[op] & (frames["dlc"] > 0)
+
+
+def _big_endian(data, first, size, signed):
+    value = np.zeros(len(data), dtype=np.int64)
+    for i in range(size):
+        value = (value << 8) | data[:, first + i]
+    if signed:
+        sign = np.int64(1) << (8 * size - 1)
+        value = (value ^ sign) - sign
+    return value
+
+
+def decode_frames(frames, crc_ok=None):
+    """
+    Decodes the responses of the drives.
+
+    Args:
+        frames (numpy.ndarray): FRAME_DTYPE frames.
+        crc_ok (numpy.ndarray, optional): The result of check_crc(frames).
+
+    Returns:
+        dict: {can_id: {signal name: SIGNAL_DTYPE array}}, see SIGNALS. The status values are the values of
+        the status enums (e.g. MotorStatus).
+    """
+    if crc_ok is None:
+        crc_ok = check_crc(frames)
+    response = crc_ok & (frames["direction"] != TX)
+    op = frames["data"][:, 0]
+    dlc = frames["dlc"]
+    status = frames["data"][:, 1]
+    signals = {}
+    for name, (commands, length, first, size, signed, status_enum) in SIGNALS.items():
+        mask = response & (dlc == length) & _SIGNAL_OP_CODES[name][op]
+        if status_enum is not None:
+            mask &= _STATUS_VALUES[status_enum][status]
+        if not mask.any():
+            continue
+        selected = frames[mask]
+        order = np.argsort(selected["can_id"], kind="stable")
+        selected = selected[order]
+        values = np.zeros(len(selected), dtype=SIGNAL_DTYPE)
+        values["timestamp"] = selected["timestamp"]
+        values["value"] = _big_endian(selected["data"], first, size, signed)
+        can_ids, starts = np.unique(selected["can_id"], return_index=True)
+        for can_id, axis_values in zip(can_ids, np.split(values, starts[1:])):
+            signals.setdefault(int(can_id), {})[name] = axis_values
+    return signals
+
+
+class LogDecoder:
+    """Accumulates the decoded signals of the chunks of a log.
+
+    Attributes:
+        frames (int): Number of frames.
+        crc_errors (int): Number of frames with an invalid CRC.
+        unknown_op_codes (int): Number of frames with a valid CRC and an op code that is not a MksCommands value.
+        op_code_counts (numpy.ndarray): Number of frames with a valid CRC by op code (256 counters).
+        signals (dict): {can_id: {signal name: SIGNAL_DTYPE array}}, complete after finish().
+    """
+
+    def __init__(self, can_ids=None):
+        """
+        Args:
+            can_ids (iterable of int, optional): Decodes only these axes.
+        """
+        self.can_ids = None if can_ids is None else np.asarray(list(can_ids), dtype=np.uint32)
+        self.frames = 0
+        self.crc_errors = 0
+        self.unknown_op_codes = 0
+        self.op_code_counts = np.zeros(256, dtype=np.int64)
+        self.signals = {}
+        self._parts = {}
+
+    def feed(self, frames):
+        """Decodes a chunk of frames."""
+        if self.can_ids is not None:
+            frames = frames[np.isin(frames["can_id"], self.can_ids)]
+        crc_ok = check_crc(frames)
+        op, known = op_codes(frames)
+        self.frames += len(frames)
+        self.crc_errors += int(np.count_nonzero(~crc_ok))
+        self.unknown_op_codes += int(np.count_nonzero(crc_ok & ~known))
+        self.op_code_counts += np.bincount(op[crc_ok], minlength=256)
+        for can_id, axis_signals in decode_frames(frames, crc_ok).items():
+            for name, values in axis_signals.items():
+                self._parts.setdefault((can_id, name), []).append(values)
+
+    def finish(self):
+        """Concatenates the signals of the chunks into signals."""
+        for (can_id, name), parts in self._parts.items():
+            self.signals.setdefault(can_id, {})[name] = np.concatenate(parts)
+        self._parts = {}
+        return self
+
+
+def decode_log(path, can_ids=None, chunk_size=1 << 24):
+    """
+    Decodes a log file, chunk by chunk.
+
+    Args:
+        path (str): The log file, see iter_frames().
+        can_ids (iterable of int, optional): Decodes only these axes.
+        chunk_size (int): See iter_frames().
+
+    Returns:
+        LogDecoder: The counters and the decoded signals.
+    """
+    decoder = LogDecoder(can_ids)
+    for frames in iter_frames(path, chunk_size):
+        decoder.feed(frames)
+    return decoder.finish()
@@ -110,7 +110,7 @@ class HoldingStrength(Enum):
 
 
 class EnPinEnable(Enum):
-    ActiveLow = (0,)
+    ActiveLow = 0
     ActiveHigh = 1
     ActiveAlways = 2
 
@@ -127,6 +127,11 @@ class EndStopLevel(Enum):
     High = 1
 
 
+class HomeMode(Enum):
+    UseLimit = 0
+    NoLimit = 1
+
+
 class GoHomeResult(Enum):
     Unknown = 500
     Fail = 0
@@ -1,9 +1,35 @@
-import can
-import time
+import importlib.util
 import logging
+import sys
+import threading
+import time
 
+from collections import deque
+from concurrent.futures import Future
 from enum import Enum
+from functools import partial
 from .mks_enums import Enable, SuccessStatus, MksCommands
+from .operations import OperationFuture
+from . import trace as _trace
+from .retry import DEFAULT_RETRY
+
+
+def _lazy_import(name):
+    """Returns the module, imported on first attribute access if it is not imported yet."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# python-can is only loaded when a message is built or a bus error is handled, so tools that create handles
+# without a bus (discovery, simulation, offline analysis) do not pay for its import.
+can = _lazy_import("can")
 
 
 class CanMessageError(Exception):
@@ -36,6 +62,163 @@ class InvalidResponseError(Exception):
     pass
 
 
+class _RequestSlot:
+    """A reusable request: the frames sent and the wait for the response of MksServo.set_generic().
+
+    The slots are pooled in _REQUEST_SLOTS and shared by all the servos, so once every data length has been
+    sent a request allocates no message, buffer, future or lock. The _done lock is held while the slot is idle
+    and released by set_result().
+
+    Each expect() starts a new generation, and the pending responses hold the slot with its generation: a
+    response popped for an attempt that timed out meanwhile (or for an earlier request of a reused slot) cannot
+    resolve the current one.
+    """
+
+    __slots__ = ("_messages", "sent", "_done", "_guard", "_waiting", "_generation", "_result")
+
+    def __init__(self):
+        self._messages = {}  # can.Message by data length, CRC included
+        self.sent = None  # The last message filled
+        self._done = threading.Lock()
+        self._done.acquire()
+        self._guard = threading.Lock()
+        self._waiting = False
+        self._generation = 0
+        self._result = None
+
+    def message(self, can_id, op_code, data):
+        """Fills the frame of this length in place with the command and its CRC, and returns it."""
+        length = len(data) + 2
+        message = self._messages.get(length)
+        if message is None:
+            message = self._messages[length] = can.Message(data=bytearray(length), is_extended_id=False)
+        message.arbitration_id = can_id
+        buffer = message.data
+        buffer[0] = op_code
+        crc = can_id + op_code
+        i = 1
+        for value in data:
+            buffer[i] = value
+            crc += value
+            i += 1
+        buffer[i] = crc & 0xFF
+        self.sent = message
+        return message
+
+    def expect(self):
+        """
+        Arms the slot before the command is sent, the response may arrive before send() returns.
+
+        Returns:
+            int: The generation of the attempt, added to the pending responses with the slot.
+        """
+        with self._guard:
+            self._generation += 1
+            self._waiting = True
+            return self._generation
+
+    def claim(self, generation):
+        """Returns True if the attempt of this generation is still waiting, it is then resolved by set_result()."""
+        with self._guard:
+            if generation != self._generation or not self._waiting:
+                return False
+            self._waiting = False
+        return True
+
+    def cancel(self):
+        """Returns True if the current attempt was still waiting, False if a response claimed it."""
+        with self._guard:
+            waiting, self._waiting = self._waiting, False
+        return waiting
+
+    def set_result(self, data):
+        self._result = data
+        self._done.release()
+
+    def wait(self, pending, timeout):
+        """
+        Waits for the response.
+
+        Args:
+            pending (deque): The pending responses the slot was added to, it is removed from them on timeout.
+            timeout (float): Seconds.
+
+        Returns:
+            The response data, None on timeout.
+        """
+        if not self._done.acquire(True, timeout):
+            if self.cancel():
+                try:
+                    pending.remove((self, self._generation))
+                except ValueError:  # Popped by a response that found it cancelled
+                    pass
+                return None
+            self._done.acquire()  # Answered meanwhile, set_result() is about to release
+        result, self._result = self._result, None
+        return result
+
+
+_REQUEST_SLOTS = []
+
+
+def _remove_cancelled(pending, future):
+    # Done callback of the send_generic() futures
+    if future.cancelled():
+        try:
+            pending.remove((future, None))
+        except ValueError:  # Popped by a response meanwhile
+            pass
+
+
+def _take_request_slot():
+    try:
+        return _REQUEST_SLOTS.pop()
+    except IndexError:  # As many slots as concurrent requests
+        return _RequestSlot()
+
+
+class FrameDispatcher:
+    """Dispatches the frames received by a can.Notifier to the MksServo decoders by CAN ID.
+
+    With a plain can.Notifier every MksServo adds its own listener, which is called for every frame. Passed
+    to MksServo in place of the notifier, the dispatcher is the only listener and calls one decoder per frame:
+
+        notifier = can.Notifier(bus, [])
+        dispatcher = FrameDispatcher(notifier)
+        servos = [MksServo(bus, dispatcher, can_id) for can_id in range(1, 2048)]
+    """
+
+    __slots__ = ("notifier", "_handlers")
+
+    def __init__(self, notifier):
+        """
+        Args:
+            notifier (can.Notifier): The notifier of the bus.
+        """
+        self.notifier = notifier
+        self._handlers = {}
+        notifier.add_listener(self)
+
+    def __call__(self, message):
+        handler = self._handlers.get(message.arbitration_id)
+        if handler is not None and not message.is_extended_id:
+            handler(message.arbitration_id, message.data)
+
+    def add_frame_handler(self, can_id, handler):
+        """Calls handler(can_id, data) for each standard frame received from can_id."""
+        self._handlers[can_id] = handler
+
+    def remove_frame_handler(self, can_id):
+        self._handlers.pop(can_id, None)
+
+    def add_listener(self, listener):
+        """Adds a listener to the notifier, called with every can.Message."""
+        self.notifier.add_listener(listener)
+
+    def remove_listener(self, listener):
+        self.notifier.remove_listener(listener)
+
+
 class MksServo:
     from .can_commands import (
         read_encoder_value_carry,
@@ -69,6 +252,7 @@ class MksServo:
         enable_motor,
         emergency_stop_motor,
         run_motor_in_speed_mode,
+        nb_run_motor_in_speed_mode,
         stop_motor_in_speed_mode,
         save_clean_in_speed_mode,
         is_motor_running,
@@ -81,6 +265,8 @@ class MksServo:
         stop_motor_absolute_motion_by_pulses,
         stop_motor_relative_motion_by_axis,
         stop_motor_absolute_motion_by_axis,
+        nb_run_motor_absolute_motion_by_axis,
+        run_motor_result,
     )
     from .can_set import (
         _validate_current,
@@ -109,6 +295,9 @@ class MksServo:
         set_limit_port_remap,
         set_mode0,
         restore_default_parameters,
+        restart_motor,
+        set_position_error_protection,
+        write_io_port,
     )
 
     from .mks_enums import (
@@ -122,6 +311,7 @@ class MksServo:
         EnPinEnable,
         CanBitrate,
         EndStopLevel,
+        HomeMode,
         GoHomeResult,
         Mode0,
         SaveCleanState,
@@ -146,117 +336,186 @@ class MksServo:
     MAX_CALIBRATION_TIME = 30
     MAX_HOMING_TIME = 20
 
-    _calibration_status = CalibrationResult.Unknown
-    _homing_status = GoHomeResult.Unknown
-    _motor_run_status = RunMotorResult.RunComplete
+    # No instance dict, large fleets create thousands of handles
+    __slots__ = (
+        "can_id",
+        "bus",
+        "notifier",
+        "timeout",
+        "_pending_responses",
+        "_late_responses",
+        "_late_lock",
+        "_calibration_status",
+        "_homing_status",
+        "_motor_run_status",
+        "_calibration_future",
+        "_homing_future",
+        "trace",
+        "retry",
+        "__weakref__",
+    )
 
-    def __init__(self, bus, notifier, id):
+    def __init__(self, bus, notifier, id, trace=None, retry=None):
         """Inits MksServo with the CAN bus and servo ID.
 
         Args:
             bus (can.interface.Bus): The CAN bus instance to be used.
             can_id (int): The CAN ID for this servo.
+            trace (trace.TraceBuffer, optional): Records the frames and the failed requests, trace.DEFAULT_TRACE by default.
+            retry (retry.RetryEngine, optional): Timeouts and resending of the requests, retry.DEFAULT_RETRY by default.
         """
 
-        def monitor_incomming_messages(message):
-            try:
-                if message.arbitration_id == self.can_id:
-                    self.check_msg_crc(message)
-                    op_code = MksCommands(message.data[0])
-                    if op_code == MksCommands.MOTOR_CALIBRATION_COMMAND and len(message.data) == self.GENERIC_RESPONSE_LENGTH:
-                        status_int = int.from_bytes(message.data[1:2], byteorder="big")
-                        try:
-                            self._calibration_status = self.CalibrationResult(status_int)
-                        except ValueError:
-                            logging.warning(f"No enum member with value {status_int}")
-                    elif (
-                        op_code
-                        in [
-                            MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_PULSES_COMMAND,
-                            MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_PULSES_COMMAND,
-                            MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_AXIS_COMMAND,
-                            MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_AXIS_COMMAND,
-                            MksCommands.RUN_MOTOR_SPEED_MODE_COMMAND,
-                        ]
-                        and len(message.data) == self.GENERIC_RESPONSE_LENGTH
-                    ):
-                        status_int = int.from_bytes(message.data[1:2], byteorder="big")
-                        try:
-                            self._motor_run_status = self.RunMotorResult(status_int)
-                        except ValueError:
-                            logging.warning(f"No enum member with value {status_int}")
-                    elif op_code == MksCommands.GO_HOME_COMMAND and len(message.data) == self.GENERIC_RESPONSE_LENGTH:
-                        status_int = int.from_bytes(message.data[1:2], byteorder="big")
-                        try:
-                            self._homing_status = self.GoHomeResult(status_int)
-                            print("self._homing_status", self._homing_status)
-                        except ValueError:
-                            logging.warning(f"No enum member with value {status_int}")
-                    elif op_code == MksCommands.QUERY_MOTOR_STATUS_COMMAND:
-                        # a = 1
-                        pass
-                    elif op_code in [
-                        MksCommands.READ_ENCODED_VALUE_ADDITION,
-                        MksCommands.READ_ENCODER_VALUE_CARRY,
-                        MksCommands.READ_RAW_ENCODED_VALUE_ADDITION,
-                        MksCommands.READ_NUM_PULSES_RECEIVED,
-                        MksCommands.READ_IO_PORT_STATUS,
-                        MksCommands.READ_MOTOR_SHAFT_ANGLE_ERROR,
-                        MksCommands.READ_EN_PINS_STATUS,
-                        MksCommands.READ_GO_BACK_TO_ZERO_STATUS_WHEN_POWER_ON,
-                        MksCommands.RELEASE_MOTOR_SHAFT_LOCKED_PROTECTION_STATE,
-                        MksCommands.READ_MOTOR_SHAFT_PROTECTION_STATE,
-                    ]:
-                        # a = 1
-                        pass
-                    elif op_code == MksCommands.READ_MOTOR_SPEED:
-                        # speed = int.from_bytes(message.data[1:3], byteorder="big", signed=True)
-                        # print("???", op_code, speed, "!!!")
-                        pass
-                    elif (
-                        op_code
-                        in [  # All set_generic_status() commands
-                            MksCommands.ENABLE_MOTOR_COMMAND,
-                            MksCommands.EMERGENCY_STOP_COMMAND,
-                            MksCommands.SAVE_CLEAN_IN_SPEED_MODE_COMMAND,
-                            MksCommands.SET_WORK_MODE_COMMAND,
-                            MksCommands.SET_WORKING_CURRENT_COMMAND,
-                            MksCommands.SET_HOLDING_CURRENT_COMMAND,
-                            MksCommands.SET_SUBDIVISIONS_COMMAND,
-                            MksCommands.SET_EN_PIN_CONFIG_COMMAND,
-                            MksCommands.SET_MOTOR_ROTATION_DIRECTION,
-                            MksCommands.SET_AUTO_TURN_OFF_SCREEN_COMMAND,
-                            MksCommands.SET_MOTOR_SHAFT_LOCKED_ROTOR_PROTECTION_COMMAND,
-                            MksCommands.SET_SUBDIVISION_INTERPOLATION_COMMAND,
-                            MksCommands.SET_CAN_BITRATE_COMMAND,
-                            MksCommands.SET_CAN_ID_COMMAND,
-                            MksCommands.SET_SLAVE_RESPOND_ACTIVE_COMMAND,
-                            MksCommands.SET_KEY_LOCK_ENABLE_COMMAND,
-                            MksCommands.SET_GROUP_ID_COMMAND,
-                            MksCommands.SET_HOME_COMMAND,
-                            MksCommands.SET_CURRENT_AXIS_TO_ZERO_COMMAND,
-                            MksCommands.SET_LIMIT_PORT_REMAP_COMMAND,
-                            MksCommands.SET_MODE0_COMMAND,
-                            MksCommands.RESTORE_DEFAULT_PARAMETERS_COMMAND,
-                        ]
-                        and len(message.data) == self.GENERIC_RESPONSE_LENGTH
-                    ):
-                        # status_int = int.from_bytes(message.data[1:2], byteorder="big")
-                        # print("???", op_code, SuccessStatus(status_int), "!!!", flush=True)
-                        pass
-                    else:
-                        print("message.data:", message.data)
-                        print("op_code:", op_code)
-                        print(message, flush=True)
-            except InvalidCRCError:
-                logging.error(f"CRC check failed for the message")
-            return True
-
         self.can_id = id
         self.bus = bus
         self.notifier = notifier
         self.timeout = MksServo.DEFAULT_TIMEOUT
-        self.notifier.add_listener(monitor_incomming_messages)
+        self._pending_responses = {}
+        self._late_responses = {}  # Response code -> [responses to drop, until perf_counter time, dropped]
+        self._late_lock = threading.Lock()
+        self._calibration_status = self.CalibrationResult.Unknown
+        self._homing_status = self.GoHomeResult.Unknown
+        self._motor_run_status = self.RunMotorResult.RunComplete
+        self._calibration_future = None  # Created by the first calibration or homing
+        self._homing_future = None
+        self.trace = _trace.DEFAULT_TRACE if trace is None else trace
+        self.retry = DEFAULT_RETRY if retry is None else retry
+        if hasattr(self.notifier, "add_frame_handler"):  # Raw transport, no can.Message construction
+            self.notifier.add_frame_handler(self.can_id, self.handle_frame)
+        else:
+            self.notifier.add_listener(self.monitor_incomming_messages)
+
+    def monitor_incomming_messages(self, message):
+        """can.Notifier listener, decodes the frames sent by this servo with handle_frame()."""
+        if message.arbitration_id == self.can_id:
+            self.handle_frame(message.arbitration_id, message.data)
+        return True
+
+    def handle_frame(self, can_id, data):
+        """
+        Decodes a frame received from the servo: checks the CRC, updates the operation states with the
+        handler of the op code in _FRAME_HANDLERS and resolves the pending response.
+
+        Args:
+            can_id (int): The arbitration ID of the frame.
+            data (bytes or bytearray): The data of the frame, CRC included.
+        """
+        if not data:
+            return
+        if data[-1] != (can_id + sum(data) - data[-1]) & 0xFF:
+            self.trace.record(_trace.RX, can_id, data, _trace.CRC_ERROR)
+            logging.error("CRC check failed for the message")
+            return
+        if self._drop_late_response(data[0]):
+            self.trace.record(_trace.RX, can_id, data, _trace.LATE)
+            return
+        # The states first, a waiter woken by the response must see them updated
+        if data[0] in self._FRAME_HANDLERS:
+            self.trace.record(_trace.RX, can_id, data)
+            handler = self._FRAME_HANDLERS[data[0]]
+            if handler is not None:
+                handler(self, data)
+        else:
+            self.trace.record(_trace.RX, can_id, data, _trace.UNEXPECTED)
+        self._resolve_pending_response(data)
+
+    def _handle_calibration_frame(self, data):
+        if len(data) != self.GENERIC_RESPONSE_LENGTH:
+            return
+        try:
+            self._calibration_status = self.CalibrationResult(data[1])
+            if self._calibration_future is None:  # Started by another client of the bus
+                self._calibration_future = OperationFuture()
+            if self._calibration_status in [self.CalibrationResult.CalibratedSuccess, self.CalibrationResult.CalibratingFail]:
+                self._calibration_future.complete(self._calibration_status)
+        except ValueError:
+            logging.warning(f"No enum member with value {data[1]}")
+
+    def _handle_run_frame(self, data):
+        if len(data) != self.GENERIC_RESPONSE_LENGTH:
+            return
+        try:
+            self._motor_run_status = self.RunMotorResult(data[1])
+        except ValueError:
+            logging.warning(f"No enum member with value {data[1]}")
+
+    def _handle_homing_frame(self, data):
+        if len(data) != self.GENERIC_RESPONSE_LENGTH:
+            return
+        try:
+            self._homing_status = self.GoHomeResult(data[1])
+            if self._homing_future is None:  # Started by another client of the bus
+                self._homing_future = OperationFuture()
+            if self._homing_status in [self.GoHomeResult.Success, self.GoHomeResult.Fail]:
+                self._homing_future.complete(self._homing_status)
+        except ValueError:
+            logging.warning(f"No enum member with value {data[1]}")
+
+    # Decoding of the received frames by op code, None when the response only resolves the pending request
+    # (read commands, status of the set commands, parameter reads with READ_SYSYTEM_PARAMETER_COMMAND).
+    # Op codes missing from the table are recorded with the UNEXPECTED outcome in the trace.
+    _FRAME_HANDLERS = {
+        MksCommands.MOTOR_CALIBRATION_COMMAND.value: _handle_calibration_frame,
+        MksCommands.GO_HOME_COMMAND.value: _handle_homing_frame,
+        **dict.fromkeys(
+            (
+                op_code.value
+                for op_code in (
+                    MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_PULSES_COMMAND,
+                    MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_PULSES_COMMAND,
+                    MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_AXIS_COMMAND,
+                    MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_AXIS_COMMAND,
+                    MksCommands.RUN_MOTOR_SPEED_MODE_COMMAND,
+                )
+            ),
+            _handle_run_frame,
+        ),
+        **dict.fromkeys(
+            (
+                op_code.value
+                for op_code in (
+                    MksCommands.QUERY_MOTOR_STATUS_COMMAND,
+                    MksCommands.READ_ENCODED_VALUE_ADDITION,
+                    MksCommands.READ_ENCODER_VALUE_CARRY,
+                    MksCommands.READ_RAW_ENCODED_VALUE_ADDITION,
+                    MksCommands.READ_NUM_PULSES_RECEIVED,
+                    MksCommands.READ_IO_PORT_STATUS,
+                    MksCommands.READ_MOTOR_SHAFT_ANGLE_ERROR,
+                    MksCommands.READ_EN_PINS_STATUS,
+                    MksCommands.READ_GO_BACK_TO_ZERO_STATUS_WHEN_POWER_ON,
+                    MksCommands.RELEASE_MOTOR_SHAFT_LOCKED_PROTECTION_STATE,
+                    MksCommands.READ_MOTOR_SHAFT_PROTECTION_STATE,
+                    MksCommands.READ_MOTOR_SPEED,
+                    # All set_generic_status() commands
+                    MksCommands.ENABLE_MOTOR_COMMAND,
+                    MksCommands.EMERGENCY_STOP_COMMAND,
+                    MksCommands.SAVE_CLEAN_IN_SPEED_MODE_COMMAND,
+                    MksCommands.SET_WORK_MODE_COMMAND,
+                    MksCommands.SET_WORKING_CURRENT_COMMAND,
+                    MksCommands.SET_HOLDING_CURRENT_COMMAND,
+                    MksCommands.SET_SUBDIVISIONS_COMMAND,
+                    MksCommands.SET_EN_PIN_CONFIG_COMMAND,
+                    MksCommands.SET_MOTOR_ROTATION_DIRECTION,
+                    MksCommands.SET_AUTO_TURN_OFF_SCREEN_COMMAND,
+                    MksCommands.SET_MOTOR_SHAFT_LOCKED_ROTOR_PROTECTION_COMMAND,
+                    MksCommands.SET_SUBDIVISION_INTERPOLATION_COMMAND,
+                    MksCommands.SET_CAN_BITRATE_COMMAND,
+                    MksCommands.SET_CAN_ID_COMMAND,
+                    MksCommands.SET_SLAVE_RESPOND_ACTIVE_COMMAND,
+                    MksCommands.SET_KEY_LOCK_ENABLE_COMMAND,
+                    MksCommands.SET_GROUP_ID_COMMAND,
+                    MksCommands.SET_HOME_COMMAND,
+                    MksCommands.SET_CURRENT_AXIS_TO_ZERO_COMMAND,
+                    MksCommands.SET_LIMIT_PORT_REMAP_COMMAND,
+                    MksCommands.SET_MODE0_COMMAND,
+                    MksCommands.RESTORE_DEFAULT_PARAMETERS_COMMAND,
+                    MksCommands.RESTART_MOTOR,
+                    MksCommands.SET_POSITION_ERROR_PROTECTION,
+                    MksCommands.WRITE_IO_PORT_COMMAND,
+                )
+            ),
+            None,
+        ),
+    }
 
     def _bool_to_int(self, value):
         """
@@ -290,7 +549,7 @@ class MksServo:
         write_data = bytearray(msg) + bytes([crc])
 
         can_message = can.Message(arbitration_id=self.can_id, data=write_data, is_extended_id=False)
-        logging.debug(f"CAN Message Created: {can_message}")
+        logging.debug("CAN Message Created: %s", can_message)
 
         return can_message
 
@@ -304,7 +563,7 @@ class MksServo:
             bool: True if the last byte of the message data matches the calculated CRC, False otherwise.
         """
 
-        logging.debug(f"Checking CRC for message: {msg}")
+        logging.debug("Checking CRC for message: %s", msg)
 
         # Calculate expected CRC and compare with the last byte of the message data
         crc = (msg.arbitration_id + sum(msg.data[:-1])) & 0xFF
@@ -313,65 +572,170 @@ class MksServo:
 
         return True
 
-    def set_generic(self, op_code: MksCommands, response_length, data=[]):
+    def set_generic(self, op_code: MksCommands, response_length, data=[], full_timeout=False):
         """Sends a generic command via CAN bus and waits for a response.
 
+        The frame and the wait use a pooled _RequestSlot, the steady-state requests allocate (almost) nothing.
+        Each attempt waits for the short timeout of the retry engine, the idempotent commands are sent again
+        when it expires (see retry.RetryEngine). The whole request never takes longer than self.timeout.
+
+        After a request answered on a resend, the responses with its op code are dropped for one smoothed round
+        trip as late answers to the earlier attempts. They are matched by op code only, so a genuine response to
+        a concurrent request with the same op code on this servo (another thread, or send_generic) may be
+        dropped too during that window, and that request then times out or is sent again.
+
         Args:
             op_code (int): Operation code of the command.
             data (list of bytes, optional): Additional data for the command. Defaults to an empty list.
+            full_timeout (bool, optional): Waits self.timeout for the first attempt instead of the short timeout, for
+                the commands that are not sent again and may be slow to answer (calibration, homing).
 
         Returns:
             dict: A dictionary with 'status' key if successful, None otherwise.
         """
+        if isinstance(op_code, Enum):
+            op_code = op_code.value
+        retry = self.retry
+        stats = retry.stats(op_code)
+        attempts = retry.attempts(op_code)
+        late = self._late_responses.get(op_code)
+        dropped = 0 if late is None else late[2]
+        slot = _take_request_slot()
+        try:
+            sent = time.perf_counter()
+            deadline = sent + self.timeout
+            attempt = 1
+            while True:
+                generation = slot.expect()
+                # The response is matched by op_code in handle_frame(), so no listener is added or removed
+                # while the notifier thread is iterating them.
+                pending = self._send_request(slot, slot, op_code, data, generation=generation)
+                remaining = deadline - time.perf_counter()
+                if full_timeout or stats.timeout is None or (attempt > 1 and attempt == attempts):
+                    timeout = remaining  # No round trip sample yet, or last resend waiting for a slow servo
+                else:
+                    timeout = min(remaining, stats.timeout)
+                status = slot.wait(pending, max(0.0, timeout))
+                if status is not None:
+                    break
+                self.trace.record(_trace.TX, self.can_id, slot.sent.data, _trace.TIMEOUT)
+                if attempt == attempts or time.perf_counter() >= deadline:
+                    retry.failed(stats, attempt)
+                    return None
+                attempt += 1
+            retry.answered(stats, attempt, time.perf_counter() - sent if attempt == 1 else None)
+            if attempt > 1:
+                self._expect_late_responses(op_code, attempt - 1, dropped, stats.srtt)
+        finally:
+            _REQUEST_SLOTS.append(slot)
+
+        if len(status) != response_length:
+            self.trace.record(_trace.RX, self.can_id, status, _trace.LENGTH_ERROR)
+            logging.error("Unexpected response length %d instead of %d: %s", len(status), response_length, bytes(status).hex())
+
+        return status
+
+    def send_generic(self, op_code: MksCommands, data=[], response_code=None):
+        """Sends a generic command via CAN bus without waiting for the response.
+
+        Several commands can be in flight at the same time, the responses are matched by op_code
+        in the order the commands were sent.
+
+        Args:
+            op_code (int): Operation code of the command.
+            data (list of bytes, optional): Additional data for the command. Defaults to an empty list.
+            response_code (int, optional): First byte of the expected response, when it is not the op_code
+                (e.g. READ_SYSYTEM_PARAMETER_COMMAND answers with the code of the parameter).
+
+        Returns:
+            concurrent.futures.Future: Resolved with the response data when it arrives. Cancel it if the
+            response is not going to be awaited anymore (e.g. on timeout), it is then removed from the
+            pending responses, so an axis that never answers does not accumulate them.
+        """
+        future = Future()
+        slot = _take_request_slot()
+        try:
+            pending = self._send_request(slot, future, op_code, data, response_code)
+        finally:
+            _REQUEST_SLOTS.append(slot)
+        future.add_done_callback(partial(_remove_cancelled, pending))
+        return future
+
+    def _send_request(self, slot, waiter, op_code, data, response_code=None, generation=None):
+        """Adds the waiter to the pending responses and sends the command in the frame of the slot.
+
+        The waiter is a Future, or a _RequestSlot with the generation returned by its expect().
+
+        Returns:
+            deque: The pending responses of the waiter.
+        """
         if isinstance(op_code, Enum):
             op_code = op_code.value
 
-        # Check if data is an integer and convert it to a list if it is
         if isinstance(data, int):
             data = [data]
         elif isinstance(data, bool):
-            # Assuming _bool_to_int is a method that converts a boolean to an integer
             data = self._bool_to_int(data)
 
-        msg = self.create_can_msg([op_code] + data)
-        # Flag to indicate whether the response has been received
-        status = None
-
-        def receive_message(message):
-            nonlocal status
-            if not status:
-                try:
-                    self.check_msg_crc(message)
-                    if message.arbitration_id == self.can_id:
-                        if message.data[0] != op_code:
-                            logging.error(f"Unexpected opcode.")
-                            logging.error(f"op_code:0x{op_code:X}")
-                            logging.error(f"message.data[0]:0x{int(message.data[0]):X}")
-                            logging.error(f"message.data:{message.data}")
-                            logging.error(message)
-                        if len(message.data) != response_length:
-                            logging.error(f"Unexpected response length.")
-                            logging.error(f"len(message.data):{len(message.data)}")
-                            logging.error(f"response_length:{response_length}")
-                            logging.error(f"message.data:{message.data}")
-                            logging.error(message)
-                        status = message.data
-                except InvalidCRCError as e:
-                    logging.error(f"CRC check failed for the message: {e}")
-
+        if isinstance(response_code, Enum):
+            response_code = response_code.value
+        if response_code is None:
+            response_code = op_code
+
+        message = slot.message(self.can_id, op_code, data)
+        pending = self._pending_responses.get(response_code)
+        if pending is None:
+            pending = self._pending_responses.setdefault(response_code, deque())
+        entry = (waiter, generation)
+        pending.append(entry)
         try:
-            self.notifier.add_listener(receive_message)
-            self.bus.send(msg)
+            self.bus.send(message)
         except can.CanError as e:
+            self.trace.record(_trace.TX, self.can_id, message.data, _trace.SEND_ERROR)
+            waiter.cancel()
+            try:
+                pending.remove(entry)
+            except ValueError:
+                pass
             raise CanMessageError(f"Error sending message: {e}")
+        self.trace.record(_trace.TX, self.can_id, message.data)
+        return pending
+
+    def _expect_late_responses(self, code, count, dropped, window):
+        # A request answered after resends may have been answered by a slow response to an earlier attempt,
+        # the responses to the other attempts then follow it and must not resolve the next requests with the
+        # same code. They are dropped for one round trip, before the response to a request sent now can
+        # arrive. When the attempts were lost instead, a response dropped meanwhile belonged to the next
+        # request, which is sent again: the drops seen while a request waited are counted as its own
+        # attempts, so they do not chain.
+        with self._late_lock:
+            late = self._late_responses.setdefault(code, [0, 0.0, 0])
+            count -= late[2] - dropped
+            if count > 0:
+                late[0] += count
+                late[1] = time.perf_counter() + window
+
+    def _drop_late_response(self, code):
+        late = self._late_responses.get(code)
+        if late is None or not late[0]:
+            return False
+        with self._late_lock:
+            if not late[0]:
+                return False
+            if time.perf_counter() >= late[1]:
+                late[0] = 0
+                return False
+            late[0] -= 1
+            late[2] += 1
+            return True
 
-        # Wait for response (with a timeout)
-        start_time = time.perf_counter()
-        while (time.perf_counter() - start_time < self.timeout) and status is None:
-            time.sleep(0.1)  # Small sleep to prevent busy waiting
-        self.notifier.remove_listener(receive_message)
-
-        return status
+    def _resolve_pending_response(self, data):
+        pending = self._pending_responses.get(data[0])
+        while pending:
+            waiter, generation = pending.popleft()
+            if waiter.claim(generation) if generation is not None else waiter.set_running_or_notify_cancel():
+                waiter.set_result(data)
+                break
 
     def set_generic_status(self, op_code: MksCommands, data=[]) -> SuccessStatus | None:
         """Sends a generic status command and processes the response.
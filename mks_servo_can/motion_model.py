@@ -0,0 +1,240 @@
+"""Move-duration prediction for the ``run_motor_*`` position commands.
+
+The firmware ramps the speed by 1 RPM every ``(256 - acc) * 50`` microseconds (``acc = 0`` means no
+ramp at all) and the speed value is calibrated for 16/32/64 subdivisions. ``MoveTimeModel`` turns
+those rules into a trapezoidal/triangular kinematic profile and adds three calibration coefficients
+(constant overhead, cruise gain and ramp gain) that can be fitted by least squares from recorded moves.
+
+All the ``predict`` inputs broadcast like NumPy arrays, so a whole batch of moves is predicted at once.
+
+Requires NumPy (``pip install mks-servo-can[numpy]``).
+"""
+
+import time
+
+import numpy as np
+
+from .mks_enums import RunMotorResult
+
+ENCODER_COUNTS_PER_REV = 0x4000  # Axis units (encoder value in addition mode) per revolution
+FULL_STEPS_PER_REV = 200  # 1.8 degrees motor
+RAMP_TICK = 50e-6  # seconds per (256 - acc) when changing the speed by 1 RPM
+CALIBRATED_SUBDIVISIONS = (16, 32, 64)
+
+
+class move_time_model_error(Exception):
+    """Exception raised for invalid move time model input."""
+
+    pass
+
+
+def speed_scale(subdivisions):
+    """
+    Returns the factor between the commanded speed and the real speed (RPM) for the given subdivisions.
+
+    Args:
+        subdivisions (int or array_like): The subdivisions configured with set_subdivisions.
+
+    Returns:
+        numpy.ndarray: 1 for 16/32/64 subdivisions, 16 / subdivisions otherwise.
+
+    Example:
+        speed=1200 runs at 2400 RPM with 8 subdivisions and at 150 RPM with 128 subdivisions.
+    """
+    mstep = np.asarray(subdivisions, dtype=np.float64)
+    if np.any(mstep <= 0):
+        raise move_time_model_error("Subdivisions must be greater than 0")
+    return np.where(np.isin(mstep, CALIBRATED_SUBDIVISIONS), 1.0, 16.0 / mstep)
+
+
+def acceleration_rate(acceleration):
+    """
+    Returns the ramp rate (RPM per second) of an acceleration code.
+
+    Args:
+        acceleration (int or array_like): The acceleration in the range of 0 to 255.
+
+    Returns:
+        numpy.ndarray: The ramp rate in RPM/s, ``inf`` for acc = 0 (no ramp).
+    """
+    acc = np.asarray(acceleration, dtype=np.float64)
+    if np.any((acc < 0) | (acc > 255)):
+        raise move_time_model_error("Acceleration must be between 0 and 255")
+    with np.errstate(divide="ignore"):
+        return np.where(acc == 0, np.inf, 1.0 / ((256.0 - acc) * RAMP_TICK))
+
+
+def distance_to_revolutions(distance, subdivisions=16, unit="axis"):
+    """
+    Converts a move distance into motor revolutions.
+
+    Args:
+        distance (int or array_like): The distance, sign is ignored.
+        subdivisions (int or array_like): The subdivisions, only used for pulses.
+        unit (str): "axis" for encoder units (0x4000 per revolution) or "pulses" (200 * subdivisions per revolution).
+
+    Returns:
+        numpy.ndarray: The number of revolutions.
+    """
+    distance = np.abs(np.asarray(distance, dtype=np.float64))
+    if unit == "axis":
+        return distance / ENCODER_COUNTS_PER_REV
+    if unit == "pulses":
+        return distance / (FULL_STEPS_PER_REV * np.asarray(subdivisions, dtype=np.float64))
+    raise move_time_model_error(f"Unknown unit {unit}, must be 'axis' or 'pulses'")
+
+
+def profile_terms(speed, acceleration, distance, subdivisions=16, unit="axis"):
+    """
+    Computes the nominal cruise and ramp times of a move following the firmware rules.
+
+    Args:
+        speed (int or array_like): The speed in the range of 1 to 3000.
+        acceleration (int or array_like): The acceleration in the range of 0 to 255.
+        distance (int or array_like): The distance of the move in ``unit``.
+        subdivisions (int or array_like): The subdivisions.
+        unit (str): "axis" or "pulses".
+
+    Returns:
+        tuple: (cruise, ramp) arrays in seconds. The nominal duration is cruise + ramp.
+    """
+    speed = np.asarray(speed, dtype=np.float64)
+    if np.any((speed <= 0) | (speed > 3000)):
+        raise move_time_model_error("Speed must be between 1 and 3000")
+
+    revs = distance_to_revolutions(distance, subdivisions, unit)
+    v = speed * speed_scale(subdivisions) / 60.0  # rev/s
+    a = acceleration_rate(acceleration) * speed_scale(subdivisions) / 60.0  # rev/s^2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ramp_revs = np.where(np.isinf(a), 0.0, v * v / a)  # accelerate + decelerate
+        trapezoid = revs >= ramp_revs
+        cruise = np.where(trapezoid, (revs - ramp_revs) / v, 0.0)
+        ramp = np.where(np.isinf(a), 0.0, np.where(trapezoid, 2.0 * v / a, 2.0 * np.sqrt(revs / a)))
+    return cruise, ramp
+
+
+class MoveTimeModel:
+    """Predicts how long a position move takes.
+
+    duration = overhead + cruise_gain * cruise + ramp_gain * ramp
+
+    where cruise and ramp are the nominal times computed by profile_terms. The default coefficients
+    are the firmware nominal values; call fit with recorded moves to calibrate a given drive.
+
+    Attributes:
+        overhead (float): Constant time in seconds (command latency, settling, completion frame).
+        cruise_gain (float): Scale applied to the constant speed part of the move.
+        ramp_gain (float): Scale applied to the acceleration and deceleration part of the move.
+        rms_error (float): Root mean square error of the last fit in seconds, None if not fitted.
+    """
+
+    def __init__(self, overhead=0.0, cruise_gain=1.0, ramp_gain=1.0):
+        self.overhead = overhead
+        self.cruise_gain = cruise_gain
+        self.ramp_gain = ramp_gain
+        self.rms_error = None
+
+    def __repr__(self):
+        return f"MoveTimeModel(overhead={self.overhead!r}, cruise_gain={self.cruise_gain!r}, ramp_gain={self.ramp_gain!r})"
+
+    def predict(self, speed, acceleration, distance, subdivisions=16, unit="axis"):
+        """
+        Predicts the duration of one or many moves.
+
+        Args:
+            speed (int or array_like): The speed in the range of 1 to 3000.
+            acceleration (int or array_like): The acceleration in the range of 0 to 255.
+            distance (int or array_like): The distance of the move in ``unit``, 0 for no move.
+            subdivisions (int or array_like): The subdivisions.
+            unit (str): "axis" for run_motor_*_by_axis or "pulses" for run_motor_*_by_pulses.
+
+        Returns:
+            float or numpy.ndarray: The duration in seconds, same shape as the broadcast inputs.
+        """
+        cruise, ramp = profile_terms(speed, acceleration, distance, subdivisions, unit)
+        duration = self.overhead + self.cruise_gain * cruise + self.ramp_gain * ramp
+        duration = np.where(np.asarray(distance) == 0, 0.0, duration)
+        return duration[()] if duration.ndim == 0 else duration
+
+    def fit(self, speed, acceleration, distance, duration, subdivisions=16, unit="axis"):
+        """
+        Fits the model coefficients from recorded moves with least squares.
+
+        Args:
+            speed (array_like): The commanded speeds.
+            acceleration (array_like): The commanded accelerations.
+            distance (array_like): The distances of the moves in ``unit``.
+            duration (array_like): The measured durations in seconds.
+            subdivisions (int or array_like): The subdivisions.
+            unit (str): "axis" or "pulses".
+
+        Returns:
+            MoveTimeModel: self, to allow chaining.
+        """
+        cruise, ramp = profile_terms(speed, acceleration, distance, subdivisions, unit)
+        cruise, ramp, duration = np.broadcast_arrays(cruise, ramp, np.asarray(duration, dtype=np.float64))
+        if duration.size < 3:
+            raise move_time_model_error("At least 3 recorded moves are needed to fit the model")
+
+        features = np.column_stack([np.ones(duration.size), cruise.ravel(), ramp.ravel()])
+        if not np.any(ramp):
+            # No ramp information (acc = 0 only), keep the nominal ramp gain
+            features = features[:, :2]
+        coefs, _, _, _ = np.linalg.lstsq(features, duration.ravel(), rcond=None)
+
+        self.overhead = float(coefs[0])
+        self.cruise_gain = float(coefs[1])
+        if len(coefs) > 2:
+            self.ramp_gain = float(coefs[2])
+        self.rms_error = float(np.sqrt(np.mean((features @ coefs - duration.ravel()) ** 2)))
+        return self
+
+
+def record_move(servo, speed, acceleration, absolute_axis, timeout=60, poll=0.002):
+    """
+    Runs an absolute move by axis and measures its duration, to be used with MoveTimeModel.fit.
+
+    The duration is measured from the command until the completion frame (RunComplete) reported by
+    the servo, so the slave respond and active options must be enabled.
+
+    Args:
+        servo (MksServo): The servo.
+        speed (int): The speed in the range of 1 to 3000.
+        acceleration (int): The acceleration in the range of 0 to 255.
+        absolute_axis (int): The target axis.
+        timeout (float): Maximum number of seconds to wait for the completion frame.
+        poll (float): Poll period of the completion status in seconds.
+
+    Returns:
+        tuple: (distance, duration) of the move, duration is None if the move did not complete.
+    """
+    distance = abs(absolute_axis - servo.read_encoder_value_addition())
+    start_time = time.perf_counter()
+    if servo.run_motor_absolute_motion_by_axis(speed, acceleration, absolute_axis) != RunMotorResult.RunStarting:
+        return distance, None
+
+    while time.perf_counter() - start_time < timeout:
+        if servo._motor_run_status == RunMotorResult.RunComplete:
+            return distance, time.perf_counter() - start_time
+        time.sleep(poll)
+    return distance, None
+
+
+def wait_for_move(servo, duration, margin=0.01, timeout=15):
+    """
+    Sleeps until the expected end of a move and confirms it with a single status query.
+
+    Args:
+        servo (MksServo): The servo running the move.
+        duration (float): The remaining predicted duration of the move, see MoveTimeModel.predict.
+        margin (float): Extra seconds to wait before the status query.
+        timeout (float): Maximum number of seconds to keep polling if the motor is still running.
+
+    Returns:
+        boolean: The running state of the motor at the end of this method.
+    """
+    time.sleep(max(0.0, float(duration) + margin))
+    if not servo.is_motor_running():
+        return False
+    return servo.wait_for_motor_idle(timeout)
@@ -0,0 +1,331 @@
+"""Local daemon sharing one CAN adapter among several processes.
+
+Most adapters (e.g. slcan on a serial port) can be opened by one process only. CanMuxServer owns the
+can.Bus and serves clients over a Unix domain socket; MuxBus is a python-can bus connected to the
+server, so MksServo works unchanged in every client process:
+
+    # Daemon
+    python -m mks_servo_can.mux --interface slcan --channel /dev/ttyACM0 --bitrate 500000
+
+    # Clients
+    bus = MuxBus("/tmp/mks-servo-can.sock")
+    notifier = can.Notifier(bus, [])
+    servo = MksServo(bus, notifier, 1)
+
+Clients pipeline their requests (the frames are forwarded as they arrive, without waiting for the
+previous responses). The server matches the responses: a frame from a drive goes to the client that
+sent the oldest pending request with the same CAN ID and response code, so two processes reading
+the same servo get their own answer. Frames without a pending request (the statuses pushed at the
+end of a move, a calibration or a homing) are broadcast to every client. A client that does not read
+its frames fast enough is disconnected instead of stalling the bus for the others.
+
+Unix only (AF_UNIX).
+"""
+
+import argparse
+import logging
+import os
+import queue
+import select
+import socket
+import struct
+import threading
+import time
+
+from collections import deque
+
+import can
+
+from .mks_enums import MksCommands
+
+DEFAULT_SOCKET = "/tmp/mks-servo-can.sock"
+
+# arbitration_id, flags, dlc, data
+_FRAME = struct.Struct("<IBB8s")
+_EXTENDED = 0x01
+_REMOTE = 0x02
+_ERROR = 0x04
+
+
+def _pack(message):
+    flags = (_EXTENDED if message.is_extended_id else 0) | (_REMOTE if message.is_remote_frame else 0) | (_ERROR if message.is_error_frame else 0)
+    return _FRAME.pack(message.arbitration_id, flags, message.dlc, bytes(message.data))
+
+
+def _unpack(buffer, offset=0):
+    arbitration_id, flags, dlc, data = _FRAME.unpack_from(buffer, offset)
+    return can.Message(
+        timestamp=time.time(),
+        arbitration_id=arbitration_id,
+        is_extended_id=bool(flags & _EXTENDED),
+        is_remote_frame=bool(flags & _REMOTE),
+        is_error_frame=bool(flags & _ERROR),
+        dlc=dlc,
+        data=data[:dlc],
+    )
+
+
+def response_code(data):
+    """Returns the first byte of the response to a request, the parameter code for READ_SYSYTEM_PARAMETER_COMMAND."""
+    if len(data) > 2 and data[0] == MksCommands.READ_SYSYTEM_PARAMETER_COMMAND.value:
+        return data[1]
+    return data[0] if data else None
+
+
+class _Client:
+    # The frames are written by a thread per client, so a client that does not read its socket blocks
+    # neither the bus notifier nor the other clients
+    QUEUE_SIZE = 4096
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.alive = True
+        self._queue = queue.Queue(self.QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def send(self, payload):
+        """Queues a frame, returns False if the queue is full."""
+        try:
+            self._queue.put_nowait(payload)
+        except queue.Full:
+            return False
+        return True
+
+    def close(self):
+        self.alive = False
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass  # The writer checks alive before writing the next frames
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _write(self):
+        while self.alive:
+            payloads = [self._queue.get()]
+            while not self._queue.empty():
+                payloads.append(self._queue.get_nowait())
+            if None in payloads:
+                return
+            try:
+                self.sock.sendall(b"".join(payloads))
+            except OSError:
+                self.alive = False
+
+
+class CanMuxServer:
+    """Owns a CAN bus and serves it to the MuxBus clients.
+
+    Attributes:
+        forwarded (int): Number of frames sent on the bus for the clients.
+        routed (int): Number of responses delivered to the client that requested them.
+        broadcast (int): Number of frames delivered to every client.
+        slow (int): Number of clients disconnected because they did not read their frames.
+    """
+
+    def __init__(self, bus, path=DEFAULT_SOCKET, response_timeout=1.0):
+        """
+        Args:
+            bus (can.BusABC): The bus to share.
+            path (str): The Unix socket path.
+            response_timeout (float): Seconds after which a request without response stops claiming the responses.
+        """
+        self.bus = bus
+        self.path = path
+        self.response_timeout = response_timeout
+        self.forwarded = 0
+        self.routed = 0
+        self.broadcast = 0
+        self.slow = 0
+        self._clients = []
+        self._pending = {}  # (can_id, response code) -> deque of (client, time)
+        self._lock = threading.Lock()
+        self._running = False
+        self._server = None
+        self._notifier = None
+        self._thread = None
+
+    def start(self):
+        """Starts serving in background threads."""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        self._running = True
+        self._notifier = can.Notifier(self.bus, [self._on_bus_message])
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving and disconnects the clients. The bus is not shut down."""
+        self._running = False
+        self._notifier.stop()
+        self._server.close()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients.clear()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def serve_forever(self):
+        """Starts serving and blocks until interrupted."""
+        self.start()
+        try:
+            while self._running:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _accept(self):
+        while self._running:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            client = _Client(sock)
+            with self._lock:
+                self._clients.append(client)
+            threading.Thread(target=self._serve_client, args=(client,), daemon=True).start()
+
+    def _serve_client(self, client):
+        buffer = bytearray()
+        try:
+            while self._running:
+                chunk = client.sock.recv(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                offset = 0
+                while len(buffer) - offset >= _FRAME.size:
+                    message = _unpack(buffer, offset)
+                    offset += _FRAME.size
+                    self._forward(client, message)
+                del buffer[:offset]
+        except OSError:
+            pass
+        finally:
+            self._disconnect(client)
+
+    def _forward(self, client, message):
+        code = response_code(message.data)
+        if code is not None:
+            entry = (client, time.perf_counter())
+            with self._lock:
+                pending = self._pending.setdefault((message.arbitration_id, code), deque())
+                pending.append(entry)
+        try:
+            self.bus.send(message)
+        except can.CanError as e:
+            logging.error(f"Error sending message from a client: {e}")
+            if code is not None:
+                with self._lock:
+                    if entry in pending:
+                        pending.remove(entry)
+            return
+        with self._lock:  # One thread per client
+            self.forwarded += 1
+
+    def _disconnect(self, client):
+        client.close()
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+            for pending in self._pending.values():
+                for entry in [entry for entry in pending if entry[0] is client]:
+                    pending.remove(entry)
+
+    def _on_bus_message(self, message):
+        payload = _pack(message)
+        target = None
+        with self._lock:
+            pending = self._pending.get((message.arbitration_id, message.data[0] if message.data else None))
+            expired = time.perf_counter() - self.response_timeout
+            while pending:
+                client, sent = pending.popleft()
+                if client.alive and sent >= expired:
+                    target = client
+                    break
+            clients = [target] if target is not None else list(self._clients)
+            if target is not None:
+                self.routed += 1
+            else:
+                self.broadcast += 1
+        for client in clients:
+            if not client.send(payload) and client.alive:
+                logging.warning("Disconnecting a client that does not read its frames")
+                with self._lock:
+                    self.slow += 1
+                self._disconnect(client)
+
+
+class MuxBus(can.BusABC):
+    """A python-can bus connected to a CanMuxServer."""
+
+    def __init__(self, channel=DEFAULT_SOCKET, can_filters=None, **kwargs):
+        """
+        Args:
+            channel (str): The Unix socket path of the server.
+            can_filters (list, optional): python-can receive filters.
+        """
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(channel)
+        self._buffer = bytearray()
+        self._send_lock = threading.Lock()
+        self.channel = channel
+        self.channel_info = f"mux:{channel}"
+        super().__init__(channel=channel, can_filters=can_filters, **kwargs)
+
+    def send(self, msg, timeout=None):
+        with self._send_lock:
+            try:
+                self._sock.sendall(_pack(msg))
+            except OSError as e:
+                raise can.CanOperationError(f"Connection to the mux server lost: {e}")
+
+    def _recv_internal(self, timeout):
+        if len(self._buffer) < _FRAME.size:
+            readable, _, _ = select.select([self._sock], [], [], timeout)
+            if not readable:
+                return None, False
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise can.CanOperationError("Connection to the mux server closed")
+            self._buffer += chunk
+            if len(self._buffer) < _FRAME.size:
+                return None, False
+        message = _unpack(self._buffer)
+        del self._buffer[: _FRAME.size]
+        return message, False
+
+    def shutdown(self):
+        super().shutdown()
+        self._sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shares one CAN adapter among several processes.")
+    parser.add_argument("--interface", default="slcan", help="python-can interface")
+    parser.add_argument("--channel", required=True, help="python-can channel")
+    parser.add_argument("--bitrate", type=int, default=500000)
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    bus = can.Bus(interface=args.interface, channel=args.channel, bitrate=args.bitrate)
+    logging.info(f"Serving {args.interface}:{args.channel} on {args.socket}")
+    try:
+        CanMuxServer(bus, args.socket).serve_forever()
+    finally:
+        bus.shutdown()
+
+
+if __name__ == "__main__":
+    main()
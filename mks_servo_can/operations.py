@@ -0,0 +1,52 @@
+"""Waitable handles for long running operations (calibration, homing).
+
+The handles are concurrent.futures.Future objects completed by the status frame pushed by the servo
+at the end of the operation, so they can be waited from threads (result, wait_all, wait_any) and
+awaited from asyncio (``await handle``, ``asyncio.gather(*handles)``).
+"""
+
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, InvalidStateError, wait
+
+
+class OperationFuture(Future):
+    """A Future completed by a status frame pushed by the servo. It is also awaitable from asyncio."""
+
+    def __await__(self):
+        import asyncio  # Only needed by asyncio users, it is slow to import
+
+        return asyncio.wrap_future(self).__await__()
+
+    def complete(self, result):
+        """Sets the result unless the future is already done or cancelled."""
+        try:
+            self.set_result(result)
+        except InvalidStateError:
+            pass
+
+
+def wait_all(handles, timeout=None):
+    """
+    Waits until all the handles complete.
+
+    Args:
+        handles (iterable of OperationFuture): The handles, e.g. from nb_calibrate_encoder or nb_go_home.
+        timeout (float, optional): Maximum number of seconds to wait, None to wait forever.
+
+    Returns:
+        tuple: (done, not_done) sets of handles.
+    """
+    return wait(handles, timeout, ALL_COMPLETED)
+
+
+def wait_any(handles, timeout=None):
+    """
+    Waits until at least one of the handles completes.
+
+    Args:
+        handles (iterable of OperationFuture): The handles, e.g. from nb_calibrate_encoder or nb_go_home.
+        timeout (float, optional): Maximum number of seconds to wait, None to wait forever.
+
+    Returns:
+        tuple: (done, not_done) sets of handles.
+    """
+    return wait(handles, timeout, FIRST_COMPLETED)
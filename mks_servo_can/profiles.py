@@ -0,0 +1,216 @@
+"""Host-computed jerk-limited (S-curve) and trapezoid motion profiles.
+
+The firmware only offers a constant acceleration ramp (one 0-255 code). Here the profile is computed
+in NumPy, sampled at the streaming rate and executed with SpeedStreamer as speed-mode setpoints. A
+final run_motor_absolute_motion_by_axis corrects the remaining position error, and the result reports
+the error before and after the correction so that the move time can be traded against accuracy.
+
+Sign convention: positive distances and speeds run CCW, like read_motor_speed.
+
+Requires NumPy (``pip install mks-servo-can[numpy]``).
+"""
+
+import time
+
+import numpy as np
+
+from .motion_model import ENCODER_COUNTS_PER_REV, speed_scale
+from .speed_streamer import SpeedStreamer
+
+SHAFT_ANGLE_ERROR_PER_REV = 51200  # read_motor_shaft_angle_error units per 360 degrees
+
+
+class profile_error(Exception):
+    """Exception raised for invalid profile limits."""
+
+    pass
+
+
+def _phase_times(v, a, j):
+    # Jerk time and constant acceleration time to reach the speed v from rest
+    if j is None or a * a <= v * j:
+        tj = 0.0 if j is None else a / j
+        return tj, v / a - tj
+    return np.sqrt(v / j), 0.0
+
+
+class MotionProfile:
+    """A rest to rest profile built from seven constant jerk segments.
+
+    Attributes:
+        distance (float): Length of the move in revolutions (signed).
+        peak_speed (float): Highest speed reached in RPM (unsigned).
+        durations (numpy.ndarray): Duration of the seven segments in seconds.
+        duration (float): Total duration in seconds.
+    """
+
+    def __init__(self, distance, max_speed, max_acceleration, max_jerk=None):
+        """
+        Args:
+            distance (float): Length of the move in revolutions, the sign gives the direction.
+            max_speed (float): Speed limit in RPM.
+            max_acceleration (float): Acceleration limit in RPM/s.
+            max_jerk (float, optional): Jerk limit in RPM/s^2, None for a trapezoid profile.
+        """
+        if max_speed <= 0 or max_acceleration <= 0 or (max_jerk is not None and max_jerk <= 0):
+            raise profile_error("The limits must be greater than 0")
+        self.distance = distance
+        self._sign = 1.0 if distance >= 0 else -1.0
+        d = abs(distance) * 60.0  # rev -> RPM * s
+
+        # Reduce the peak speed until the acceleration and deceleration fit in the distance
+        v = float(max_speed)
+        tj, tc = _phase_times(v, max_acceleration, max_jerk)
+        if v * (2 * tj + tc) > d:
+            low, high = 0.0, v
+            for _ in range(60):
+                v = (low + high) / 2
+                tj, tc = _phase_times(v, max_acceleration, max_jerk)
+                low, high = (v, high) if v * (2 * tj + tc) <= d else (low, v)
+            v = low
+            tj, tc = _phase_times(v, max_acceleration, max_jerk)
+        tv = (d - v * (2 * tj + tc)) / v if v > 0 else 0.0
+        self.peak_speed = v
+
+        self.durations = np.array([tj, tc, tj, tv, tj, tc, tj])
+        self.duration = float(self.durations.sum())
+        if max_jerk is None:
+            peak_acceleration = max_acceleration
+            jerks = np.zeros(7)
+        else:
+            peak_acceleration = max_jerk * tj if tc == 0 else max_acceleration
+            jerks = np.array([1, 0, -1, 0, -1, 0, 1]) * float(max_jerk)
+
+        # State (t, s, v, a) at the start of each segment, in seconds, RPM * s, RPM and RPM/s
+        self._jerks = jerks
+        self._t = np.concatenate([[0.0], np.cumsum(self.durations)])
+        self._a = np.array([0, 1, 1, 0, 0, -1, -1, 0]) * float(peak_acceleration)
+        self._v = np.zeros(8)
+        self._s = np.zeros(8)
+        for i, dt in enumerate(self.durations):
+            a0, v0, j = self._a[i], self._v[i], jerks[i]
+            self._v[i + 1] = v0 + a0 * dt + j * dt * dt / 2
+            self._s[i + 1] = self._s[i] + v0 * dt + a0 * dt * dt / 2 + j * dt**3 / 6
+
+    def position(self, t):
+        """
+        Evaluates the position of the profile.
+
+        Args:
+            t (float or array_like): Times in seconds from the start of the move.
+
+        Returns:
+            numpy.ndarray: Positions in revolutions.
+        """
+        t = np.clip(np.asarray(t, dtype=np.float64), 0.0, self.duration)
+        i = np.clip(np.searchsorted(self._t, t, side="right") - 1, 0, 6)
+        dt = t - self._t[i]
+        s = self._s[i] + self._v[i] * dt + self._a[i] * dt * dt / 2 + self._jerks[i] * dt**3 / 6
+        return self._sign * s / 60.0
+
+    def setpoints(self, rate, subdivisions=16):
+        """
+        Samples the profile as speed-mode setpoints.
+
+        Each setpoint is the mean speed over its period, so the streamed distance matches the profile. The
+        setpoints are rounded with error feedback (the rounding error is carried to the next period).
+
+        Args:
+            rate (float): Setpoints per second.
+            subdivisions (int): The subdivisions of the servo, to convert RPM into speed codes.
+
+        Returns:
+            numpy.ndarray: Signed integer speed codes, the last one is 0.
+        """
+        period = 1.0 / rate
+        edges = np.arange(int(np.ceil(self.duration * rate)) + 1) * period
+        rpm = np.diff(self.position(edges)) * 60.0 / period
+        codes = np.cumsum(rpm / speed_scale(subdivisions))
+        codes = np.diff(np.round(codes), prepend=0.0).astype(np.int64)
+        return np.append(codes, 0)
+
+
+class ProfileResult:
+    """Result of run_profile.
+
+    Attributes:
+        planned_time (float): Duration of the profile in seconds.
+        stream_time (float): Time spent streaming the setpoints in seconds.
+        correction_time (float): Time spent in the final correction move in seconds.
+        error_before_correction (int): Target minus encoder value (axis units) at the end of the stream.
+        error_after_correction (int): Target minus encoder value (axis units) at the end of the move.
+        shaft_angle_error (int): read_motor_shaft_angle_error at the end of the move (51200 = 360 degrees).
+        stream (StreamReport): The statistics of the stream.
+    """
+
+    def __init__(self):
+        self.planned_time = 0.0
+        self.stream_time = 0.0
+        self.correction_time = 0.0
+        self.error_before_correction = None
+        self.error_after_correction = None
+        self.shaft_angle_error = None
+        self.stream = None
+
+    def __repr__(self):
+        return (
+            f"ProfileResult(planned_time={self.planned_time:.3f}, stream_time={self.stream_time:.3f}, correction_time={self.correction_time:.3f}, "
+            f"error_before_correction={self.error_before_correction}, error_after_correction={self.error_after_correction}, shaft_angle_error={self.shaft_angle_error})"
+        )
+
+    @property
+    def shaft_angle_error_degrees(self):
+        """float: The shaft angle error in degrees, None if not read."""
+        return None if self.shaft_angle_error is None else self.shaft_angle_error * 360.0 / SHAFT_ANGLE_ERROR_PER_REV
+
+
+def run_profile(
+    servo,
+    profile,
+    rate=200,
+    subdivisions=16,
+    tracking_acceleration=250,
+    correction_speed=100,
+    correction_acceleration=0,
+    correction_tolerance=0,
+    timeout=15,
+):
+    """
+    Runs a profile on a servo through speed mode and finishes with an absolute correction move.
+
+    Args:
+        servo (MksServo): The servo, in a serial work mode.
+        profile (MotionProfile): The profile.
+        rate (float): Setpoints per second.
+        subdivisions (int): The subdivisions of the servo.
+        tracking_acceleration (int): Acceleration code used in speed mode to follow the setpoints, it should be
+            faster than the profile.
+        correction_speed (int): Speed code of the correction move.
+        correction_acceleration (int): Acceleration code of the correction move.
+        correction_tolerance (int): No correction move if the error (axis units) is within this value.
+        timeout (float): Maximum number of seconds to wait for the motor to stop.
+
+    Returns:
+        ProfileResult: The timings and the errors before and after the correction.
+    """
+    result = ProfileResult()
+    result.planned_time = profile.duration
+    start_axis = servo.read_encoder_value_addition()
+    target = start_axis + int(round(profile.distance * ENCODER_COUNTS_PER_REV))
+
+    start_time = time.perf_counter()
+    streamer = SpeedStreamer([servo], rate=rate, acceleration=tracking_acceleration)
+    result.stream = streamer.run(profile.setpoints(rate, subdivisions)[:, None])
+    servo.wait_for_motor_idle(timeout)
+    result.stream_time = time.perf_counter() - start_time
+
+    result.error_before_correction = target - servo.read_encoder_value_addition()
+    start_time = time.perf_counter()
+    if abs(result.error_before_correction) > correction_tolerance:
+        servo.run_motor_absolute_motion_by_axis(correction_speed, correction_acceleration, target)
+        servo.wait_for_motor_idle(timeout)
+    result.correction_time = time.perf_counter() - start_time
+
+    result.error_after_correction = target - servo.read_encoder_value_addition()
+    result.shaft_angle_error = servo.read_motor_shaft_angle_error()
+    return result
@@ -0,0 +1,305 @@
+"""Automatic recovery of the axes stopped by the locked-rotor or the position error protection.
+
+RecoveryEngine watches the protection state (READ_MOTOR_SHAFT_PROTECTION_STATE) of the axes: every
+response that reports a protected axis, to any request on the bus, starts the recovery of the axis. The
+engine polls the state itself with prebuilt frames every ``poll_period``, or only listens when another
+component already polls it (FollowingErrorWatchdog with protection_every).
+
+A recovery runs a sequence of steps on the axis, in a worker thread, so the axes recover in parallel.
+The steps are stage actions as in fleet (action(servo), the results in FAILURE_RESULTS and the
+exceptions fail the step). When a step fails the sequence is run again from the start with the
+``escalation`` steps, which restart the driver, up to ``max_attempts`` sequences:
+
+    engine = RecoveryEngine(servos, steps=[("release", release), ("enable", enable), ("home", go_home), ("verify", verify)])
+    engine.start()
+    ...
+    print(engine.statistics())  # time to recover by axis
+
+An axis whose recovery failed is left alone until reset().
+"""
+
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .fleet import FAILURE_RESULTS as FLEET_FAILURE_RESULTS, go_home
+from .mks_enums import Enable, LockedRotor, MksCommands, MotorShaftProtectionStatus
+
+FAILURE_RESULTS = FLEET_FAILURE_RESULTS + (LockedRotor.ReleaseFails, MotorShaftProtectionStatus.Protected)
+
+_PROTECTION = MksCommands.READ_MOTOR_SHAFT_PROTECTION_STATE.value
+
+
+def release(servo):
+    """Step action: releases the protection state."""
+    return servo.release_motor_shaft_locked_protection_state()
+
+
+def enable(servo):
+    """Step action: enables the motor."""
+    return servo.enable_motor(Enable.Enable)
+
+
+def restart(servo, timeout=5.0):
+    """Step action: restarts the driver and waits until it answers again, None if it did not within timeout."""
+    result = servo.restart_motor()
+    if result in FAILURE_RESULTS:
+        return result
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        status = servo.query_motor_status()
+        if status is not None:
+            return status
+    return None
+
+
+def verify(servo):
+    """Step action: reads the protection state, fails if the axis is still protected."""
+    return servo.read_motor_shaft_protection_state()
+
+
+DEFAULT_STEPS = (("release", release), ("enable", enable), ("home", go_home), ("verify", verify))
+ESCALATION_STEPS = (("restart", restart), ("release", release), ("enable", enable), ("home", go_home), ("verify", verify))
+
+
+class recovery_error(Exception):
+    """Exception raised for an invalid recovery definition or an unknown axis."""
+
+    pass
+
+
+class RecoveryEvent:
+    """One protection event of an axis and its recovery.
+
+    The times are time.perf_counter() values.
+
+    Attributes:
+        axis: The axis key.
+        state (str): "recovering", "recovered" or "failed".
+        detected (float): Reception of the protected state, or call of recover().
+        recovered (float): End of the last step of the successful sequence, None otherwise.
+        attempts (int): Sequences run.
+        steps (list): (attempt, step name, result, error, duration in seconds) of every step run.
+    """
+
+    def __init__(self, axis, detected):
+        self.axis = axis
+        self.state = "recovering"
+        self.detected = detected
+        self.recovered = None
+        self.attempts = 0
+        self.steps = []
+
+    def __repr__(self):
+        return f"RecoveryEvent(axis={self.axis!r}, state={self.state!r}, attempts={self.attempts}, time_to_recover={self.time_to_recover})"
+
+    @property
+    def time_to_recover(self):
+        """float: Seconds from the detection to the end of the recovery, None unless recovered."""
+        return None if self.recovered is None else self.recovered - self.detected
+
+
+class _Bus:
+    def __init__(self, bus, notifier):
+        self.bus = bus
+        self.notifier = notifier
+        self.axes = {}  # Axis key by CAN ID
+        self.reads = {}  # Protection state read frame by CAN ID
+        self.listener = None
+
+
+class RecoveryEngine:
+    """Detects the protection events and runs the recovery sequences of the axes in parallel.
+
+    Attributes:
+        events (list of RecoveryEvent): All the events, in detection order.
+    """
+
+    def __init__(self, servos, steps=DEFAULT_STEPS, escalation=ESCALATION_STEPS, max_attempts=2, poll_period=0.1, max_workers=None):
+        """
+        Args:
+            servos (dict or list): MksServo by axis key, a list is keyed by can_id.
+            steps (list): (name, action) of the first sequence.
+            escalation (list): (name, action) of the following sequences, the first steps again if None.
+            max_attempts (int): Sequences run before the recovery fails.
+            poll_period (float): Seconds between the protection state reads, None to only listen.
+            max_workers (int, optional): Maximum number of concurrent recoveries, defaults to one per axis.
+        """
+        self.servos = servos if isinstance(servos, dict) else {servo.can_id: servo for servo in servos}
+        if not self.servos:
+            raise recovery_error("No axes to recover")
+        if max_attempts < 1:
+            raise recovery_error("max_attempts must be at least 1")
+        self.steps = list(steps)
+        self.escalation = self.steps if escalation is None else list(escalation)
+        self.max_attempts = max_attempts
+        self.poll_period = poll_period
+        self.events = []
+        self._active = {}  # RecoveryEvent by axis key
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.servos), thread_name_prefix="RecoveryEngine")
+        self._running = False
+        self._thread = None
+
+        import can
+
+        self._buses = {}
+        for key, servo in self.servos.items():
+            entry = self._buses.get(id(servo.bus))
+            if entry is None:
+                entry = self._buses[id(servo.bus)] = _Bus(servo.bus, servo.notifier)
+            if servo.can_id in entry.axes:
+                raise recovery_error(f"Axis {servo.can_id} is given twice")
+            entry.axes[servo.can_id] = key
+            entry.reads[servo.can_id] = can.Message(arbitration_id=servo.can_id, data=[_PROTECTION, _PROTECTION, (servo.can_id + 2 * _PROTECTION) & 0xFF], is_extended_id=False)
+
+    def start(self):
+        """Starts listening to the protection states, and polling them if poll_period is set."""
+        if self._running:
+            return
+        self._running = True
+        for entry in self._buses.values():
+            entry.listener = lambda message, entry=entry: self._on_message(entry, message)
+            entry.notifier.add_listener(entry.listener)
+        if self.poll_period is not None:
+            self._thread = threading.Thread(target=self._poll, name="RecoveryEngine", daemon=True)
+            self._thread.start()
+
+    def stop(self, wait=True):
+        """Stops the detection, the running recoveries complete unless wait is False."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for entry in self._buses.values():
+            if entry.listener is not None:
+                entry.notifier.remove_listener(entry.listener)
+                entry.listener = None
+        self._executor.shutdown(wait=wait)
+
+    def recover(self, axis):
+        """
+        Starts the recovery of an axis, unless it is already recovering.
+
+        Args:
+            axis: The axis key.
+
+        Returns:
+            RecoveryEvent: The new or the running event.
+        """
+        if axis not in self.servos:
+            raise recovery_error(f"Unknown axis {axis}")
+        return self._detected(axis, time.perf_counter(), force=True)
+
+    def reset(self, axis=None):
+        """Lets the engine recover again an axis whose recovery failed, all of them by default."""
+        with self._lock:
+            if axis is None:
+                self._failed.clear()
+            else:
+                self._failed.discard(axis)
+
+    def wait_idle(self, timeout=None):
+        """Waits until no axis is recovering, returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._active, timeout)
+
+    @property
+    def failed(self):
+        """set: The keys of the axes left alone after a failed recovery."""
+        with self._lock:
+            return set(self._failed)
+
+    def statistics(self):
+        """
+        Summarizes the events by axis.
+
+        Returns:
+            dict: By axis key, a dict with the "events", "recovered" and "failed" counts, and the "mean" and
+            "max" time to recover in seconds (None without recovered event).
+        """
+        summary = {}
+        times = {}
+        for event in list(self.events):
+            axis = summary.setdefault(event.axis, {"events": 0, "recovered": 0, "failed": 0, "mean": None, "max": None})
+            axis["events"] += 1
+            if event.state != "recovering":
+                axis[event.state] += 1
+            if event.time_to_recover is not None:
+                times.setdefault(event.axis, []).append(event.time_to_recover)
+        for key, axis_times in times.items():
+            summary[key]["mean"] = sum(axis_times) / len(axis_times)
+            summary[key]["max"] = max(axis_times)
+        return summary
+
+    def _poll(self):
+        next_poll = time.perf_counter()
+        while self._running:
+            for entry in self._buses.values():
+                for can_id, message in entry.reads.items():
+                    if entry.axes[can_id] in self._active:
+                        continue  # The steps of the recovery use the bus
+                    try:
+                        entry.bus.send(message)
+                    except Exception as e:
+                        logging.error(f"Protection state read of {can_id} failed: {e}")
+            next_poll += self.poll_period
+            delay = next_poll - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_poll = time.perf_counter()
+
+    def _on_message(self, entry, message):
+        data = message.data
+        if len(data) != 3 or data[0] != _PROTECTION or data[1] != MotorShaftProtectionStatus.Protected.value or message.is_extended_id:
+            return
+        axis = entry.axes.get(message.arbitration_id)
+        if axis is not None and data[2] == (message.arbitration_id + data[0] + data[1]) & 0xFF:
+            self._detected(axis, time.perf_counter())
+
+    def _detected(self, axis, now, force=False):
+        with self._lock:
+            event = self._active.get(axis)
+            if event is not None or (axis in self._failed and not force) or not (self._running or force):
+                return event
+            self._failed.discard(axis)
+            event = self._active[axis] = RecoveryEvent(axis, now)
+            self.events.append(event)
+        logging.warning(f"Axis {axis} protected, recovering")
+        self._executor.submit(self._recover, event)
+        return event
+
+    def _recover(self, event):
+        servo = self.servos[event.axis]
+        while event.attempts < self.max_attempts:
+            event.attempts += 1
+            if self._run_steps(servo, event, self.steps if event.attempts == 1 else self.escalation):
+                event.recovered = time.perf_counter()
+                event.state = "recovered"
+                break
+        else:
+            event.state = "failed"
+            logging.error(f"Recovery of axis {event.axis} failed after {event.attempts} attempts")
+        with self._idle:
+            del self._active[event.axis]
+            if event.state == "failed":
+                self._failed.add(event.axis)
+            self._idle.notify_all()
+
+    def _run_steps(self, servo, event, steps):
+        for name, action in steps:
+            start = time.perf_counter()
+            result, error = None, None
+            try:
+                result = action(servo)
+            except Exception as e:
+                error = e
+            event.steps.append((event.attempts, name, result, error, time.perf_counter() - start))
+            if error is not None or result in FAILURE_RESULTS:
+                return False
+        return True
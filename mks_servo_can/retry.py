@@ -0,0 +1,193 @@
+"""Resending of the requests whose response is lost, for the commands that are safe to repeat.
+
+MksServo.set_generic() waits for each response with a short timeout estimated from the measured
+round trip times of the op code (srtt + 4 * rttvar, as TCP does), instead of the full servo timeout:
+
+- idempotent commands (reads, absolute moves, speed mode, enable, stop, configuration writes) are
+  sent again when the short timeout expires, up to max_retries times. The last attempt waits until
+  the servo timeout, so a slow but alive servo still answers.
+- the other commands (relative moves, calibration, homing, CAN ID and bitrate changes, restore
+  defaults, restart) are never sent twice: executing them again would move the axis or change the
+  servo twice. They fail (None) when the short timeout expires, except the calibration and the homing
+  which wait for the servo timeout (set_generic(full_timeout=True)).
+
+Until an op code has round trip samples its timeout is the servo timeout. The statistics of each op
+code (requests, retries, lost responses, failures, round trip time) are kept to tell a noisy bus from
+a dead servo:
+
+    retry = RetryEngine(max_retries=2)
+    servo = MksServo(bus, notifier, 1, retry=retry)
+    ...
+    print(retry.statistics())
+
+By default all the servos share DEFAULT_RETRY, BusManager gives each bus its own engine.
+"""
+
+import threading
+
+from .mks_enums import MksCommands
+
+# The response of a resent command is the same as the response of the first one
+IDEMPOTENT_COMMANDS = frozenset(
+    command.value
+    for command in (
+        MksCommands.READ_ENCODER_VALUE_CARRY,
+        MksCommands.READ_ENCODED_VALUE_ADDITION,
+        MksCommands.READ_MOTOR_SPEED,
+        MksCommands.READ_NUM_PULSES_RECEIVED,
+        MksCommands.READ_IO_PORT_STATUS,
+        MksCommands.READ_RAW_ENCODED_VALUE_ADDITION,
+        MksCommands.READ_MOTOR_SHAFT_ANGLE_ERROR,
+        MksCommands.READ_EN_PINS_STATUS,
+        MksCommands.READ_GO_BACK_TO_ZERO_STATUS_WHEN_POWER_ON,
+        MksCommands.RELEASE_MOTOR_SHAFT_LOCKED_PROTECTION_STATE,
+        MksCommands.READ_MOTOR_SHAFT_PROTECTION_STATE,
+        MksCommands.READ_SYSYTEM_PARAMETER_COMMAND,
+        MksCommands.QUERY_MOTOR_STATUS_COMMAND,
+        MksCommands.SET_WORK_MODE_COMMAND,
+        MksCommands.SET_WORKING_CURRENT_COMMAND,
+        MksCommands.SET_HOLDING_CURRENT_COMMAND,
+        MksCommands.SET_SUBDIVISIONS_COMMAND,
+        MksCommands.SET_EN_PIN_CONFIG_COMMAND,
+        MksCommands.SET_MOTOR_ROTATION_DIRECTION,
+        MksCommands.SET_AUTO_TURN_OFF_SCREEN_COMMAND,
+        MksCommands.SET_MOTOR_SHAFT_LOCKED_ROTOR_PROTECTION_COMMAND,
+        MksCommands.SET_SUBDIVISION_INTERPOLATION_COMMAND,
+        MksCommands.SET_SLAVE_RESPOND_ACTIVE_COMMAND,
+        MksCommands.SET_KEY_LOCK_ENABLE_COMMAND,
+        MksCommands.SET_GROUP_ID_COMMAND,
+        MksCommands.WRITE_IO_PORT_COMMAND,
+        MksCommands.SET_HOME_COMMAND,
+        MksCommands.SET_CURRENT_AXIS_TO_ZERO_COMMAND,
+        MksCommands.SET_NO_LIMIT_GO_HOME_COMMAND,
+        MksCommands.SET_LIMIT_PORT_REMAP_COMMAND,
+        MksCommands.SET_MODE0_COMMAND,
+        MksCommands.SET_POSITION_ERROR_PROTECTION,
+        MksCommands.ENABLE_MOTOR_COMMAND,
+        MksCommands.EMERGENCY_STOP_COMMAND,
+        MksCommands.RUN_MOTOR_SPEED_MODE_COMMAND,
+        MksCommands.SAVE_CLEAN_IN_SPEED_MODE_COMMAND,
+        MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_PULSES_COMMAND,
+        MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_AXIS_COMMAND,
+    )
+)
+
+
+class OpCodeStats:
+    """Retry statistics and round trip time estimate of an op code.
+
+    Attributes:
+        requests (int): Requests sent.
+        retries (int): Requests sent again after a lost response.
+        losses (int): Attempts without a response in their timeout.
+        failures (int): Requests without any response, set_generic() returned None.
+        srtt (float): Smoothed round trip time in seconds, None before the first sample.
+        rttvar (float): Round trip time variation in seconds.
+        timeout (float): Short timeout of an attempt in seconds, None before the first sample.
+    """
+
+    __slots__ = ("requests", "retries", "losses", "failures", "srtt", "rttvar", "timeout")
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.losses = 0
+        self.failures = 0
+        self.srtt = None
+        self.rttvar = 0.0
+        self.timeout = None
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RetryEngine:
+    """Decides the timeout and the retries of the requests, and keeps the statistics by op code.
+
+    The statistics are updated without lock, on the request path: concurrent requests of the same op code
+    from several threads may rarely miss a count.
+
+    Attributes:
+        max_retries (int): Times an idempotent request is sent again.
+        min_timeout (float): Lower bound of the short timeout in seconds.
+    """
+
+    def __init__(self, max_retries=2, min_timeout=0.05, idempotent_commands=IDEMPOTENT_COMMANDS):
+        """
+        Args:
+            max_retries (int): Times an idempotent request is sent again, 0 disables the retries.
+            min_timeout (float): Lower bound of the short timeout in seconds, against the scheduling jitter.
+            idempotent_commands (frozenset of int): Op codes that are safe to send again.
+        """
+        self.max_retries = max_retries
+        self.min_timeout = min_timeout
+        self.idempotent_commands = idempotent_commands
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def stats(self, op_code):
+        """Returns the OpCodeStats of an op code (int), passed to the other methods."""
+        stats = self._stats.get(op_code)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(op_code, OpCodeStats())
+        return stats
+
+    def attempts(self, op_code):
+        """Returns the number of times a request can be sent."""
+        return 1 + self.max_retries if op_code in self.idempotent_commands else 1
+
+    def answered(self, stats, attempts, rtt=None):
+        """
+        Counts a request that got a response.
+
+        Args:
+            stats (OpCodeStats): The statistics of the command.
+            attempts (int): Times it was sent.
+            rtt (float, optional): Round trip time in seconds, only for requests answered at the first attempt:
+                the response of a resent request may answer an earlier attempt (Karn's algorithm).
+        """
+        stats.requests += 1
+        if attempts > 1:
+            stats.retries += attempts - 1
+            stats.losses += attempts - 1
+        if rtt is not None:
+            srtt = stats.srtt
+            if srtt is None:
+                srtt = rtt
+                rttvar = rtt / 2
+            else:
+                rttvar = 0.75 * stats.rttvar + 0.25 * abs(srtt - rtt)
+                srtt = 0.875 * srtt + 0.125 * rtt
+            stats.srtt = srtt
+            stats.rttvar = rttvar
+            timeout = srtt + 4 * rttvar
+            stats.timeout = timeout if timeout > self.min_timeout else self.min_timeout
+
+    def failed(self, stats, attempts):
+        """Counts a request without response after the given number of attempts."""
+        stats.requests += 1
+        stats.retries += attempts - 1
+        stats.losses += attempts
+        stats.failures += 1
+
+    def statistics(self):
+        """Returns the statistics as {command name or op code: OpCodeStats.as_dict()}."""
+        with self._lock:
+            items = list(self._stats.items())
+        return {_command_name(op_code): stats.as_dict() for op_code, stats in sorted(items)}
+
+    def reset(self):
+        """Clears the statistics and the round trip time estimates."""
+        with self._lock:
+            self._stats = {}
+
+
+def _command_name(op_code):
+    try:
+        return MksCommands(op_code).name
+    except ValueError:
+        return op_code
+
+
+DEFAULT_RETRY = RetryEngine()
@@ -0,0 +1,583 @@
+"""Simulated servos answering the CAN protocol, for tests and benchmarks without hardware.
+
+ServoSimulator listens on a python-can bus (usually the "virtual" interface) and answers as a set of
+SERVO42D/57D drives: the read commands, the parameter writes and reads (READ_SYSYTEM_PARAMETER_COMMAND),
+calibration and homing (with the status pushed at the end), and the motion commands. The motion is
+simplified: the motor runs at the commanded speed without acceleration ramp.
+
+Example:
+    sim_bus = can.Bus(interface="virtual", channel="sim")
+    simulator = ServoSimulator(sim_bus, [1, 2, 3])
+    bus = can.Bus(interface="virtual", channel="sim")
+    servo = MksServo(bus, can.Notifier(bus, []), 1)
+
+FaultInjectionBus degrades the frames received on a bus (drops, corruption, duplicates, reordering and
+latency jitter) to measure the timeouts and retries on a noisy bus.
+"""
+
+import copy
+import heapq
+import itertools
+import os
+import random
+import socket
+import threading
+import time
+
+from collections import deque
+
+import can
+
+from .mks_enums import MksCommands
+
+ENCODER_COUNTS_PER_REV = 0x4000
+
+
+class SimulatedAxis:
+    """State of one simulated drive.
+
+    Attributes:
+        can_id (int): The CAN ID.
+        params (dict): Parameter data bytes by set command code, as written (answered by parameter reads).
+        io (int): IO port status byte (bit0 IN_1, bit1 IN_2, bit2 OUT_1, bit3 OUT_2).
+        shaft_angle_error (int): Answer of READ_MOTOR_SHAFT_ANGLE_ERROR.
+        protected (bool): Answer of READ_MOTOR_SHAFT_PROTECTION_STATE (locked rotor protection triggered), the
+            motion commands fail until it is released.
+        enabled (bool): The enable state.
+    """
+
+    def __init__(self, can_id):
+        self.can_id = can_id
+        self.params = {}
+        self.io = 0
+        self.shaft_angle_error = 0
+        self.protected = False
+        self.enabled = True
+        self._position = 0.0  # axis units at _time
+        self._velocity = 0.0  # axis units per second
+        self._time = time.perf_counter()
+        self._timer = None
+        self._homing = False
+        self._restarted_at = 0.0  # perf_counter time at which a restarted drive answers again
+
+    @property
+    def group_id(self):
+        """int: The group ID written with SET_GROUP_ID_COMMAND, None by default."""
+        data = self.params.get(MksCommands.SET_GROUP_ID_COMMAND.value)
+        return None if data is None else int.from_bytes(data, "big")
+
+    @property
+    def subdivisions(self):
+        """int: The subdivisions written with SET_SUBDIVISIONS_COMMAND, 16 by default."""
+        return self.params.get(MksCommands.SET_SUBDIVISIONS_COMMAND.value, b"\x10")[0] or 256
+
+    def rpm(self, speed):
+        """Converts a speed code into RPM for the current subdivisions."""
+        mstep = self.subdivisions
+        return speed if mstep in (16, 32, 64) else speed * 16 / mstep
+
+    def position(self, now=None):
+        """Returns the axis value (encoder units) at the given perf_counter time, now by default."""
+        now = time.perf_counter() if now is None else now
+        return self._position + self._velocity * (now - self._time)
+
+    @property
+    def running(self):
+        """bool: True while the motor runs."""
+        return self._velocity != 0.0 or self._homing
+
+    def stop(self, position=None):
+        """Stops the motor, at the given axis value or where it is."""
+        now = time.perf_counter()
+        self._position = self.position(now) if position is None else float(position)
+        self._velocity = 0.0
+        self._time = now
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def run(self, rpm, duration=None, on_end=None):
+        """Runs at a signed speed in RPM (positive CCW), for a duration in seconds or until stopped."""
+        self.stop()
+        self._velocity = rpm * ENCODER_COUNTS_PER_REV / 60.0
+        if duration is not None:
+            self._timer = threading.Timer(duration, on_end)
+            self._timer.daemon = True
+            self._timer.start()
+
+
+class ServoSimulator:
+    """Answers the commands sent to a set of simulated drives on a bus.
+
+    Attributes:
+        axes (dict): SimulatedAxis by CAN ID.
+        calibration_time (float): Seconds before the calibration result is pushed.
+        homing_time (float): Seconds before the homing result is pushed.
+        restart_time (float): Seconds a drive does not answer after RESTART_MOTOR.
+        received (int): Number of commands received.
+    """
+
+    def __init__(self, bus, can_ids=(1,), calibration_time=0.5, homing_time=0.5, bitrate=None, restart_time=0.2):
+        """
+        Args:
+            bus (can.BusABC): The bus to answer on. It must not be shared with the MksServo instances of the
+                same process (two virtual buses on the same channel).
+            can_ids (iterable of int): The CAN IDs of the simulated drives.
+            calibration_time (float): Seconds before the calibration result is pushed.
+            homing_time (float): Seconds before the homing result is pushed.
+            bitrate (int, optional): Models the wire time of the requests and responses at this bitrate, the
+                responses are delayed like on a real bus. None answers immediately.
+            restart_time (float): Seconds a drive does not answer after RESTART_MOTOR.
+        """
+        self.bus = bus
+        self.axes = {can_id: SimulatedAxis(can_id) for can_id in can_ids}
+        self.calibration_time = calibration_time
+        self.homing_time = homing_time
+        self.restart_time = restart_time
+        self.received = 0
+        self.bitrate = bitrate
+        self._lock = threading.RLock()
+        self._bus_free = 0.0  # perf_counter time at which the modeled wire is idle
+        self._outgoing = deque()
+        self._outgoing_ready = threading.Condition()
+        self._running = True
+        if bitrate is not None:
+            threading.Thread(target=self._send_scheduled, daemon=True).start()
+        self._handlers = {
+            MksCommands.READ_ENCODER_VALUE_CARRY.value: self._read_encoder_value_carry,
+            MksCommands.READ_ENCODED_VALUE_ADDITION.value: self._read_encoder_value_addition,
+            MksCommands.READ_RAW_ENCODED_VALUE_ADDITION.value: self._read_encoder_value_addition,
+            MksCommands.READ_MOTOR_SPEED.value: self._read_motor_speed,
+            MksCommands.READ_NUM_PULSES_RECEIVED.value: self._read_num_pulses_received,
+            MksCommands.READ_IO_PORT_STATUS.value: lambda axis, op, data: [op, axis.io],
+            MksCommands.READ_MOTOR_SHAFT_ANGLE_ERROR.value: lambda axis, op, data: [op, *axis.shaft_angle_error.to_bytes(4, "big", signed=True)],
+            MksCommands.READ_EN_PINS_STATUS.value: lambda axis, op, data: [op, int(axis.enabled)],
+            MksCommands.READ_GO_BACK_TO_ZERO_STATUS_WHEN_POWER_ON.value: lambda axis, op, data: [op, 1],
+            MksCommands.READ_MOTOR_SHAFT_PROTECTION_STATE.value: lambda axis, op, data: [op, int(axis.protected)],
+            MksCommands.RELEASE_MOTOR_SHAFT_LOCKED_PROTECTION_STATE.value: self._release_protection,
+            MksCommands.READ_SYSYTEM_PARAMETER_COMMAND.value: self._read_parameter,
+            MksCommands.WRITE_IO_PORT_COMMAND.value: self._write_io_port,
+            MksCommands.MOTOR_CALIBRATION_COMMAND.value: self._calibrate,
+            MksCommands.GO_HOME_COMMAND.value: self._go_home,
+            MksCommands.SET_CURRENT_AXIS_TO_ZERO_COMMAND.value: self._set_zero,
+            MksCommands.RESTORE_DEFAULT_PARAMETERS_COMMAND.value: self._restore_default_parameters,
+            MksCommands.RESTART_MOTOR.value: self._restart,
+            MksCommands.QUERY_MOTOR_STATUS_COMMAND.value: lambda axis, op, data: [op, 4 if axis.running else 1],
+            MksCommands.ENABLE_MOTOR_COMMAND.value: self._enable,
+            MksCommands.EMERGENCY_STOP_COMMAND.value: self._emergency_stop,
+            MksCommands.RUN_MOTOR_SPEED_MODE_COMMAND.value: self._run_speed_mode,
+            MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_PULSES_COMMAND.value: self._run_motion,
+            MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_PULSES_COMMAND.value: self._run_motion,
+            MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_AXIS_COMMAND.value: self._run_motion,
+            MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_AXIS_COMMAND.value: self._run_motion,
+        }
+        self.notifier = can.Notifier(bus, [self._on_message])
+
+    def stop(self):
+        """Stops answering and the pending timers."""
+        self.notifier.stop()
+        with self._outgoing_ready:
+            self._running = False
+            self._outgoing_ready.notify()
+        with self._lock:
+            for axis in self.axes.values():
+                axis.stop()
+
+    def send(self, can_id, data):
+        """Sends a frame from a simulated drive, the CRC is appended."""
+        crc = (can_id + sum(data)) & 0xFF
+        message = can.Message(arbitration_id=can_id, data=bytes(data) + bytes([crc]), is_extended_id=False)
+        if self.bitrate is None:
+            self.bus.send(message)
+            return
+        with self._outgoing_ready:
+            self._bus_free = max(self._bus_free, time.perf_counter()) + self._frame_time(message.dlc)
+            self._outgoing.append((self._bus_free, message))
+            self._outgoing_ready.notify()
+
+    def _frame_time(self, dlc):
+        # Standard frame: 47 bits of overhead plus the data, about 20% of stuff bits
+        return (47 + 8 * dlc) * 1.2 / self.bitrate
+
+    def _send_scheduled(self):
+        while True:
+            with self._outgoing_ready:
+                while self._running and not self._outgoing:
+                    self._outgoing_ready.wait()
+                if not self._running:
+                    return
+                deadline, message = self._outgoing.popleft()
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+                if not self._running:
+                    return
+            self.bus.send(message)
+
+    def _on_message(self, message):
+        if message.is_error_frame or len(message.data) < 2:
+            return
+        axis = self.axes.get(message.arbitration_id)
+        # Broadcast (ID 0) and group commands (SET_GROUP_ID_COMMAND) are executed without response
+        axes = [axis] if axis is not None else [a for a in self.axes.values() if message.arbitration_id in (0, a.group_id)]
+        axes = [a for a in axes if a._restarted_at <= time.perf_counter()]
+        if not axes:
+            return
+        if message.data[-1] != (message.arbitration_id + sum(message.data[:-1])) & 0xFF:
+            return
+        op, data = message.data[0], bytes(message.data[1:-1])
+        if self.bitrate is not None:
+            with self._outgoing_ready:
+                self._bus_free = max(self._bus_free, time.perf_counter()) + self._frame_time(message.dlc)
+        with self._lock:
+            self.received += 1
+            handler = self._handlers.get(op, self._set_parameter)
+            responses = [handler(a, op, data) for a in axes]
+        if axis is not None and responses[0] is not None:
+            self.send(axis.can_id, responses[0])
+
+    def _push_later(self, axis, delay, data, action=None):
+        def push():
+            with self._lock:
+                if action is not None:
+                    action()
+            self.send(axis.can_id, data)
+
+        timer = threading.Timer(delay, push)
+        timer.daemon = True
+        timer.start()
+
+    # Read commands
+
+    def _read_encoder_value_carry(self, axis, op, data):
+        value = int(round(axis.position()))
+        return [op, *(value // ENCODER_COUNTS_PER_REV).to_bytes(4, "big", signed=True), *(value % ENCODER_COUNTS_PER_REV).to_bytes(2, "big")]
+
+    def _read_encoder_value_addition(self, axis, op, data):
+        return [op, *int(round(axis.position())).to_bytes(6, "big", signed=True)]
+
+    def _read_motor_speed(self, axis, op, data):
+        rpm = int(round(axis._velocity * 60.0 / ENCODER_COUNTS_PER_REV))
+        return [op, *rpm.to_bytes(2, "big", signed=True)]
+
+    def _read_num_pulses_received(self, axis, op, data):
+        pulses = int(round(axis.position() * 200 * axis.subdivisions / ENCODER_COUNTS_PER_REV))
+        return [op, *pulses.to_bytes(4, "big", signed=True)]
+
+    # Parameters
+
+    def _read_parameter(self, axis, op, data):
+        code = data[0] if data else 0
+        return [code, *axis.params.get(code, b"\xff\xff")]
+
+    def _set_parameter(self, axis, op, data):
+        axis.params[op] = data
+        return [op, 1]
+
+    def _write_io_port(self, axis, op, data):
+        if data:
+            # OUT_2 mask, OUT_1 mask (2 bits each, 1 writes the level), OUT_2 level, OUT_1 level, 2 unused bits
+            if (data[0] >> 4) & 0x03 == 1:
+                axis.io = (axis.io & ~0x04) | (data[0] & 0x04)
+            if data[0] >> 6 == 1:
+                axis.io = (axis.io & ~0x08) | (data[0] & 0x08)
+        return [op, 1]
+
+    def _restore_default_parameters(self, axis, op, data):
+        axis.params.clear()
+        return [op, 1]
+
+    def _restart(self, axis, op, data):
+        axis.stop(0)
+        axis.protected = False
+        axis._restarted_at = time.perf_counter() + self.restart_time  # Answered, then silent until restarted
+        return [op, 1]
+
+    # Procedures
+
+    def _calibrate(self, axis, op, data):
+        self._push_later(axis, self.calibration_time, [op, 1])
+        return [op, 0]
+
+    def _go_home(self, axis, op, data):
+        if axis.protected:
+            return [op, 0]
+        axis.stop()
+        axis._homing = True
+
+        def done():
+            axis._homing = False
+            axis.stop(0)
+
+        self._push_later(axis, self.homing_time, [op, 2], done)
+        return [op, 1]
+
+    def _set_zero(self, axis, op, data):
+        axis.stop(0)
+        return [op, 1]
+
+    def _enable(self, axis, op, data):
+        axis.enabled = bool(data and data[0])
+        return [op, 1]
+
+    def _emergency_stop(self, axis, op, data):
+        axis.stop()
+        return [op, 1]
+
+    def _release_protection(self, axis, op, data):
+        axis.protected = False
+        return [op, 1]
+
+    # Motion
+
+    def _run_speed_mode(self, axis, op, data):
+        if len(data) < 3 or axis.protected:
+            return [op, 0]
+        speed = ((data[0] & 0x0F) << 8) | data[1]
+        if speed == 0:
+            axis.stop()
+            return [op, 2]
+        axis.run(axis.rpm(speed) * (-1 if data[0] & 0x80 else 1))
+        return [op, 1]
+
+    def _run_motion(self, axis, op, data):
+        if len(data) < 6 or axis.protected:
+            return [op, 0]
+        speed = ((data[0] & 0x0F) << 8) | data[1]
+        if speed == 0:
+            axis.stop()
+            return [op, 2]
+
+        start = axis.position()
+        if op == MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_PULSES_COMMAND.value:
+            pulses = int.from_bytes(data[3:6], "big") * (-1 if data[0] & 0x80 else 1)
+            target = start + pulses * ENCODER_COUNTS_PER_REV / (200 * axis.subdivisions)
+        elif op == MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_PULSES_COMMAND.value:
+            target = int.from_bytes(data[3:6], "big", signed=True) * ENCODER_COUNTS_PER_REV / (200 * axis.subdivisions)
+        elif op == MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_AXIS_COMMAND.value:
+            target = start + int.from_bytes(data[3:6], "big", signed=True)
+        else:
+            target = int.from_bytes(data[3:6], "big", signed=True)
+
+        rpm = axis.rpm(speed)
+        duration = abs(target - start) / (rpm * ENCODER_COUNTS_PER_REV / 60.0)
+
+        def done():
+            with self._lock:
+                axis.stop(target)
+            self.send(axis.can_id, [op, 2])
+
+        axis.run(rpm if target >= start else -rpm, duration, done)
+        return [op, 1]
+
+
+class FaultInjectionBus(can.BusABC):
+    """Wraps a bus and degrades the received frames like a noisy bus, to measure the resilience of the library.
+
+    Each received frame is, with the given probabilities: dropped, corrupted (a bit of the last byte, the CRC,
+    is flipped), duplicated, reordered (held for reorder_delay so that the next frames overtake it), and
+    delayed by a uniform latency jitter. The sent frames are not altered: a lost command and a lost response
+    look the same to the sender. The random generator is seeded, so a run with the same traffic gets the
+    same faults:
+
+        bus = FaultInjectionBus(can.Bus(interface="virtual", channel="sim"), drop=0.02, jitter=0.002, seed=1)
+        servo = MksServo(bus, can.Notifier(bus, []), 1)
+
+    Attributes:
+        counters (dict): Number of frames received, dropped, corrupted, duplicated, reordered and delivered.
+    """
+
+    def __init__(self, bus, drop=0.0, corrupt=0.0, duplicate=0.0, reorder=0.0, jitter=0.0, reorder_delay=0.005, seed=0):
+        """
+        Args:
+            bus (can.BusABC): The wrapped bus, shut down with this one.
+            drop (float): Probability that a frame is lost.
+            corrupt (float): Probability that the last data byte of a frame is corrupted.
+            duplicate (float): Probability that a frame is received twice.
+            reorder (float): Probability that a frame is held for reorder_delay seconds.
+            jitter (float): Maximum latency in seconds added to each frame (uniform).
+            reorder_delay (float): Seconds a reordered frame is held.
+            seed (int): Seed of the random generator.
+        """
+        self.bus = bus
+        self.drop = drop
+        self.corrupt = corrupt
+        self.duplicate = duplicate
+        self.reorder = reorder
+        self.jitter = jitter
+        self.reorder_delay = reorder_delay
+        self.counters = dict.fromkeys(("received", "dropped", "corrupted", "duplicated", "reordered", "delivered"), 0)
+        self._random = random.Random(seed)
+        self._delayed = []  # Heap of (delivery time, sequence, message)
+        self._sequence = itertools.count()
+        self.channel_info = f"faults:{bus.channel_info}"
+        super().__init__(channel=getattr(bus, "channel", None))
+
+    def send(self, msg, timeout=None):
+        self.bus.send(msg, timeout)
+
+    def _recv_internal(self, timeout):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            now = time.perf_counter()
+            if self._delayed and self._delayed[0][0] <= now:
+                self.counters["delivered"] += 1
+                return heapq.heappop(self._delayed)[2], False
+            wait = None if deadline is None else deadline - now
+            if self._delayed:
+                wait = self._delayed[0][0] - now if wait is None else min(wait, self._delayed[0][0] - now)
+            if wait is not None and wait < 0:
+                return None, False
+            message = self.bus.recv(wait)
+            if message is not None:
+                self._inject(message)
+
+    def _inject(self, message):
+        counters = self.counters
+        counters["received"] += 1
+        if self._random.random() < self.drop:
+            counters["dropped"] += 1
+            return
+        if message.data and self._random.random() < self.corrupt:
+            message = copy.deepcopy(message)  # The wrapped bus may share the message with other receivers
+            message.data[-1] ^= 1 << self._random.randrange(8)
+            counters["corrupted"] += 1
+        messages = [message]
+        if self._random.random() < self.duplicate:
+            messages.append(copy.deepcopy(message))
+            counters["duplicated"] += 1
+        now = time.perf_counter()
+        for message in messages:
+            delay = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+            if self._random.random() < self.reorder:
+                delay += self.reorder_delay
+                counters["reordered"] += 1
+            heapq.heappush(self._delayed, (now + delay, next(self._sequence), message))
+
+    def shutdown(self):
+        super().shutdown()
+        self.bus.shutdown()
+
+
+class SlcanPtyAdapter:
+    """A slcan adapter stand-in on a pseudo-terminal (POSIX only), bridged to a python-can bus.
+
+    The frames written on the pseudo-terminal are sent on the bus and the frames received from the bus are
+    written back, so a slcan bus opened on ``port`` talks to a ServoSimulator on a virtual bus.
+
+    Attributes:
+        port (str): The path of the pseudo-terminal to open as the slcan serial port.
+        frames_received (int): Number of frames received from the serial side.
+    """
+
+    def __init__(self, bus):
+        """
+        Args:
+            bus (can.BusABC): The bus bridged to the serial side.
+        """
+        import tty
+
+        from .slcan import decode_frame, encode_frame
+
+        self._decode_frame = decode_frame
+        self._encode_frame = encode_frame
+        self.bus = bus
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self.frames_received = 0
+        self._running = True
+        self._write_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_serial, daemon=True)
+        self._reader.start()
+        self.notifier = can.Notifier(bus, [self._on_message])
+
+    def stop(self):
+        """Stops the bridge and closes the pseudo-terminal."""
+        self._running = False
+        self.notifier.stop()
+        os.close(self._slave)
+        os.close(self._master)
+
+    def _on_message(self, message):
+        with self._write_lock:
+            os.write(self._master, self._encode_frame(message))
+
+    def _read_serial(self):
+        buffer = b""
+        while self._running:
+            try:
+                buffer += os.read(self._master, 65536)
+            except OSError:
+                return
+            lines = buffer.replace(b"\a", b"\r").split(b"\r")
+            buffer = lines.pop()
+            for line in lines:
+                message = self._decode_frame(line)
+                if message is not None:
+                    self.frames_received += 1
+                    self.bus.send(message)
+                elif line[:1] in (b"O", b"C", b"L", b"S"):
+                    with self._write_lock:
+                        os.write(self._master, b"\r")
+
+
+class SocketCanStandIn:
+    """A raw SocketCAN stand-in on a datagram socket pair, bridged to a python-can bus.
+
+    The struct can_frame records sent on ``socket`` are sent on the bus and the frames received from the
+    bus are written back, so a socketcan_raw.RawSocketCanBus(sock=stand_in.socket) talks to a
+    ServoSimulator on a virtual bus.
+
+    Attributes:
+        socket (socket.socket): The application end, None when the far end was given.
+    """
+
+    def __init__(self, bus, sock=None):
+        """
+        Args:
+            bus (can.BusABC): The bus bridged to the socket.
+            sock (socket.socket, optional): The far end of a socket.socket(AF_UNIX, SOCK_SEQPACKET) pair,
+                e.g. to run the stand-in in another process. By default a pair is created.
+        """
+        from .socketcan_raw import _CAN_FRAME, _message, pack_frame
+
+        self._frame = _CAN_FRAME
+        self._message = _message
+        self._pack_frame = pack_frame
+        self.socket = None
+        if sock is None:
+            self.socket, sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._sock = sock
+        self.bus = bus
+        self._running = True
+        self._reader = threading.Thread(target=self._read_socket, daemon=True)
+        self._reader.start()
+        self.notifier = can.Notifier(bus, [self._on_message])
+
+    def stop(self):
+        """Stops the bridge and closes the socket pair."""
+        self._running = False
+        self.notifier.stop()
+        self._sock.shutdown(socket.SHUT_RDWR)
+        self._reader.join()
+        self._sock.close()
+        if self.socket is not None:
+            self.socket.close()
+
+    def _on_message(self, message):
+        try:
+            self._sock.send(self._pack_frame(message))
+        except OSError:
+            pass  # Application end closed
+
+    def _read_socket(self):
+        while self._running:
+            try:
+                record = self._sock.recv(self._frame.size)
+            except OSError:
+                return
+            if not record:
+                return
+            can_id, dlc, data = self._frame.unpack(record)
+            self.bus.send(self._message(can_id, data[:dlc], time.time()))
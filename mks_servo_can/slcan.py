@@ -0,0 +1,188 @@
+"""slcan transport with batched serial I/O.
+
+The stock python-can slcan bus writes and flushes each frame separately and reads the serial port
+one byte at a time, so the command rate is limited by the syscalls well below the bus capacity.
+BatchedSlcanBus speaks the same ASCII protocol but:
+
+- send() only queues the frame; a writer thread writes all the queued frames with one serial write.
+  Frames queued while a write is in progress go out together in the next one. send() waits when
+  max_pending bytes are already queued.
+- reads take everything the port has (one read per burst) and parse all the complete lines at once.
+
+    bus = BatchedSlcanBus("/dev/ttyACM0", bitrate=500000)
+    notifier = can.Notifier(bus, [])
+    servo = MksServo(bus, notifier, 1)
+
+Requires pyserial (a python-can slcan dependency).
+"""
+
+import threading
+import time
+
+from collections import deque
+
+import can
+import serial
+
+BITRATES = {
+    10000: b"S0",
+    20000: b"S1",
+    50000: b"S2",
+    100000: b"S3",
+    125000: b"S4",
+    250000: b"S5",
+    500000: b"S6",
+    750000: b"S7",
+    1000000: b"S8",
+    83300: b"S9",
+}
+
+
+def encode_frame(message):
+    """Returns the slcan line of a frame, terminator included."""
+    if message.is_extended_id:
+        head = b"R%08X%d" if message.is_remote_frame else b"T%08X%d"
+    else:
+        head = b"r%03X%d" if message.is_remote_frame else b"t%03X%d"
+    line = head % (message.arbitration_id, message.dlc)
+    if not message.is_remote_frame:
+        line += bytes(message.data).hex().upper().encode()
+    return line + b"\r"
+
+
+def decode_frame(line, timestamp=None):
+    """
+    Parses a slcan frame line, without terminator.
+
+    Returns:
+        can.Message: The frame, None if the line is not a frame (acknowledgment, version, ...).
+    """
+    kind = line[:1]
+    if kind in (b"t", b"r"):
+        id_end = 4
+    elif kind in (b"T", b"R"):
+        id_end = 9
+    else:
+        return None
+    try:
+        dlc = int(line[id_end : id_end + 1])
+        remote = kind in (b"r", b"R")
+        return can.Message(
+            timestamp=time.time() if timestamp is None else timestamp,
+            arbitration_id=int(line[1:id_end], 16),
+            is_extended_id=id_end == 9,
+            is_remote_frame=remote,
+            dlc=dlc,
+            data=None if remote else bytes.fromhex(line[id_end + 1 : id_end + 1 + dlc * 2].decode()),
+        )
+    except ValueError:
+        return None
+
+
+class BatchedSlcanBus(can.BusABC):
+    """A slcan bus coalescing the writes and reading the serial port in bulk.
+
+    Attributes:
+        writes (int): Number of serial writes.
+        frames_sent (int): Number of frames written.
+    """
+
+    def __init__(self, channel, bitrate=500000, tty_baudrate=115200, poll_interval=0.001, max_pending=65536, can_filters=None, **kwargs):
+        """
+        Args:
+            channel (str): The serial port (e.g. "/dev/ttyACM0", "COM3"), or a pyserial URL.
+            bitrate (int): The CAN bitrate, one of BITRATES.
+            tty_baudrate (int): The serial baudrate, ignored by USB CDC adapters.
+            poll_interval (float): Serial read timeout in seconds, the receive timeout is checked at this interval.
+            max_pending (int): Bytes queued for writing above which send() waits for the writer.
+            can_filters (list, optional): python-can receive filters.
+        """
+        if bitrate not in BITRATES:
+            raise ValueError(f"Invalid bitrate {bitrate}, valid values are {sorted(BITRATES)}")
+        self._serial = serial.serial_for_url(channel, baudrate=tty_baudrate, timeout=poll_interval)
+        self._rx_buffer = bytearray()
+        self._received = deque()
+        self._tx_buffer = bytearray()
+        self._max_pending = max_pending
+        self._tx_ready = threading.Condition()
+        self._running = True
+        self.writes = 0
+        self.frames_sent = 0
+        self.channel = channel
+        self.channel_info = f"slcan:{channel}"
+
+        self._serial.write(b"C\r" + BITRATES[bitrate] + b"\rO\r")
+        self._serial.flush()
+        self._writer = threading.Thread(target=self._write_batches, daemon=True)
+        self._writer.start()
+        super().__init__(channel=channel, can_filters=can_filters, **kwargs)
+
+    def send(self, msg, timeout=None):
+        line = encode_frame(msg)
+        with self._tx_ready:
+            if not self._tx_ready.wait_for(lambda: not self._running or len(self._tx_buffer) < self._max_pending, timeout):
+                raise can.CanOperationError("The slcan transmit buffer is full")
+            if not self._running:
+                raise can.CanOperationError("The bus is shut down")
+            self._tx_buffer += line
+            self.frames_sent += 1
+            self._tx_ready.notify_all()
+
+    def _write_batches(self):
+        while True:
+            with self._tx_ready:
+                while self._running and not self._tx_buffer:
+                    self._tx_ready.wait()
+                if not self._tx_buffer:
+                    return
+                batch = bytes(self._tx_buffer)
+                self._tx_buffer.clear()
+                self._tx_ready.notify_all()
+            try:
+                self._serial.write(batch)
+                self.writes += 1
+            except serial.SerialException:
+                with self._tx_ready:
+                    self._running = False
+                    self._tx_ready.notify_all()
+                return
+
+    def _recv_internal(self, timeout):
+        if self._received:
+            return self._received.popleft(), False
+
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            # Everything waiting in one read, or wait up to poll_interval for the first byte of a burst
+            try:
+                chunk = self._serial.read(self._serial.in_waiting or 1)
+            except serial.SerialException as e:
+                raise can.CanOperationError(f"Could not read from serial device: {e}")
+            if chunk:
+                self._parse(chunk)
+                if self._received:
+                    return self._received.popleft(), False
+            elif deadline is not None and time.perf_counter() >= deadline:
+                return None, False
+
+    def _parse(self, chunk):
+        self._rx_buffer += chunk
+        lines = self._rx_buffer.replace(b"\a", b"\r").split(b"\r")
+        self._rx_buffer = lines.pop()  # Incomplete line
+        timestamp = time.time()
+        for line in lines:
+            message = decode_frame(bytes(line), timestamp)
+            if message is not None:
+                self._received.append(message)
+
+    def shutdown(self):
+        super().shutdown()
+        with self._tx_ready:
+            self._running = False
+            self._tx_ready.notify_all()
+        self._writer.join()
+        try:
+            self._serial.write(b"C\r")
+        except serial.SerialException:
+            pass
+        self._serial.close()
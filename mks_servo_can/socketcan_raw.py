@@ -0,0 +1,301 @@
+"""Raw SocketCAN transport with batched receive (Linux).
+
+With python-can, every received frame is parsed into a can.Message and passed to every Notifier
+listener, each MksServo listener then filters the frames by CAN ID. RawSocketCanBus reads the raw
+``struct can_frame`` records of a CAN_RAW socket in batches into a preallocated buffer (one recvmmsg()
+system call per batch, one recv() per frame where the C library has no recvmmsg), and
+RawFrameNotifier hands the CAN ID and data of each frame directly to the MksServo.handle_frame()
+decoder of the axis, without building can.Message objects:
+
+    bus, notifier = open_socketcan("can0")
+    servo = MksServo(bus, notifier, 1)
+    ...
+    notifier.stop()
+    bus.shutdown()
+
+open_socketcan() falls back to the python-can socketcan bus and can.Notifier when raw CAN sockets
+are not available. Listeners taking can.Message (e.g. AxisStatePublisher.on_message) can still be
+added to a RawFrameNotifier, the messages are only built when such a listener exists.
+
+RawSocketCanBus accepts any connected datagram socket carrying ``struct can_frame`` records, e.g. one
+end of a socket.socketpair() bridged to simulated servos by simulator.SocketCanStandIn.
+"""
+
+import ctypes
+import errno
+import logging
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+from collections import deque
+
+import can
+
+# struct can_frame: can_id (with the EFF/RTR/ERR flags), dlc, padding, data
+_CAN_FRAME = struct.Struct("=IB3x8s")
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+CAN_ERR_FLAG = 0x20000000
+CAN_EFF_MASK = 0x1FFFFFFF
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+try:
+    _recvmmsg = ctypes.CDLL(None, use_errno=True).recvmmsg
+    _recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    _recvmmsg.restype = ctypes.c_int
+except (OSError, AttributeError, TypeError):  # Not Linux
+    _recvmmsg = None
+
+
+def _message(can_id, data, timestamp):
+    return can.Message(
+        timestamp=timestamp,
+        arbitration_id=can_id & CAN_EFF_MASK,
+        is_extended_id=bool(can_id & CAN_EFF_FLAG),
+        is_remote_frame=bool(can_id & CAN_RTR_FLAG),
+        is_error_frame=bool(can_id & CAN_ERR_FLAG),
+        dlc=len(data),
+        data=data,
+    )
+
+
+def pack_frame(message):
+    """Returns the struct can_frame record of a can.Message."""
+    can_id = message.arbitration_id
+    if message.is_extended_id:
+        can_id |= CAN_EFF_FLAG
+    if message.is_remote_frame:
+        can_id |= CAN_RTR_FLAG
+    if message.is_error_frame:
+        can_id |= CAN_ERR_FLAG
+    return _CAN_FRAME.pack(can_id, message.dlc, bytes(message.data))
+
+
+class RawSocketCanBus(can.BusABC):
+    """A python-can bus on a raw CAN socket, with a batched receive for RawFrameNotifier.
+
+    Attributes:
+        batches (int): Number of batches read by recv_batch().
+        frames_received (int): Number of frames read by recv_batch().
+    """
+
+    def __init__(self, channel=None, sock=None, batch_size=64, **kwargs):
+        """
+        Args:
+            channel (str): The CAN interface, e.g. "can0".
+            sock (socket.socket, optional): A connected datagram socket carrying struct can_frame records,
+                used instead of opening a CAN_RAW socket on channel.
+            batch_size (int): Maximum number of frames read by one recv_batch() call.
+        """
+        if sock is None:
+            sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+            try:
+                sock.bind((channel,))
+            except OSError:
+                sock.close()
+                raise
+        sock.setblocking(False)
+        self.socket = sock
+        self._buffer = bytearray(_CAN_FRAME.size * batch_size)
+        self._view = memoryview(self._buffer)
+        self._received = deque()  # Frames read by a batch and not yet returned by recv()
+        self._messages = None
+        if _recvmmsg is not None:
+            # One message header per slot of the buffer, built once
+            address = ctypes.addressof(ctypes.c_char.from_buffer(self._buffer))
+            self._iovecs = (_IoVec * batch_size)(*[_IoVec(address + i * _CAN_FRAME.size, _CAN_FRAME.size) for i in range(batch_size)])
+            self._messages = (_MMsgHdr * batch_size)()
+            for i in range(batch_size):
+                self._messages[i].msg_hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+                self._messages[i].msg_hdr.msg_iovlen = 1
+        self.batches = 0
+        self.frames_received = 0
+        self.channel = channel
+        self.channel_info = f"raw socketcan:{channel}"
+        super().__init__(channel=channel, **kwargs)
+
+    def send(self, msg, timeout=None):
+        frame = pack_frame(msg)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            try:
+                self.socket.send(frame)
+                return
+            except BlockingIOError:  # Transmit queue full
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    raise can.CanOperationError("Transmit buffer full")
+                select.select([], [self.socket], [], remaining)
+            except OSError as e:
+                raise can.CanOperationError(f"Failed to transmit: {e}")
+
+    def recv_batch(self, timeout=None):
+        """
+        Waits for frames then reads all the waiting frames, up to batch_size, into the preallocated buffer.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the first frame, forever if None.
+
+        Returns:
+            list: (can_id, data) tuples, can_id with the EFF/RTR/ERR flags and data as bytes. Empty on timeout.
+        """
+        if not select.select([self.socket], [], [], timeout)[0]:
+            return []
+        end = self._read_frames()
+        self.batches += 1
+        self.frames_received += end // _CAN_FRAME.size
+        return [(can_id, data[:dlc]) for can_id, dlc, data in _CAN_FRAME.iter_unpack(self._view[:end])]
+
+    def _read_frames(self):
+        # Reads the waiting frames into the buffer, returns the number of bytes read
+        size = _CAN_FRAME.size
+        if self._messages is not None:
+            count = _recvmmsg(self.socket.fileno(), self._messages, len(self._messages), 0, None)  # Non-blocking socket
+            if count < 0:
+                error = ctypes.get_errno()
+                if error in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return 0
+                raise can.CanOperationError(f"Failed to receive: {os.strerror(error)}")
+            frames = 0
+            while frames < count and self._messages[frames].msg_len == size:  # A shorter record is a closed peer
+                frames += 1
+            return frames * size
+        end = 0
+        while end < len(self._buffer):
+            try:
+                received = self.socket.recv_into(self._view[end : end + size], size)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                raise can.CanOperationError(f"Failed to receive: {e}")
+            if received == 0:  # Peer closed
+                break
+            end += size
+        return end
+
+    def _recv_internal(self, timeout):
+        if not self._received:
+            timestamp = time.time()
+            self._received.extend(_message(can_id, data, timestamp) for can_id, data in self.recv_batch(timeout))
+            if not self._received:
+                return None, False
+        return self._received.popleft(), False
+
+    def shutdown(self):
+        super().shutdown()
+        self.socket.close()
+
+
+class RawFrameNotifier:
+    """Reads a RawSocketCanBus in a thread and dispatches the frames by CAN ID to the frame handlers.
+
+    It is passed to MksServo in place of a can.Notifier, the servos register MksServo.handle_frame()
+    with add_frame_handler().
+    """
+
+    def __init__(self, bus, timeout=0.1):
+        """
+        Args:
+            bus (RawSocketCanBus): The bus to read.
+            timeout (float): Seconds between the checks of stop().
+        """
+        self.bus = bus
+        self.timeout = timeout
+        self._handlers = {}
+        self._listeners = []
+        self._running = True
+        self._thread = threading.Thread(target=self._rx_thread, name="RawFrameNotifier", daemon=True)
+        self._thread.start()
+
+    def add_frame_handler(self, can_id, handler):
+        """
+        Calls handler(can_id, data) for each standard frame received from can_id.
+
+        Args:
+            can_id (int): The CAN ID of the axis.
+            handler (callable): Called in the notifier thread with the CAN ID and the data (bytes).
+        """
+        self._handlers[can_id] = handler
+
+    def remove_frame_handler(self, can_id):
+        self._handlers.pop(can_id, None)
+
+    def add_listener(self, listener):
+        """Adds a can.Notifier style listener, called with a can.Message for every frame."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def stop(self, timeout=5):
+        """Stops the notifier thread, the bus is not shut down."""
+        self._running = False
+        self._thread.join(timeout)
+
+    def _rx_thread(self):
+        handlers = self._handlers
+        while self._running:
+            try:
+                frames = self.bus.recv_batch(self.timeout)
+            except can.CanError as e:
+                if self._running:
+                    logging.error(f"Error receiving frames: {e}")
+                return
+            for can_id, data in frames:
+                # Standard frames only, the flags make the extended, remote and error frames miss the table
+                handler = handlers.get(can_id)
+                try:
+                    if handler is not None:
+                        handler(can_id, data)
+                    if self._listeners:
+                        message = _message(can_id, data, time.time())
+                        for listener in self._listeners:
+                            listener(message)
+                except Exception:
+                    logging.exception(f"Error handling frame {can_id:X}#{data.hex()}")
+
+
+def open_socketcan(channel, raw=True, **bus_kwargs):
+    """
+    Opens a SocketCAN interface, with the raw transport when it is available.
+
+    Args:
+        channel (str): The CAN interface, e.g. "can0".
+        raw (bool): Use RawSocketCanBus and RawFrameNotifier, False forces the python-can path.
+        bus_kwargs: Arguments of can.Bus for the python-can fallback.
+
+    Returns:
+        tuple: (bus, notifier) to create the MksServo instances with.
+    """
+    if raw and hasattr(socket, "CAN_RAW"):
+        try:
+            bus = RawSocketCanBus(channel)
+            return bus, RawFrameNotifier(bus)
+        except OSError as e:
+            logging.warning(f"Raw SocketCAN not available on {channel} ({e}), using python-can")
+    bus = can.Bus(interface="socketcan", channel=channel, **bus_kwargs)
+    return bus, can.Notifier(bus, [])
@@ -0,0 +1,231 @@
+"""Fixed-rate speed-mode setpoint streaming.
+
+SpeedStreamer sends run_motor_in_speed_mode setpoints to one or many axes at a fixed rate. The cycles
+follow absolute deadlines (no drift), the commands are sent with nb_run_motor_in_speed_mode without
+waiting for the responses, and the responses are checked asynchronously by the CAN notifier thread.
+
+Setpoints are signed speeds in RPM: positive runs CCW and negative runs CW (the same sign convention as
+read_motor_speed).
+
+Requires NumPy (``pip install mks-servo-can[numpy]``).
+"""
+
+import threading
+import time
+
+from collections import deque
+
+import numpy as np
+
+from .mks_enums import Direction, RunMotorResult
+
+
+class speed_streamer_error(Exception):
+    """Exception raised for invalid setpoints."""
+
+    pass
+
+
+class JitterStats:
+    """Cycle timing statistics.
+
+    The count, mean, standard deviation and maximum cover the whole stream, the percentiles cover the
+    last ``window`` cycles.
+
+    Attributes:
+        count (int): Number of cycles.
+        overruns (int): Number of cycles that started more than one period late.
+    """
+
+    def __init__(self, window=10000):
+        self.count = 0
+        self.overruns = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._max = 0.0
+        self._window = np.zeros(window)
+
+    def __repr__(self):
+        return f"JitterStats(count={self.count}, mean={self.mean * 1e6:.1f}us, std={self.std * 1e6:.1f}us, p99={self.percentile(99) * 1e6:.1f}us, max={self.max * 1e6:.1f}us, overruns={self.overruns})"
+
+    def add(self, lateness):
+        """Records the lateness of one cycle (seconds after its deadline)."""
+        self._window[self.count % len(self._window)] = lateness
+        self.count += 1
+        delta = lateness - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (lateness - self._mean)
+        if lateness > self._max:
+            self._max = lateness
+
+    @property
+    def mean(self):
+        """float: Mean lateness in seconds."""
+        return self._mean
+
+    @property
+    def std(self):
+        """float: Standard deviation of the lateness in seconds."""
+        return (self._m2 / self.count) ** 0.5 if self.count else 0.0
+
+    @property
+    def max(self):
+        """float: Worst lateness in seconds."""
+        return self._max
+
+    def percentile(self, q):
+        """Returns the q-th percentile of the lateness of the last cycles, in seconds."""
+        if not self.count:
+            return 0.0
+        return float(np.percentile(self._window[: min(self.count, len(self._window))], q))
+
+
+class StreamReport:
+    """Result of a stream.
+
+    Attributes:
+        cycles (int): Number of cycles run.
+        sent (int): Number of commands sent.
+        acked (int): Number of successful responses.
+        failed (int): Number of responses with a failure status.
+        lost (int): Number of commands without response.
+        jitter (JitterStats): The cycle timing statistics.
+    """
+
+    def __init__(self, jitter):
+        self.cycles = 0
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self.lost = 0
+        self.jitter = jitter
+
+    def __repr__(self):
+        return f"StreamReport(cycles={self.cycles}, sent={self.sent}, acked={self.acked}, failed={self.failed}, lost={self.lost}, jitter={self.jitter!r})"
+
+
+class SpeedStreamer:
+    """Streams speed-mode setpoints at a fixed rate.
+
+    Example:
+        streamer = SpeedStreamer([servo_x, servo_y], rate=200, acceleration=10)
+        t = np.arange(0, 5, 1 / 200)
+        report = streamer.run(np.column_stack([300 * np.sin(t), 300 * np.cos(t)]))
+    """
+
+    SPIN_TIME = 0.0005  # Busy wait the last part of each period, sleep() is not precise enough
+
+    def __init__(self, servos, rate=200, acceleration=0, skip_unchanged=False, max_in_flight=4):
+        """
+        Args:
+            servos (list of MksServo): The servos, one per setpoint column.
+            rate (float): Setpoints per second.
+            acceleration (int): The acceleration code used when a setpoint does not include one.
+            skip_unchanged (bool): Do not resend a setpoint equal to the previous one of the same axis. A skipped
+                setpoint is not sent again at the rate, so a lost command is not corrected until the setpoint changes.
+            max_in_flight (int): Maximum number of unanswered commands per axis, older ones are counted as lost.
+        """
+        self.servos = list(servos)
+        self.period = 1.0 / rate
+        self.acceleration = acceleration
+        self.skip_unchanged = skip_unchanged
+        self.max_in_flight = max_in_flight
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def stop(self):
+        """Stops a running stream at the next cycle."""
+        self._stop.set()
+
+    def _normalize(self, setpoint):
+        # Returns (speeds, accelerations), one per axis
+        setpoint = np.asarray(setpoint)
+        n = len(self.servos)
+        if setpoint.ndim == 0:
+            setpoint = setpoint[None]
+        if setpoint.ndim == 1 and setpoint.shape[0] == n:
+            return setpoint, np.full(n, self.acceleration)
+        if setpoint.shape == (n, 2):
+            return setpoint[:, 0], setpoint[:, 1]
+        raise speed_streamer_error(f"Invalid setpoint shape {setpoint.shape} for {n} axes")
+
+    def _on_response(self, report, future, speed):
+        if future.cancelled():
+            return
+        status = future.result()[1] if len(future.result()) > 1 else None
+        with self._lock:
+            # A speed of 0 stops the motor, the drive answers it with RunComplete (stop complete)
+            if status == RunMotorResult.RunStarting.value or (speed == 0 and status == RunMotorResult.RunComplete.value):
+                report.acked += 1
+            else:
+                report.failed += 1
+
+    def run(self, setpoints, stop_acceleration=None):
+        """
+        Streams the setpoints. Blocks until the setpoints are exhausted or stop() is called.
+
+        Args:
+            setpoints (iterable or numpy.ndarray): One item per cycle. An item is a signed speed per axis
+                (shape (n_axes,), a scalar for one axis) or a (speed, acceleration) pair per axis (shape (n_axes, 2)).
+                A NumPy array of shape (n_cycles, n_axes) or (n_cycles, n_axes, 2) is iterated by rows.
+            stop_acceleration (int, optional): If not None, the axes are stopped with this acceleration at the end.
+
+        Returns:
+            StreamReport: The statistics of the stream.
+        """
+        self._stop.clear()
+        report = StreamReport(JitterStats())
+        in_flight = [deque() for _ in self.servos]
+        last = [None] * len(self.servos)
+
+        deadline = time.perf_counter()
+        for setpoint in setpoints:
+            if self._stop.is_set():
+                break
+            speeds, accelerations = self._normalize(setpoint)
+
+            # Sleep until the deadline, then busy wait the last part
+            remaining = deadline - time.perf_counter()
+            if remaining > self.SPIN_TIME:
+                time.sleep(remaining - self.SPIN_TIME)
+            while time.perf_counter() < deadline:
+                pass
+            lateness = time.perf_counter() - deadline
+            report.jitter.add(lateness)
+            if lateness > self.period:
+                # Overrun, re-anchor the schedule instead of sending a burst of late setpoints
+                report.jitter.overruns += 1
+                deadline = time.perf_counter()
+
+            for i, (servo, speed, acceleration) in enumerate(zip(self.servos, speeds, accelerations)):
+                command = (int(speed), int(acceleration))
+                if self.skip_unchanged and command == last[i]:
+                    continue
+                last[i] = command
+                direction = Direction.CCW if command[0] >= 0 else Direction.CW
+                future = servo.nb_run_motor_in_speed_mode(direction, abs(command[0]), command[1])
+                future.add_done_callback(lambda f, speed=command[0]: self._on_response(report, f, speed))
+                report.sent += 1
+
+                pending = in_flight[i]
+                pending.append(future)
+                while pending and pending[0].done():
+                    pending.popleft()
+                if len(pending) > self.max_in_flight:
+                    pending.popleft().cancel()
+
+            report.cycles += 1
+            deadline += self.period
+
+        if stop_acceleration is not None:
+            for servo in self.servos:
+                servo.stop_motor_in_speed_mode(stop_acceleration)
+
+        # Give the last responses one period to arrive
+        time.sleep(self.period)
+        for pending in in_flight:
+            for future in pending:
+                future.cancel()
+        with self._lock:
+            report.lost = report.sent - report.acked - report.failed
+        return report
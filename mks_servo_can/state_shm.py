@@ -0,0 +1,254 @@
+"""Publication of the axis states in shared memory.
+
+The process that owns the bus publishes the latest decoded state of every axis into a
+multiprocessing.shared_memory block; readers in other processes map the block and copy consistent
+snapshots of all the axes without syscalls, pickling or bus traffic.
+
+Layout (little endian), a header followed by one array per field (struct of arrays):
+
+    uint64 sequence   seqlock counter, odd while the writer updates the arrays
+    uint32 magic
+    uint32 n_axes
+    int64  position[n_axes]          encoder value addition (axis units)
+    int32  can_id[n_axes]
+    int32  speed[n_axes]             RPM, positive CCW
+    int32  shaft_angle_error[n_axes] 51200 = 360 degrees
+    int32  motor_status[n_axes]      MotorStatus value, -1 if unknown
+    int32  run_status[n_axes]        RunMotorResult value of the last run command, -1 if unknown
+    float64 updated[n_axes]          time.time() of the last update of the axis
+
+The writer increments the sequence before and after each update, a reader retries while the sequence
+is odd or changed during its copy, up to a timeout.
+
+Example:
+    # Owner of the bus
+    publisher = AxisStatePublisher("mks-axes", [1, 2, 3])
+    notifier.add_listener(publisher.on_message)
+
+    # Other process
+    reader = AxisStateReader("mks-axes")
+    state = reader.snapshot()
+    print(state["position"], state["speed"])
+
+Requires NumPy (``pip install mks-servo-can[numpy]``).
+"""
+
+import sys
+import threading
+import time
+
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from .mks_enums import MksCommands
+
+MAGIC = 0x4D4B5331  # "MKS1"
+
+FIELDS = (
+    ("position", np.int64),
+    ("can_id", np.int32),
+    ("speed", np.int32),
+    ("shaft_angle_error", np.int32),
+    ("motor_status", np.int32),
+    ("run_status", np.int32),
+    ("updated", np.float64),
+)
+
+_HEADER_SIZE = 16
+_published = set()  # Blocks created by this process, the resource tracker removes them at exit
+_RUN_COMMANDS = (
+    MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_PULSES_COMMAND.value,
+    MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_PULSES_COMMAND.value,
+    MksCommands.RUN_MOTOR_RELATIVE_MOTION_BY_AXIS_COMMAND.value,
+    MksCommands.RUN_MOTOR_ABSOLUTE_MOTION_BY_AXIS_COMMAND.value,
+    MksCommands.RUN_MOTOR_SPEED_MODE_COMMAND.value,
+)
+
+
+class state_shm_error(Exception):
+    """Exception raised for an invalid shared memory block or an unknown axis."""
+
+    pass
+
+
+def _block_size(n_axes):
+    return _HEADER_SIZE + sum(np.dtype(dtype).itemsize for _, dtype in FIELDS) * n_axes
+
+
+def _map_arrays(buffer, n_axes):
+    arrays = {}
+    offset = _HEADER_SIZE
+    for name, dtype in FIELDS:
+        arrays[name] = np.ndarray((n_axes,), dtype=dtype, buffer=buffer, offset=offset)
+        offset += np.dtype(dtype).itemsize * n_axes
+    return arrays
+
+
+class AxisStatePublisher:
+    """Writes the axis states into a shared memory block. Owned by the process that owns the bus."""
+
+    def __init__(self, name, can_ids):
+        """
+        Args:
+            name (str): The name of the shared memory block, a block with the same name is replaced.
+            can_ids (list of int): The CAN IDs of the published axes.
+        """
+        can_ids = list(can_ids)
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=_block_size(len(can_ids)))
+        _published.add(self.shm.name)
+        self._sequence = np.ndarray((1,), dtype=np.uint64, buffer=self.shm.buf, offset=0)
+        header = np.ndarray((2,), dtype=np.uint32, buffer=self.shm.buf, offset=8)
+        self._arrays = _map_arrays(self.shm.buf, len(can_ids))
+        self._arrays["can_id"][:] = can_ids
+        for name in ("motor_status", "run_status"):
+            self._arrays[name][:] = -1
+        self._index = {can_id: i for i, can_id in enumerate(can_ids)}
+        self._lock = threading.Lock()
+        self._sequence[0] = 0
+        header[:] = (MAGIC, len(can_ids))
+
+    def close(self):
+        """Releases and removes the shared memory block."""
+        self._sequence = None
+        self._arrays = None
+        self.shm.close()
+        self.shm.unlink()
+        _published.discard(self.shm.name)
+
+    def update(self, can_id, **values):
+        """
+        Publishes new values of an axis.
+
+        Args:
+            can_id (int): The CAN ID of the axis.
+            values: New values by field name (position, speed, shaft_angle_error, motor_status, run_status).
+
+        Raises:
+            state_shm_error: If the axis is not published.
+        """
+        i = self._index.get(can_id)
+        if i is None:
+            raise state_shm_error(f"Axis {can_id} is not published")
+        with self._lock:
+            self._sequence[0] += 1
+            for name, value in values.items():
+                self._arrays[name][i] = value
+            self._arrays["updated"][i] = time.time()
+            self._sequence[0] += 1
+
+    def on_message(self, message):
+        """
+        Notifier listener decoding the responses of the drives into the published state.
+
+        Args:
+            message (can.Message): A frame received on the bus.
+        """
+        if message.arbitration_id not in self._index or len(message.data) < 2:
+            return
+        data = message.data
+        if data[-1] != (message.arbitration_id + sum(data) - data[-1]) & 0xFF:
+            return
+        op = data[0]
+        if op == MksCommands.READ_ENCODED_VALUE_ADDITION.value and len(data) == 8:
+            self.update(message.arbitration_id, position=int.from_bytes(data[1:7], byteorder="big", signed=True))
+        elif op == MksCommands.READ_MOTOR_SPEED.value and len(data) == 4:
+            self.update(message.arbitration_id, speed=int.from_bytes(data[1:3], byteorder="big", signed=True))
+        elif op == MksCommands.READ_MOTOR_SHAFT_ANGLE_ERROR.value and len(data) == 6:
+            self.update(message.arbitration_id, shaft_angle_error=int.from_bytes(data[1:5], byteorder="big", signed=True))
+        elif op == MksCommands.QUERY_MOTOR_STATUS_COMMAND.value and len(data) == 3:
+            self.update(message.arbitration_id, motor_status=data[1])
+        elif op in _RUN_COMMANDS and len(data) == 3:
+            self.update(message.arbitration_id, run_status=data[1])
+
+
+class AxisStateReader:
+    """Reads consistent snapshots of the axis states published by an AxisStatePublisher."""
+
+    def __init__(self, name, timeout=0.1):
+        """
+        Args:
+            name (str): The name of the shared memory block.
+            timeout (float): Seconds a copy retries before giving up, e.g. when the writer died during an update.
+
+        Raises:
+            state_shm_error: If the block is not an axis state block.
+        """
+        if sys.version_info >= (3, 13):
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # The reader must not remove the block when it exits
+            self.shm = shared_memory.SharedMemory(name=name)
+            if self.shm.name not in _published:
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        magic, n_axes = np.ndarray((2,), dtype=np.uint32, buffer=self.shm.buf, offset=8)
+        if magic != MAGIC:
+            raise state_shm_error(f"{name} is not an axis state block")
+        self.n_axes = int(n_axes)
+        self._sequence = np.ndarray((1,), dtype=np.uint64, buffer=self.shm.buf, offset=0)
+        self._arrays = _map_arrays(self.shm.buf, self.n_axes)
+        self._index = {int(can_id): i for i, can_id in enumerate(self._arrays["can_id"])}
+        self.timeout = timeout
+        self.retries = 0  # Copies restarted because of a concurrent update
+
+    def close(self):
+        """Unmaps the shared memory block."""
+        self._sequence = None
+        self._arrays = None
+        self.shm.close()
+
+    @property
+    def sequence(self):
+        """int: The seqlock counter, it changes with every update."""
+        return int(self._sequence[0])
+
+    def _consistent_copy(self, copy):
+        # Retries the copy until no update happened during it
+        deadline = None
+        while True:
+            before = self._sequence[0]
+            if not before & 1:
+                result = copy()
+                if self._sequence[0] == before:
+                    return result
+            self.retries += 1
+            if deadline is None:
+                deadline = time.perf_counter() + self.timeout
+            elif time.perf_counter() > deadline:
+                raise state_shm_error(f"No consistent copy of {self.shm.name} within {self.timeout} s, sequence {int(self._sequence[0])}")
+
+    def snapshot(self):
+        """
+        Copies the state of all the axes.
+
+        Returns:
+            dict: A numpy.ndarray copy by field name, index i is the axis can_id[i].
+
+        Raises:
+            state_shm_error: If no consistent copy could be made within timeout.
+        """
+        return self._consistent_copy(lambda: {name: array.copy() for name, array in self._arrays.items()})
+
+    def read(self, can_id):
+        """
+        Copies the state of one axis.
+
+        Args:
+            can_id (int): The CAN ID of the axis.
+
+        Returns:
+            dict: The values by field name.
+
+        Raises:
+            state_shm_error: If the axis is not published, or if no consistent copy could be made within timeout.
+        """
+        i = self._index.get(can_id)
+        if i is None:
+            raise state_shm_error(f"Axis {can_id} is not published")
+        return self._consistent_copy(lambda: {name: array[i].item() for name, array in self._arrays.items()})
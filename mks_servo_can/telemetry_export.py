@@ -0,0 +1,237 @@
+"""Streaming export of the CAN traffic to Parquet or Arrow files.
+
+TelemetryExporter is fed by the receive path (a can.Notifier listener, or record() from any thread).
+Each frame is stored in a preallocated column chunk. When a chunk is full, a background thread
+decodes it with log_decoder and appends one row group to two files:
+
+- events: every frame (timestamp, can_id, op_code, dlc, direction, data, crc_ok)
+- telemetry: the decoded responses in long format (timestamp, can_id, signal, value), the signals
+  of log_decoder.SIGNALS
+
+The CAN thread never waits for the disk. The chunks are allocated once: when all of them wait for
+the writer (``max_pending``), the new frames are counted in ``dropped`` instead of stored, so the
+memory stays bounded on runs of any length:
+
+    exporter = TelemetryExporter("run-2026-10-18")
+    notifier.add_listener(exporter.on_message)
+    ...
+    exporter.close()
+
+    # Analysis
+    telemetry = pyarrow.parquet.read_table("run-2026-10-18/telemetry.parquet")
+
+Requires NumPy and pyarrow (``pip install mks-servo-can[parquet]``).
+"""
+
+import logging
+import os
+import queue
+import threading
+
+from collections import deque
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+from .log_decoder import FRAME_DTYPE, RX, SIGNALS, TX, check_crc, decode_frames
+
+EVENTS_SCHEMA = pa.schema(
+    [
+        ("timestamp", pa.float64()),
+        ("can_id", pa.uint32()),  # Extended IDs are 29 bits
+        ("op_code", pa.uint8()),
+        ("dlc", pa.uint8()),
+        ("direction", pa.int8()),  # log_decoder.RX, TX or UNKNOWN
+        ("data", pa.uint64()),  # The data bytes, big endian, padded with zeros to 8 bytes
+        ("crc_ok", pa.bool_()),
+    ]
+)
+TELEMETRY_SCHEMA = pa.schema(
+    [
+        ("timestamp", pa.float64()),
+        ("can_id", pa.uint16()),
+        ("signal", pa.dictionary(pa.int8(), pa.string())),
+        ("value", pa.int64()),
+    ]
+)
+_SIGNAL_NAMES = pa.array(list(SIGNALS), type=pa.string())
+_SIGNAL_INDEX = {name: i for i, name in enumerate(SIGNALS)}
+
+
+class _ColumnChunk:
+    def __init__(self, rows):
+        self.timestamp = np.zeros(rows, dtype=np.float64)
+        self.can_id = np.zeros(rows, dtype=np.uint32)
+        self.dlc = np.zeros(rows, dtype=np.uint8)
+        self.direction = np.zeros(rows, dtype=np.int8)
+        self.data = np.zeros(rows, dtype=np.uint64)
+        self.size = 0
+
+    def frames(self):
+        n = self.size
+        frames = np.zeros(n, dtype=FRAME_DTYPE)
+        frames["timestamp"] = self.timestamp[:n]
+        frames["can_id"] = self.can_id[:n]
+        frames["dlc"] = self.dlc[:n]
+        frames["direction"] = self.direction[:n]
+        frames["data"] = self.data[:n].astype(">u8").view(np.uint8).reshape(-1, 8)
+        return frames
+
+
+class TelemetryExporter:
+    """Buffers the frames in column chunks and writes them as row groups in a background thread.
+
+    Attributes:
+        rows_written (int): Number of frames written to the events file.
+        dropped (int): Number of frames dropped because the writer was too slow.
+    """
+
+    def __init__(self, directory, format="parquet", chunk_rows=65536, max_pending=4, compression="zstd"):
+        """
+        Args:
+            directory (str): Created if needed, receives events.<ext> and telemetry.<ext>.
+            format (str): "parquet" (one row group per chunk) or "arrow" (Arrow IPC file, one record batch per chunk).
+            chunk_rows (int): Frames per chunk and per row group.
+            max_pending (int): Full chunks that can wait for the writer. The chunks are allocated once, about
+                (max_pending + 1) * chunk_rows * 22 bytes.
+            compression (str): Parquet compression codec, or Arrow IPC compression ("zstd", "lz4" or None).
+        """
+        if format not in ("parquet", "arrow"):
+            raise ValueError(f"Invalid format {format}, valid values are 'parquet' and 'arrow'")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = format
+        self.chunk_rows = chunk_rows
+        self.rows_written = 0
+        self.dropped = 0
+        extension = "parquet" if format == "parquet" else "arrow"
+        self._writers = [self._open(os.path.join(directory, f"{name}.{extension}"), schema, compression) for name, schema in (("events", EVENTS_SCHEMA), ("telemetry", TELEMETRY_SCHEMA))]
+        self._lock = threading.Lock()
+        self._free = deque(_ColumnChunk(chunk_rows) for _ in range(max_pending))
+        self._chunk = _ColumnChunk(chunk_rows)  # Being filled, None when all the chunks wait for the writer
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_chunks, name="TelemetryExporter", daemon=True)
+        self._writer.start()
+
+    def _open(self, path, schema, compression):
+        if self.format == "parquet":
+            return pq.ParquetWriter(path, schema, compression=compression)
+        return pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+
+    def on_message(self, message):
+        """
+        can.Notifier listener, records a received frame.
+
+        Args:
+            message (can.Message): The frame.
+        """
+        if message.is_error_frame or message.is_remote_frame:
+            return
+        self.record(message.timestamp, message.arbitration_id, message.data, RX if message.is_rx else TX)
+
+    def record(self, timestamp, can_id, data, direction=RX):
+        """
+        Records a frame, without blocking.
+
+        Args:
+            timestamp (float): Seconds, e.g. can.Message.timestamp.
+            can_id (int): The arbitration ID.
+            data (bytes or bytearray): Up to 8 data bytes.
+            direction (int): log_decoder.RX, TX or UNKNOWN.
+        """
+        with self._lock:
+            chunk = self._chunk
+            if chunk is None:
+                if self._closed or not self._free:
+                    self.dropped += 1
+                    return
+                chunk = self._chunk = self._free.popleft()
+            i = chunk.size
+            chunk.timestamp[i] = timestamp
+            chunk.can_id[i] = can_id
+            chunk.dlc[i] = len(data)
+            chunk.direction[i] = direction
+            chunk.data[i] = int.from_bytes(data, byteorder="big") << (8 * (8 - len(data)))
+            chunk.size = i + 1
+            if chunk.size == self.chunk_rows:
+                self._submit()
+
+    def _submit(self):
+        # With the lock held: hands the current chunk to the writer and takes a free one
+        self._queue.put(self._chunk)
+        self._chunk = self._free.popleft() if self._free else None
+
+    def flush(self):
+        """Hands the frames recorded so far to the writer (a smaller row group)."""
+        with self._lock:
+            if self._chunk is not None and self._chunk.size:
+                self._submit()
+        self._queue.join()
+
+    def close(self):
+        """Writes the remaining frames and closes the files."""
+        if self._closed:
+            return
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._chunk = None
+        self._queue.put(None)
+        self._writer.join()
+        for writer in self._writers:
+            writer.close()
+
+    def _write_chunks(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                self._queue.task_done()
+                return
+            try:
+                self._write(chunk.frames())
+                self.rows_written += chunk.size
+            except Exception:
+                logging.exception(f"Error writing {chunk.size} frames to {self.directory}")
+            chunk.size = 0
+            with self._lock:
+                self._free.append(chunk)
+            self._queue.task_done()
+
+    def _write(self, frames):
+        crc_ok = check_crc(frames)
+        events = pa.record_batch(
+            [
+                pa.array(frames["timestamp"]),
+                pa.array(frames["can_id"]),
+                pa.array(frames["data"][:, 0]),
+                pa.array(frames["dlc"]),
+                pa.array(frames["direction"]),
+                pa.array(frames["data"].view(">u8").ravel().astype(np.uint64)),
+                pa.array(crc_ok),
+            ],
+            schema=EVENTS_SCHEMA,
+        )
+        self._writers[0].write_batch(events)
+
+        columns = {"timestamp": [], "can_id": [], "signal": [], "value": []}
+        for can_id, signals in decode_frames(frames, crc_ok).items():
+            for name, values in signals.items():
+                columns["timestamp"].append(values["timestamp"])
+                columns["can_id"].append(np.full(len(values), can_id, dtype=np.uint16))
+                columns["signal"].append(np.full(len(values), _SIGNAL_INDEX[name], dtype=np.int8))
+                columns["value"].append(values["value"])
+        if not columns["timestamp"]:
+            return
+        telemetry = pa.record_batch(
+            [
+                pa.array(np.concatenate(columns["timestamp"])),
+                pa.array(np.concatenate(columns["can_id"])),
+                pa.DictionaryArray.from_arrays(pa.array(np.concatenate(columns["signal"])), _SIGNAL_NAMES),
+                pa.array(np.concatenate(columns["value"])),
+            ],
+            schema=TELEMETRY_SCHEMA,
+        )
+        self._writers[1].write_batch(telemetry)
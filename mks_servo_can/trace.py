@@ -0,0 +1,197 @@
+"""Binary trace of the CAN traffic in a fixed-size ring buffer.
+
+Every frame sent or received by MksServo, and every request that fails (timeout, send error,
+unexpected length), is recorded as one fixed-size binary record in a preallocated buffer. Recording
+costs a struct.pack_into(), nothing is formatted or written, so the trace stays on in production and
+the last ``capacity`` records are available when something goes wrong:
+
+    trace = TraceBuffer(capacity=65536, dump_path="mks-trace.txt")  # Dumped on errors, at most once per second
+    servo = MksServo(bus, notifier, 1, trace=trace)
+    ...
+    print(trace.text(last=20))
+    trace.dump("mks-trace.bin")
+
+    # Later, or on another machine
+    print(format_records(load("mks-trace.bin")))
+
+By default all the servos share DEFAULT_TRACE.
+
+Record layout (little endian, RECORD.size bytes):
+
+    float64 timestamp   time.time()
+    uint8   direction   TX or RX
+    uint8   outcome     OK, CRC_ERROR, UNEXPECTED, TIMEOUT, SEND_ERROR, LENGTH_ERROR or LATE
+    uint16  can_id
+    uint8   dlc
+    uint8   data[8]     padded with zeros, data[0] is the op code
+"""
+
+import struct
+import threading
+import time
+
+from .mks_enums import MksCommands
+
+RECORD = struct.Struct("<dBBHB8s")
+MAGIC = b"MKSTRACE\x01"
+
+# Same values as log_decoder.TX and log_decoder.RX
+TX = 0
+RX = 1
+
+OK = 0
+CRC_ERROR = 1
+UNEXPECTED = 2  # No decoder for the op code
+TIMEOUT = 3  # No response, data is the command
+SEND_ERROR = 4
+LENGTH_ERROR = 5  # Response of unexpected length
+LATE = 6  # Response to an attempt that was already resent, dropped
+
+OUTCOMES = {
+    OK: "ok",
+    CRC_ERROR: "crc error",
+    UNEXPECTED: "unexpected",
+    TIMEOUT: "timeout",
+    SEND_ERROR: "send error",
+    LENGTH_ERROR: "length error",
+    LATE: "late",
+}
+_COMMAND_NAMES = {command.value: command.name for command in MksCommands}
+
+
+class TraceBuffer:
+    """Records the frames in a preallocated ring buffer, the oldest records are overwritten.
+
+    record() can be called from any thread, a lock protects the buffer and the record counter.
+
+    Attributes:
+        capacity (int): Number of records kept.
+        dump_path (str): File written by the errors, None to disable.
+    """
+
+    def __init__(self, capacity=65536, dump_path=None, dump_interval=1.0):
+        """
+        Args:
+            capacity (int): Number of records kept, RECORD.size bytes each.
+            dump_path (str, optional): When set, a record with an outcome other than OK dumps the buffer to this
+                file (decoded text if it ends with .txt, binary otherwise).
+            dump_interval (float): Minimum seconds between two dumps on error.
+        """
+        self.capacity = capacity
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self._buffer = bytearray(RECORD.size * capacity)
+        self._recorded = 0
+        self._lock = threading.Lock()
+        self._last_dump = 0.0
+        self._dump_lock = threading.Lock()
+
+    @property
+    def recorded(self):
+        """Number of records since the creation, including the overwritten ones."""
+        return self._recorded
+
+    def record(self, direction, can_id, data, outcome=OK):
+        """
+        Records a frame.
+
+        Args:
+            direction (int): TX or RX.
+            can_id (int): The arbitration ID.
+            data (bytes or bytearray): Up to 8 data bytes.
+            outcome (int): OK or one of the error outcomes.
+        """
+        with self._lock:
+            RECORD.pack_into(self._buffer, (self._recorded % self.capacity) * RECORD.size, time.time(), direction, outcome, can_id, len(data), data)
+            self._recorded += 1
+        if outcome != OK and self.dump_path is not None:
+            self._dump_on_error()
+
+    def _dump_on_error(self):
+        now = time.monotonic()
+        if now - self._last_dump < self.dump_interval or not self._dump_lock.acquire(False):
+            return
+        try:
+            self._last_dump = now
+            self.dump(self.dump_path, text=self.dump_path.endswith(".txt"))
+        except OSError:
+            pass  # The trace must not break the bus I/O
+        finally:
+            self._dump_lock.release()
+
+    def raw(self):
+        """Returns the records as bytes, oldest first."""
+        with self._lock:
+            end = self._recorded
+            snapshot = bytes(self._buffer)
+        if end <= self.capacity:
+            return snapshot[: end * RECORD.size]
+        split = (end % self.capacity) * RECORD.size
+        return snapshot[split:] + snapshot[:split]
+
+    def records(self, last=None):
+        """
+        Returns the records, oldest first.
+
+        Args:
+            last (int, optional): Only the last records.
+
+        Returns:
+            list: (timestamp, direction, outcome, can_id, data) tuples, data as bytes of the frame length.
+        """
+        records = _decode(self.raw())
+        return records if last is None else records[-last:]
+
+    def text(self, last=None):
+        """Returns the records decoded as text lines, see format_records()."""
+        return format_records(self.records(last))
+
+    def dump(self, path, text=False):
+        """
+        Writes the records to a file.
+
+        Args:
+            path (str): The file.
+            text (bool): Decoded text instead of binary records (read back with load()).
+        """
+        if text:
+            with open(path, "w") as f:
+                f.write(self.text())
+                f.write("\n")
+        else:
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+                f.write(self.raw())
+
+    def clear(self):
+        with self._lock:
+            self._recorded = 0
+
+
+def _decode(raw):
+    return [(timestamp, direction, outcome, can_id, data[:dlc]) for timestamp, direction, outcome, can_id, dlc, data in RECORD.iter_unpack(raw)]
+
+
+def load(path):
+    """Reads the records of a binary dump, in the format of TraceBuffer.records()."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a trace dump")
+        return _decode(f.read())
+
+
+def format_records(records):
+    """
+    Formats records as text lines: time, direction, CAN ID, data, command name and outcome.
+
+        2026-10-18 14:03:12.512047 TX 001 31 31 63          READ_ENCODED_VALUE_ADDITION ok
+    """
+    lines = []
+    for timestamp, direction, outcome, can_id, data in records:
+        clock = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)) + f".{int(timestamp % 1 * 1e6):06d}"
+        command = _COMMAND_NAMES.get(data[0], f"0x{data[0]:02X}") if data else ""
+        lines.append(f"{clock} {'RX' if direction == RX else 'TX'} {can_id:03X} {data.hex(' ').upper():<23} {command} {OUTCOMES.get(outcome, outcome)}")
+    return "\n".join(lines)
+
+
+DEFAULT_TRACE = TraceBuffer()
@@ -0,0 +1,308 @@
+"""Following-error watchdog stopping all the axes when one of them goes out of bounds.
+
+FollowingErrorWatchdog polls the shaft angle error (READ_MOTOR_SHAFT_ANGLE_ERROR, 51200 = 360 degrees)
+of every axis at a fixed period, and the shaft protection state (READ_MOTOR_SHAFT_PROTECTION_STATE) every
+``protection_every`` periods. The cheapest schedule the protocol allows is used: the read frames are
+prebuilt and sent back to back to all the axes without waiting for the responses, and the responses are
+decoded by a notifier listener into arrays. A cycle starts when the responses of the previous one are in
+(or stopped coming for one period), so the polling slows down on a saturated bus instead of queuing
+frames. When the responses of a cycle are in, the limits are evaluated on all the axes at once, in the
+notifier thread, and an out of bounds axis stops the fleet from there:
+
+- one EMERGENCY_STOP_COMMAND frame to ``group_id`` when the axes share a group ID (no response),
+- then one EMERGENCY_STOP_COMMAND frame per axis, the tripped axes first. The frames are prebuilt and
+  sent directly on the buses, ahead of any other request of the watchdog.
+
+The trip records the detection, stop and acknowledgment times:
+
+    watchdog = FollowingErrorWatchdog(servos, max_angle_error=51200 * 5 // 360, period=0.005)
+    watchdog.start()
+    ...
+    trip = watchdog.wait(timeout=None)
+    print(trip.axes, trip.reasons, trip.detection_to_stop, trip.detection_to_ack)
+
+Requires NumPy (``pip install mks-servo-can[numpy]``).
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+
+from .mks_enums import MksCommands
+
+_ANGLE_ERROR = MksCommands.READ_MOTOR_SHAFT_ANGLE_ERROR.value
+_PROTECTION = MksCommands.READ_MOTOR_SHAFT_PROTECTION_STATE.value
+_STOP = MksCommands.EMERGENCY_STOP_COMMAND.value
+
+
+class watchdog_error(Exception):
+    """Exception raised for an invalid watchdog definition."""
+
+    pass
+
+
+def _frame(can_id, data):
+    import can
+
+    return can.Message(arbitration_id=can_id, data=bytes(data) + bytes([(can_id + sum(data)) & 0xFF]), is_extended_id=False)
+
+
+class WatchdogTrip:
+    """What tripped the watchdog and how fast the axes were stopped.
+
+    The times are time.perf_counter() values.
+
+    Attributes:
+        axes (list of int): The CAN IDs of the out of bounds axes.
+        reasons (dict): "angle error <value>", "protection" or "stale" by CAN ID.
+        angle_error (numpy.ndarray): The last angle error of every axis at the detection.
+        sampled (float): Reception of the first out of bounds response (the detection time for stale axes).
+        detected (float): Evaluation that found the axes out of bounds.
+        stop_sent (float): Last stop frame handed to the bus.
+        stopped (list of int): The CAN IDs of the axes whose stop frame was handed to the bus.
+        acknowledged (dict): Reception time of the stop response by CAN ID.
+    """
+
+    def __init__(self, axes, reasons, angle_error, sampled, detected):
+        self.axes = axes
+        self.reasons = reasons
+        self.angle_error = angle_error
+        self.sampled = sampled
+        self.detected = detected
+        self.stop_sent = None
+        self.stopped = []
+        self.acknowledged = {}
+
+    def __repr__(self):
+        return f"WatchdogTrip(axes={self.axes}, reasons={self.reasons}, detection_to_stop={self.detection_to_stop})"
+
+    @property
+    def detection_to_stop(self):
+        """Seconds from the detection to the last stop frame sent."""
+        return None if self.stop_sent is None else self.stop_sent - self.detected
+
+    @property
+    def detection_to_ack(self):
+        """Seconds from the detection to the last stop response, None until all the stopped axes answered."""
+        if self.stop_sent is None or any(can_id not in self.acknowledged for can_id in self.stopped):
+            return None
+        return max(self.acknowledged.values()) - self.detected
+
+    @property
+    def sample_to_stop(self):
+        """Seconds from the reception of the out of bounds response to the last stop frame sent."""
+        return None if self.stop_sent is None else self.stop_sent - self.sampled
+
+
+class _Bus:
+    def __init__(self, bus, notifier):
+        self.bus = bus
+        self.notifier = notifier
+        self.index = {}  # Axis index by CAN ID
+        self.reads = []
+        self.protection_reads = []
+        self.stops = []
+        self.listener = None
+
+
+class FollowingErrorWatchdog:
+    """Polls the following error and the protection state of the axes, and stops them all on a violation.
+
+    Attributes:
+        trip (WatchdogTrip): The trip, None while the axes are within bounds.
+        cycles (int): Number of polling cycles.
+        incomplete_cycles (int): Cycles evaluated without the responses of all the axes.
+    """
+
+    def __init__(self, servos, max_angle_error, period=0.005, protection_every=10, stale_after=None, group_id=None, on_trip=None):
+        """
+        Args:
+            servos (list of MksServo): The axes, on one or several buses.
+            max_angle_error (int or list of int): Limit of the absolute shaft angle error (51200 = 360 degrees),
+                for all the axes or one per axis.
+            period (float): Seconds between the polling cycles.
+            protection_every (int): The protection state is read every this number of cycles, 0 never.
+            stale_after (float, optional): Trips when an axis did not answer for this number of seconds.
+            group_id (int, optional): Group ID shared by the axes (set_group_id), the first stop frame is sent to it.
+            on_trip (callable, optional): Called with the WatchdogTrip, in the notifier or watchdog thread, after
+                the stop frames are sent.
+        """
+        if not servos:
+            raise watchdog_error("No axes to watch")
+        self.period = period
+        self.protection_every = protection_every
+        self.stale_after = stale_after
+        self.group_id = group_id
+        self.on_trip = on_trip
+        self.trip = None
+        self.cycles = 0
+        self.incomplete_cycles = 0
+        self.can_ids = [servo.can_id for servo in servos]
+        n = len(servos)
+        self._limit = np.broadcast_to(np.asarray(max_angle_error, dtype=np.int64), (n,)).copy()
+        self._angle_error = np.zeros(n, dtype=np.int64)
+        self._protected = np.zeros(n, dtype=bool)
+        self._received_at = np.zeros(n, dtype=np.float64)  # perf_counter of the last angle error response
+        self._answered = np.zeros(n, dtype=bool)  # Angle error received in the current cycle
+        self._remaining = n
+        self._cycle_done = threading.Event()
+        self._tripped = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+        self._buses = {}
+        for i, servo in enumerate(servos):
+            entry = self._buses.get(id(servo.bus))
+            if entry is None:
+                entry = self._buses[id(servo.bus)] = _Bus(servo.bus, servo.notifier)
+            if servo.can_id in entry.index:
+                raise watchdog_error(f"Axis {servo.can_id} is watched twice")
+            entry.index[servo.can_id] = i
+            entry.reads.append(_frame(servo.can_id, [_ANGLE_ERROR]))
+            entry.protection_reads.append(_frame(servo.can_id, [_PROTECTION]))
+            entry.stops.append((i, _frame(servo.can_id, [_STOP])))
+
+    def start(self):
+        """Starts the polling thread."""
+        if self._running:
+            return
+        self._running = True
+        self._received_at[:] = time.perf_counter()
+        for entry in self._buses.values():
+            entry.listener = lambda message, entry=entry: self._on_message(entry, message)
+            entry.notifier.add_listener(entry.listener)
+        self._thread = threading.Thread(target=self._poll, name="FollowingErrorWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the polling, the axes are not stopped."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for entry in self._buses.values():
+            if entry.listener is not None:
+                entry.notifier.remove_listener(entry.listener)
+                entry.listener = None
+
+    def wait(self, timeout=None):
+        """Waits for a trip, returns the WatchdogTrip or None on timeout."""
+        self._tripped.wait(timeout)
+        return self.trip
+
+    def _poll(self):
+        next_cycle = time.perf_counter()
+        while self._running and self.trip is None:
+            with self._lock:
+                self._answered[:] = False
+                self._remaining = len(self.can_ids)
+                self._cycle_done.clear()
+            protection = self.protection_every and self.cycles % self.protection_every == 0
+            self.cycles += 1
+            try:
+                for entry in self._buses.values():
+                    for message in entry.reads:
+                        entry.bus.send(message)
+                    if protection:
+                        for message in entry.protection_reads:
+                            entry.bus.send(message)
+            except Exception as e:
+                logging.error(f"Watchdog polling failed: {e}")
+            next_cycle += self.period
+            # On a saturated bus the next cycle waits for the responses instead of queuing frames, as long as they
+            # keep coming: a lost response delays it by one period at most
+            timeout = max(0.0, next_cycle - time.perf_counter())
+            remaining = None
+            while not self._cycle_done.wait(timeout):
+                if self._remaining == remaining:
+                    self.incomplete_cycles += 1
+                    self._evaluate()
+                    break
+                remaining = self._remaining
+                timeout = self.period
+            delay = next_cycle - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_cycle = time.perf_counter()  # Overrun, no burst to catch up
+
+    def _on_message(self, entry, message):
+        i = entry.index.get(message.arbitration_id)
+        data = message.data
+        if i is None or message.is_extended_id or len(data) < 3:
+            return
+        now = time.perf_counter()
+        op = data[0]
+        if data[-1] != (message.arbitration_id + sum(data) - data[-1]) & 0xFF:
+            return
+        if op == _ANGLE_ERROR and len(data) == 6:
+            self._angle_error[i] = int.from_bytes(data[1:5], byteorder="big", signed=True)
+            self._received_at[i] = now
+            with self._lock:
+                if not self._answered[i]:
+                    self._answered[i] = True
+                    self._remaining -= 1
+                    complete = self._remaining == 0
+                else:
+                    complete = False
+            if complete:
+                self._evaluate()
+                self._cycle_done.set()
+        elif op == _PROTECTION and len(data) == 3:
+            self._protected[i] = data[1] == 1
+        elif op == _STOP and len(data) == 3 and self.trip is not None:
+            self.trip.acknowledged.setdefault(message.arbitration_id, now)
+
+    def _evaluate(self):
+        now = time.perf_counter()
+        over = np.abs(self._angle_error) > self._limit
+        tripped = over | self._protected
+        stale = None
+        if self.stale_after is not None:
+            stale = (now - self._received_at) > self.stale_after
+            tripped |= stale
+        if not tripped.any():
+            return
+        with self._lock:
+            if self.trip is not None:
+                return
+            indexes = np.flatnonzero(tripped)
+            reasons = {}
+            for i in indexes:
+                if over[i]:
+                    reasons[self.can_ids[i]] = f"angle error {self._angle_error[i]}"
+                elif self._protected[i]:
+                    reasons[self.can_ids[i]] = "protection"
+                else:
+                    reasons[self.can_ids[i]] = "stale"
+            sampled = float(self._received_at[indexes].min()) if (over | self._protected)[indexes].any() else now
+            self.trip = WatchdogTrip([self.can_ids[i] for i in indexes], reasons, self._angle_error.copy(), sampled, now)
+        self._stop_all(tripped)
+        self._tripped.set()
+        if self.on_trip is not None:
+            self.on_trip(self.trip)
+
+    def _stop_all(self, tripped):
+        if self.group_id is not None:
+            for entry in self._buses.values():
+                self._send(entry.bus, _frame(self.group_id, [_STOP]))
+        # Tripped axes first, on every bus
+        stopped = []
+        for first in (True, False):
+            for entry in self._buses.values():
+                for i, message in entry.stops:
+                    if tripped[i] == first and self._send(entry.bus, message):
+                        stopped.append(self.can_ids[i])
+        self.trip.stopped = stopped
+        self.trip.stop_sent = time.perf_counter()
+
+    def _send(self, bus, message):
+        try:
+            bus.send(message)
+        except Exception as e:
+            logging.error(f"Emergency stop of {message.arbitration_id} failed: {e}")
+            return False
+        return True
@@ -5,6 +5,7 @@ setup(
     version="0.2.2",
     packages=find_packages(include=["mks_servo_can"]),
     install_requires=["python-can"],
+    extras_require={"numpy": ["numpy"], "parquet": ["numpy", "pyarrow"]},
     # Optional metadata
     author="Dzym Fardreamer",
     author_email="anakinlokkin@gmail.com",